@@ -0,0 +1,80 @@
+# datasets.py
+"""
+Seeded synthetic datasets for the benchmarks. The same (rows, columns,
+cardinality, null ratio, seed) always produces the same frame, and files are
+cached on disk by those parameters so large sizes are generated only once.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Named sizes accepted wherever a row count is
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+FORMATS = ["csv", "xlsx", "json"]
+# Excel sheets hold at most 1,048,576 rows including the header
+XLSX_MAX_ROWS = 1_048_575
+
+def parse_rows(value: str) -> int:
+	"""
+	"100k" / "2.5m" / "250000" -> row count.
+	"""
+	value = str(value).strip().lower()
+	if value in SIZES:
+		return SIZES[value]
+	scale = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+	return int(float(value[:-1] if scale > 1 else value) * scale)
+
+def generate(rows: int, columns: int = 8, cardinality: int = 100, null_ratio: float = 0.05, seed: int = 0) -> pd.DataFrame:
+	"""
+	Mixed-type frame cycling through id, text category, float, int, date and
+	free-text columns. Text categories draw from `cardinality` distinct
+	values; every column but the first has about `null_ratio` missing values.
+	"""
+	rng = np.random.default_rng(seed)
+	labels = np.array([f"cat_{i:05d}" for i in range(max(cardinality, 1))], dtype=object)
+	data = {}
+	for i in range(columns):
+		kind = i % 6
+		if kind == 0:
+			name, values = f"id_{i}", np.arange(rows, dtype=np.int64) + i * rows
+		elif kind == 1:
+			name, values = f"category_{i}", labels[rng.integers(0, len(labels), rows)]
+		elif kind == 2:
+			name, values = f"amount_{i}", rng.gamma(2.0, 50.0, rows).round(2)
+		elif kind == 3:
+			name, values = f"count_{i}", rng.integers(0, 1000, rows).astype(np.float64)
+		elif kind == 4:
+			days = rng.integers(0, 3 * 365, rows)
+			name, values = f"date_{i}", (np.datetime64("2022-01-01") + days).astype(str).astype(object)
+		else:
+			name, values = f"note_{i}", np.char.add("note ", rng.integers(0, rows, rows).astype(str)).astype(object)
+		if i and null_ratio > 0:
+			values = values.astype(object) if values.dtype.kind == "i" else values.copy()
+			values[rng.random(rows) < null_ratio] = None if values.dtype == object else np.nan
+		data[name] = values
+	return pd.DataFrame(data)
+
+def write(df: pd.DataFrame, path: str, fmt: str):
+	if fmt == "csv":
+		df.to_csv(path, index=False)
+	elif fmt == "xlsx":
+		df.to_excel(path, index=False, engine="openpyxl")
+	elif fmt == "json":
+		df.to_json(path, orient="records")
+	else:
+		raise ValueError(f"Unsupported format: {fmt}")
+
+def dataset_file(data_dir: str, fmt: str, rows: int, columns: int = 8, cardinality: int = 100, null_ratio: float = 0.05, seed: int = 0) -> str:
+	"""
+	Path of the generated file for these parameters, writing it on first use.
+	"""
+	if fmt == "xlsx" and rows > XLSX_MAX_ROWS:
+		raise ValueError(f"xlsx holds at most {XLSX_MAX_ROWS} rows")
+	os.makedirs(data_dir, exist_ok=True)
+	path = os.path.join(data_dir, f"r{rows}_c{columns}_k{cardinality}_n{null_ratio:g}_s{seed}.{fmt}")
+	if not os.path.exists(path):
+		tmp_path = f"{path}.tmp.{fmt}"
+		write(generate(rows, columns, cardinality, null_ratio, seed), tmp_path, fmt)
+		os.replace(tmp_path, path)
+	return path
@@ -0,0 +1,108 @@
+# ingest.py
+"""
+CSV ingestion benchmark: the previous loader (one read_csv pass as UTF-8,
+re-parsed as latin1 on a decode error) against utils.ingest with 1..N worker
+processes, on a generated CSV of --size-mb (1 GB by default). Each run is a
+fresh process, so page cache aside nothing is shared between runs.
+
+Run:  python benchmarks/ingest.py --size-mb 1024 --workers 1,2,4,8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks import datasets  # noqa: E402
+from benchmarks.suite import DEFAULT_DATA_DIR, peak_rss  # noqa: E402
+
+# Rows generated per piece while growing the file to the requested size
+PIECE_ROWS = 500_000
+
+def csv_file(data_dir: str, size_mb: int, columns: int, latin1_tail: bool) -> str:
+	"""
+	Path of a generated CSV of at least size_mb MB (cached), optionally ending in a latin1 row.
+	"""
+	os.makedirs(data_dir, exist_ok=True)
+	path = os.path.join(data_dir, f"ingest_{size_mb}mb_c{columns}{'_latin1' if latin1_tail else ''}.csv")
+	if os.path.exists(path):
+		return path
+	tmp_path = f"{path}.tmp"
+	with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+		seed = 0
+		while f.tell() < size_mb * 2 ** 20:
+			df = datasets.generate(PIECE_ROWS, columns, seed=seed)
+			df.to_csv(f, index=False, header=seed == 0)
+			seed += 1
+	if latin1_tail:
+		# A non-UTF-8 byte past the sniffed sample: the old loader parses the file twice
+		with open(tmp_path, "ab") as f:
+			f.write(",".join(["0"] + ["caf\xe9"] * (columns - 1)).encode("latin1") + b"\n")
+	os.replace(tmp_path, path)
+	return path
+
+def _legacy_read(path: str):
+	import pandas as pd
+	try:
+		return pd.read_csv(path, encoding='utf-8')
+	except UnicodeDecodeError:
+		return pd.read_csv(path, encoding='latin1')
+
+def _child(loader: str, path: str):
+	from utils import ingest
+	started = time.perf_counter()
+	df = _legacy_read(path) if loader == "legacy" else ingest.read_csv(path)
+	seconds = time.perf_counter() - started
+	ingest.shutdown()
+	print(json.dumps({
+		"seconds": seconds,
+		"rows": len(df),
+		"dtypes": {str(c): str(t) for c, t in df.dtypes.items()},
+		"peak_rss_mb": peak_rss() / 2 ** 20,
+	}))
+
+def run(loader: str, path: str, workers: int) -> dict:
+	env = {**os.environ, "INGEST_WORKERS": str(workers), "PARALLEL_INGEST_MIN_BYTES": "0"}
+	out = subprocess.run(
+		[sys.executable, os.path.abspath(__file__), "--child", loader, path],
+		env=env, cwd=BACKEND_DIR, check=True, stdout=subprocess.PIPE, text=True,
+	).stdout
+	return json.loads(out.strip().splitlines()[-1])
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--size-mb", type=int, default=1024)
+	parser.add_argument("--columns", type=int, default=8)
+	parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="comma-separated worker counts for utils.ingest")
+	parser.add_argument("--latin1-tail", action="store_true", help="end the file with a latin1 row")
+	parser.add_argument("--repeat", type=int, default=1)
+	parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+	parser.add_argument("--child", nargs=2, metavar=("LOADER", "PATH"), help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		_child(*args.child)
+		return
+
+	path = csv_file(args.data_dir, args.size_mb, args.columns, args.latin1_tail)
+	size_mb = os.path.getsize(path) / 2 ** 20
+	print(f"{path}: {size_mb:.0f} MB, {os.cpu_count()} CPUs")
+	runs = [("legacy", 1)] + [("ingest", int(w)) for w in args.workers.split(",") if w]
+	legacy = None
+	for loader, workers in runs:
+		result = min((run(loader, path, workers) for _ in range(args.repeat)), key=lambda r: r["seconds"])
+		if legacy is None:
+			legacy = result
+		elif result["rows"] != legacy["rows"] or result["dtypes"] != legacy["dtypes"]:
+			print(f"  {loader} x{workers}: result differs from the previous loader ({result['rows']} rows, {result['dtypes']})")
+		label = loader if loader == "legacy" else f"ingest x{workers}"
+		print(
+			f"{label:<12} {result['seconds']:8.2f} s  {size_mb / result['seconds']:7.1f} MB/s"
+			f"  {result['peak_rss_mb']:8.0f} MB peak  {legacy['seconds'] / result['seconds']:5.2f}x"
+		)
+
+if __name__ == "__main__":
+	main()
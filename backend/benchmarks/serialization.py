@@ -0,0 +1,112 @@
+# serialization.py
+"""
+JSON serialization benchmark: the previous per-value path (DataFrame
+replace/where sanitizing, per-cell make_json_safe, jsonable_encoder plus
+json.dumps) against utils.serialize, on a wide and a long table.
+
+Run:  python benchmarks/serialization.py --rows 200000 --columns 500
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from utils import serialize  # noqa: E402
+
+def make_frame(rows: int, columns: int, seed: int = 0) -> pd.DataFrame:
+	"""
+	Mixed frame: floats with NaN/inf, ints, text, dates and a category column per group of five.
+	"""
+	rng = np.random.default_rng(seed)
+	data = {}
+	for i in range(columns):
+		kind = i % 5
+		if kind == 0:
+			values = rng.normal(size=rows)
+			values[rng.random(rows) < 0.1] = np.nan
+			values[rng.random(rows) < 0.01] = np.inf
+			data[f"f{i}"] = values
+		elif kind == 1:
+			data[f"i{i}"] = rng.integers(0, 1000, rows)
+		elif kind == 2:
+			data[f"s{i}"] = rng.choice(["alpha", "beta", "gamma", None], rows)
+		elif kind == 3:
+			data[f"d{i}"] = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D")
+		else:
+			data[f"c{i}"] = pd.Categorical(rng.choice(["x", "y", "z", None], rows))
+	return pd.DataFrame(data)
+
+def _legacy_json_safe(obj):
+	if isinstance(obj, (np.integer, np.floating)):
+		v = obj.item()
+		if isinstance(v, float) and (np.isnan(v) or np.isinf(v)):
+			return None
+		return v
+	if isinstance(obj, float):
+		if obj != obj or obj == float('inf') or obj == float('-inf'):
+			return None
+		return obj
+	return obj
+
+def legacy_records(df: pd.DataFrame) -> list:
+	records = df.to_dict(orient="records")
+	frame = pd.DataFrame(records)
+	for col in frame.columns:
+		if pd.api.types.is_datetime64_any_dtype(frame[col]):
+			frame[col] = frame[col].dt.strftime("%Y-%m-%d")
+	return frame.replace([float('inf'), float('-inf')], None).where(pd.notnull(frame), None).to_dict(orient="records")
+
+def legacy_corr(corr: pd.DataFrame) -> dict:
+	return {k: {kk: _legacy_json_safe(vv) for kk, vv in v.items()} for k, v in corr.to_dict().items()}
+
+def legacy_dumps(content) -> bytes:
+	# What a plain dict return went through: jsonable_encoder, then JSONResponse.render
+	return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def best_of(repeat: int, func):
+	times = []
+	for _ in range(repeat):
+		started = time.perf_counter()
+		result = func()
+		times.append(time.perf_counter() - started)
+	return min(times), result
+
+def compare(label: str, repeat: int, legacy, current):
+	old, _ = best_of(repeat, legacy)
+	new, _ = best_of(repeat, current)
+	print(f"  {label:<28} legacy {1000 * old:9.1f} ms   serialize {1000 * new:8.1f} ms   {old / new:6.1f}x")
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--rows", type=int, default=200_000, help="rows of the long table")
+	parser.add_argument("--columns", type=int, default=500, help="columns of the wide table")
+	parser.add_argument("--repeat", type=int, default=3)
+	args = parser.parse_args()
+	print(f"encoder: {'orjson' if serialize.HAS_ORJSON else 'json'}")
+
+	wide = make_frame(1_000, args.columns)
+	numeric = wide.select_dtypes("number")
+	corr = numeric.corr()
+	print(f"wide: {wide.shape[0]} rows x {wide.shape[1]} columns ({numeric.shape[1]}x{numeric.shape[1]} correlation)")
+	compare("preview records (1000 rows)", args.repeat, lambda: legacy_records(wide), lambda: serialize.frame_records(wide))
+	compare("correlation to dict", args.repeat, lambda: legacy_corr(corr), lambda: {
+		c: dict(zip(corr.columns, values)) for c, values in zip(corr.columns, serialize.array_values(corr.to_numpy().T))
+	})
+	legacy_payload = {"stats": {"correlation": legacy_corr(corr)}, "preview": legacy_records(wide)}
+	payload = {"stats": {"correlation": legacy_corr(corr)}, "preview": serialize.frame_records(wide)}
+	compare("encode response", args.repeat, lambda: legacy_dumps(legacy_payload), lambda: serialize.dumps(payload))
+
+	long = make_frame(args.rows, 10)
+	print(f"long: {long.shape[0]} rows x {long.shape[1]} columns")
+	compare("records", args.repeat, lambda: legacy_records(long), lambda: serialize.frame_records(long))
+	compare("records + encode", args.repeat, lambda: legacy_dumps(legacy_records(long)), lambda: serialize.dumps(serialize.frame_records(long)))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,103 @@
+# shared_memory.py
+"""
+Per-worker memory of a loaded dataset with 1..N worker processes: the
+previous Parquet copy (each process decodes its own copy) against the
+memory-mapped Arrow copy (processes share the file's page cache). Every
+worker loads the dataset, reads every column, and reports the anonymous
+memory it gained (its own, unshareable copy of the data) and its
+proportional share (PSS) of everything it maps, while all workers are alive.
+Free-text columns are left out unless --text is given: they become Python
+strings in every process whichever store they come from.
+
+Run:  python benchmarks/shared_memory.py --rows 2m --workers 1,2,4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks import datasets  # noqa: E402
+from benchmarks.suite import DEFAULT_DATA_DIR  # noqa: E402
+
+def memory() -> dict:
+	"""
+	{"anon", "pss"} of this process in bytes, from /proc/self/smaps_rollup.
+	"""
+	values = {}
+	with open("/proc/self/smaps_rollup", encoding="ascii") as f:
+		for line in f:
+			key, _, rest = line.partition(":")
+			if key in ("Anonymous", "Pss"):
+				values[key] = int(rest.split()[0]) * 1024
+	return {"anon": values["Anonymous"], "pss": values["Pss"]}
+
+def _worker(store: str, path: str, barrier, results):
+	import numpy as np
+	import pandas as pd
+	import pyarrow.parquet  # noqa: F401
+	from utils import arrow_store
+	baseline = memory()
+	df = pd.read_parquet(path, engine='pyarrow') if store == "parquet" else arrow_store.read_frame(path)
+	# Read every byte of the fixed-width columns, as stats or a full scan would
+	for col in df.columns:
+		values = (df[col].cat.codes if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col]).to_numpy()
+		if values.dtype.kind in "iufbmM":
+			values.view(np.uint8).sum()
+	barrier.wait()
+	used = memory()
+	results.put({key: used[key] - baseline[key] for key in used})
+	# Stay mapped until every worker has measured
+	barrier.wait()
+
+def run(store: str, path: str, workers: int) -> list:
+	ctx = multiprocessing.get_context("spawn")
+	barrier = ctx.Barrier(workers)
+	results = ctx.Queue()
+	processes = [ctx.Process(target=_worker, args=(store, path, barrier, results)) for _ in range(workers)]
+	for p in processes:
+		p.start()
+	measured = [results.get() for _ in processes]
+	for p in processes:
+		p.join()
+	return measured
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--rows", default="2m")
+	parser.add_argument("--columns", type=int, default=8)
+	parser.add_argument("--workers", default="1,2,4")
+	parser.add_argument("--text", action="store_true", help="keep the free-text (note) columns")
+	parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+	args = parser.parse_args()
+
+	import pandas as pd
+	from utils import arrow_store, dtypes
+	rows = datasets.parse_rows(args.rows)
+	source = datasets.dataset_file(args.data_dir, "csv", rows, args.columns)
+	df, _ = dtypes.optimize(pd.read_csv(source))
+	if not args.text:
+		df = df[[c for c in df.columns if not c.startswith("note_")]]
+	scratch = tempfile.mkdtemp(prefix="bench-shm-")
+	paths = {"parquet": os.path.join(scratch, "data.parquet"), "arrow": os.path.join(scratch, "data.arrow")}
+	df.to_parquet(paths["parquet"], index=False, engine='pyarrow')
+	arrow_store.write(df, paths["arrow"])
+	print(f"{len(df):,} rows x {df.shape[1]} columns, {df.memory_usage(deep=True).sum() / 2 ** 20:.0f} MB in memory")
+	print(f"{'store':<8} {'workers':>7} {'anon/worker':>12} {'PSS/worker':>11} {'anon total':>11}")
+	try:
+		for workers in [int(w) for w in args.workers.split(",") if w]:
+			for store in ("parquet", "arrow"):
+				measured = run(store, paths[store], workers)
+				anon = sum(m["anon"] for m in measured)
+				pss = sum(m["pss"] for m in measured)
+				print(f"{store:<8} {workers:>7} {anon / workers / 2 ** 20:9.0f} MB {pss / workers / 2 ** 20:8.0f} MB {anon / 2 ** 20:8.0f} MB")
+	finally:
+		for path in paths.values():
+			os.remove(path)
+		os.rmdir(scratch)
+
+if __name__ == "__main__":
+	main()
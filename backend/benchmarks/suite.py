@@ -0,0 +1,368 @@
+# suite.py
+"""
+Benchmark suite for the backend hot paths on seeded synthetic data: parsing
+uploads (load), auto_clean, summary stats, stats export, chart data, the
+/upload -> /clean flow and /query against the local OpenRouter stub.
+
+Each case runs in a fresh process, so caches start cold and peak RSS is the
+case's own. Reported per case: best wall time over --repeat runs, peak RSS
+and throughput (rows/s, and MB/s of source file where there is one).
+
+Run:      python benchmarks/suite.py --sizes 10k,100k,1m --wide
+Baseline: python benchmarks/suite.py --save-baseline
+Gate:     python benchmarks/suite.py --compare   (exit status 1 on a regression)
+"""
+import argparse
+import concurrent.futures
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks import datasets  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'dataforge-bench-data')
+# Columns of the wide-table cases
+WIDE_COLUMNS = 500
+# A case regresses when it is this much slower (or bigger) than the baseline
+TIME_THRESHOLD = 0.20
+RSS_THRESHOLD = 0.25
+# Differences under this many seconds are treated as noise
+MIN_TIME_DELTA = 0.005
+
+def _dataset_id(params: dict) -> str:
+	return f"bench_{params['fmt']}"
+
+def _install(params: dict) -> str:
+	# Copy the generated source into the (per-case) upload directory as an upload would
+	from utils import file_utils
+	os.makedirs(file_utils.UPLOAD_DIR, exist_ok=True)
+	dataset_id = _dataset_id(params)
+	shutil.copy(params["source"], os.path.join(file_utils.UPLOAD_DIR, f"{dataset_id}.{params['fmt']}"))
+	return dataset_id
+
+def _drop_derived(dataset_id: str):
+	# Forget everything derived from the source: Arrow copy, reports, indexes and caches
+	from utils import file_utils
+	from utils.cache import dataset_cache
+	for name in os.listdir(file_utils.UPLOAD_DIR):
+		if name.startswith(dataset_id) and name not in (f"{dataset_id}.{fmt}" for fmt in datasets.FORMATS):
+			os.remove(os.path.join(file_utils.UPLOAD_DIR, name))
+	dataset_cache.clear()
+
+def _loaded(params: dict):
+	from utils import file_utils
+	dataset_id = _install(params)
+	return dataset_id, file_utils.load_dataframe(dataset_id)
+
+def case_load(params: dict):
+	"""
+	First load of an upload: parse, optimize dtypes, write the Arrow copy.
+	"""
+	from utils import file_utils
+	dataset_id = _install(params)
+	return (lambda: file_utils.load_dataframe(dataset_id)), (lambda: _drop_derived(dataset_id))
+
+def case_auto_clean(params: dict):
+	from utils import data_handler, pipeline
+	_, df = _loaded(params)
+	return (lambda: data_handler.auto_clean(df)), pipeline.artifact_cache.clear
+
+def case_summary_stats(params: dict):
+	from utils import data_handler
+	_, df = _loaded(params)
+	return (lambda: data_handler.get_summary_stats(df)), None
+
+def case_stats_export(params: dict):
+	"""
+	Persist stats and render the CSV and XLSX exports from them.
+	"""
+	from utils import data_handler, stats_store
+	dataset_id, df = _loaded(params)
+	stats = data_handler.get_summary_stats(df)
+
+	def run():
+		stats_store.save(dataset_id, "bench", stats)
+		for ext in ["csv", "xlsx"]:
+			stats_store.export_path(dataset_id, ext)
+	return run, None
+
+def case_chart(params: dict):
+	"""
+	Bar chart of the mean amount per category, plus a histogram-style value count and a scatter.
+	"""
+	from utils import viz_handler
+	_, df = _loaded(params)
+	category = next(c for c in df.columns if c.startswith("category"))
+	amount = next(c for c in df.columns if c.startswith("amount"))
+	count = next(c for c in df.columns if c.startswith("count"))
+	specs = [
+		{"type": "bar", "x": category, "y": amount, "agg": "mean"},
+		{"type": "pie", "x": category},
+		{"type": "scatter", "x": amount, "y": count},
+	]
+
+	def run():
+		# No version: aggregates are recomputed rather than served from the cache
+		for spec in specs:
+			viz_handler.prepare_chart_data(df, spec)
+	return run, None
+
+def _client():
+	from fastapi.testclient import TestClient
+	import main
+	return TestClient(main.app)
+
+def case_upload_clean(params: dict):
+	"""
+	POST /upload of the generated file, then POST /clean with the default strategy.
+	"""
+	client = _client()
+
+	def run():
+		with open(params["source"], "rb") as f:
+			response = client.post("/upload", files={"file": (f"bench.{params['fmt']}", f, "application/octet-stream")})
+		response.raise_for_status()
+		client.post(f"/clean/{response.json()['dataset_id']}", json={}).raise_for_status()
+	return run, None
+
+def case_query(params: dict):
+	"""
+	POST /query answered by the OpenRouter stub: profile building plus the client round trip.
+	"""
+	from utils import file_utils
+	dataset_id = _install(params)
+	file_utils.load_dataframe(dataset_id)
+	client = _client()
+	questions = iter(range(1_000_000))
+
+	def run():
+		# A new question every run, so the AI response cache never answers it
+		question = f"Which category has the highest total amount? (run {next(questions)})"
+		client.post("/query", json={"dataset_id": dataset_id, "question": question}).raise_for_status()
+	return run, None
+
+# name -> (setup(params) -> (run, reset or None), needs the AI stub)
+CASES = {
+	"load": (case_load, False),
+	"auto_clean": (case_auto_clean, False),
+	"summary_stats": (case_summary_stats, False),
+	"stats_export": (case_stats_export, False),
+	"chart": (case_chart, False),
+	"upload_clean": (case_upload_clean, False),
+	"query": (case_query, True),
+}
+
+def peak_rss() -> int:
+	"""
+	Peak resident set size of this process in bytes.
+	"""
+	# VmHWM starts over at exec; ru_maxrss would carry over the launching process's peak
+	try:
+		with open("/proc/self/status", encoding="ascii") as f:
+			for line in f:
+				if line.startswith("VmHWM:"):
+					return int(line.split()[1]) * 1024
+	except OSError:
+		pass
+	# ru_maxrss is in KiB on Linux (bytes on macOS)
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+def measure(case: str, params: dict, repeat: int) -> dict:
+	"""
+	Run one case in this (fresh) process: setup, then `repeat` timed runs.
+	"""
+	workdir = tempfile.mkdtemp(prefix="bench-")
+	try:
+		from utils import file_utils, stats_store
+		file_utils.UPLOAD_DIR = os.path.join(workdir, "uploads")
+		stats_store.STATS_DIR = os.path.join(workdir, "stats")
+		run, reset = CASES[case][0](params)
+		times = []
+		for _ in range(repeat):
+			if reset:
+				reset()
+			gc.collect()
+			started = time.perf_counter()
+			run()
+			times.append(time.perf_counter() - started)
+		return {
+			"seconds": min(times),
+			"mean_seconds": sum(times) / len(times),
+			"peak_rss_mb": peak_rss() / 2 ** 20,
+		}
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True)
+
+def run_isolated(case: str, params: dict, repeat: int) -> dict:
+	context = multiprocessing.get_context("spawn")
+	with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+		return pool.submit(measure, case, params, repeat).result()
+
+def _free_port() -> int:
+	with socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+def start_ai_stub():
+	"""
+	Start scripts/openrouter_stub.py on a free port and point the backend at it (via the
+	environment the case processes inherit). Returns the stub process.
+	"""
+	port = _free_port()
+	stub = subprocess.Popen(
+		[sys.executable, os.path.join(BACKEND_DIR, "scripts", "openrouter_stub.py"), "--port", str(port), "--token-delay", "0"],
+		stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+	)
+	deadline = time.monotonic() + 15
+	while time.monotonic() < deadline:
+		try:
+			socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+			break
+		except OSError:
+			time.sleep(0.1)
+	else:
+		stub.kill()
+		raise RuntimeError("OpenRouter stub did not start")
+	os.environ["OPENROUTER_URL"] = f"http://127.0.0.1:{port}/api/v1/chat/completions"
+	os.environ["OPENROUTER_API_KEY"] = "stub"
+	return stub
+
+def plan(args) -> list:
+	"""
+	(key, case, params) for every case/size/format/shape combination selected.
+	"""
+	runs = []
+	shapes = [("narrow", args.columns)] + ([("wide", WIDE_COLUMNS)] if args.wide else [])
+	for case in args.cases:
+		# Parsing is format-specific; everything after it works on the loaded frame
+		formats = args.formats if case in ("load", "upload_clean") else ["csv"]
+		for rows in args.sizes:
+			for shape, columns in shapes:
+				# Wide tables are capped at the smallest size: 500 columns x 10M rows is not a unit benchmark
+				if shape == "wide" and rows > args.wide_rows:
+					continue
+				if case == "query" and rows > args.query_rows:
+					continue
+				for fmt in formats:
+					if fmt == "xlsx" and (rows > args.xlsx_rows or shape == "wide"):
+						continue
+					params = {"fmt": fmt, "rows": rows, "columns": columns, "cardinality": args.cardinality, "null_ratio": args.null_ratio, "seed": args.seed}
+					key = f"{case}/{fmt}/{shape}/{rows}"
+					runs.append((key, case, params))
+	return runs
+
+def compare(results: dict, baseline: dict, time_threshold: float, rss_threshold: float) -> list:
+	"""
+	Print each result against the baseline and return the keys that regressed.
+	"""
+	regressions = []
+	for key, result in results.items():
+		base = baseline.get(key)
+		if base is None:
+			print(f"  {key:<38} new (no baseline)")
+			continue
+		slower = result["seconds"] / base["seconds"] - 1 if base["seconds"] else 0.0
+		bigger = result["peak_rss_mb"] / base["peak_rss_mb"] - 1 if base["peak_rss_mb"] else 0.0
+		flags = []
+		if slower > time_threshold and result["seconds"] - base["seconds"] > MIN_TIME_DELTA:
+			flags.append("TIME")
+		if bigger > rss_threshold:
+			flags.append("RSS")
+		if flags:
+			regressions.append(key)
+		print(f"  {key:<38} time {slower:+7.1%}  rss {bigger:+7.1%}  {' '.join(f'REGRESSION({f})' for f in flags)}")
+	return regressions
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--cases", default=",".join(CASES), help=f"comma-separated, from: {', '.join(CASES)}")
+	parser.add_argument("--sizes", default="10k,100k", help="row counts, e.g. 10k,100k,1m,10m")
+	parser.add_argument("--formats", default="csv,xlsx,json", help="upload formats for load/upload_clean")
+	parser.add_argument("--columns", type=int, default=8, help="columns of the narrow tables")
+	parser.add_argument("--wide", action="store_true", help=f"also run {WIDE_COLUMNS}-column tables")
+	parser.add_argument("--wide-rows", type=int, default=10_000, help="largest row count for wide tables")
+	parser.add_argument("--xlsx-rows", type=int, default=100_000, help="largest row count for xlsx (slow to write and parse; never wide)")
+	parser.add_argument("--query-rows", type=int, default=100_000, help="largest row count for /query")
+	parser.add_argument("--cardinality", type=int, default=100, help="distinct values per category column")
+	parser.add_argument("--null-ratio", type=float, default=0.05)
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="where generated datasets are cached")
+	parser.add_argument("--output", help="write results JSON here")
+	parser.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH, help="store results as the baseline")
+	parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, help="compare against a baseline; exit 1 on regressions")
+	parser.add_argument("--time-threshold", type=float, default=TIME_THRESHOLD)
+	parser.add_argument("--rss-threshold", type=float, default=RSS_THRESHOLD)
+	args = parser.parse_args()
+	args.cases = [c for c in args.cases.split(",") if c]
+	unknown = set(args.cases) - set(CASES)
+	if unknown:
+		parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+	args.sizes = [datasets.parse_rows(s) for s in args.sizes.split(",") if s]
+	args.formats = [f for f in args.formats.split(",") if f]
+	args.xlsx_rows = min(args.xlsx_rows, datasets.XLSX_MAX_ROWS)
+
+	# Case processes inherit this environment: in-process executor pools, a throwaway AI cache
+	scratch = tempfile.mkdtemp(prefix="bench-env-")
+	os.environ.setdefault("EXECUTOR_MODE", "thread")
+	os.environ["AI_CACHE_PATH"] = os.path.join(scratch, "ai_cache.sqlite3")
+	stub = start_ai_stub() if any(CASES[c][1] for c in args.cases) else None
+	results = {}
+	try:
+		for key, case, params in plan(args):
+			source_params = {k: params[k] for k in ("rows", "columns", "cardinality", "null_ratio", "seed")}
+			params["source"] = datasets.dataset_file(args.data_dir, params["fmt"], **source_params)
+			result = run_isolated(case, params, args.repeat)
+			result["rows"] = params["rows"]
+			result["columns"] = params["columns"]
+			result["rows_per_second"] = params["rows"] / result["seconds"]
+			if case in ("load", "upload_clean"):
+				result["mb_per_second"] = os.path.getsize(params["source"]) / 2 ** 20 / result["seconds"]
+			results[key] = result
+			rate = f"{result['rows_per_second']:12,.0f} rows/s"
+			if "mb_per_second" in result:
+				rate += f"  {result['mb_per_second']:7.1f} MB/s"
+			print(f"{key:<40} {1000 * result['seconds']:10.1f} ms  {result['peak_rss_mb']:8.1f} MB peak  {rate}", flush=True)
+	finally:
+		if stub is not None:
+			stub.terminate()
+			stub.wait()
+		shutil.rmtree(scratch, ignore_errors=True)
+
+	report = {
+		"machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+		"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"results": results,
+	}
+	if args.output:
+		with open(args.output, "w", encoding="utf-8") as f:
+			json.dump(report, f, indent=2)
+	if args.save_baseline:
+		with open(args.save_baseline, "w", encoding="utf-8") as f:
+			json.dump(report, f, indent=2)
+		print(f"baseline saved to {args.save_baseline}")
+	if args.compare:
+		with open(args.compare, encoding="utf-8") as f:
+			baseline = json.load(f)
+		print(f"compared with {args.compare} ({baseline.get('created', '?')})")
+		regressions = compare(results, baseline.get("results", {}), args.time_threshold, args.rss_threshold)
+		if regressions:
+			print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+			sys.exit(1)
+		print("no regressions")
+
+if __name__ == "__main__":
+	main()
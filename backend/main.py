@@ -6,60 +6,71 @@ Implements upload, preview, clean, stats, query, visualize, download endpoints.
 """
 
 import os
+import json
 from dotenv import load_dotenv
 load_dotenv()
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, Response, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.background import BackgroundTasks
 import uvicorn
 
 # Import utility modules
-from utils import file_utils, data_handler, ai_handler, viz_handler
-import pandas as pd
-def save_stats_files(stats: dict, dataset_id: str):
-	"""
-	Save summary stats in CSV, XLSX, and JSON formats for download.
-	Handles nested dicts/lists and non-serializable values.
-	"""
-	import json
-	stats_dir = os.path.join(os.path.dirname(__file__), 'utils', 'stats_exports')
-	if not os.path.exists(stats_dir):
-		os.makedirs(stats_dir)
-	# Save as JSON
-	json_path = os.path.join(stats_dir, f'stats_{dataset_id}.json')
-	with open(json_path, 'w', encoding='utf-8') as f:
-		json.dump(stats, f, indent=2, default=str)
-
-	def flatten(d, parent_key="", sep="."):
-		items = {}
-		if isinstance(d, dict):
-			for k, v in d.items():
-				new_key = f"{parent_key}{sep}{k}" if parent_key else k
-				if isinstance(v, dict):
-					items.update(flatten(v, new_key, sep=sep))
-				elif isinstance(v, list):
-					for i, item in enumerate(v):
-						items.update(flatten(item, f"{new_key}[{i}]", sep=sep))
-				else:
-					items[new_key] = v
-		else:
-			items[parent_key] = d
-		return items
-
-	flat = flatten(stats)
-	# Save as CSV
-	csv_path = os.path.join(stats_dir, f'stats_{dataset_id}.csv')
-	pd.DataFrame(list(flat.items()), columns=["stat", "value"]).to_csv(csv_path, index=False)
-	# Save as XLSX
-	xlsx_path = os.path.join(stats_dir, f'stats_{dataset_id}.xlsx')
-	pd.DataFrame(list(flat.items()), columns=["stat", "value"]).to_excel(xlsx_path, index=False, engine='openpyxl')
-	return {"csv": csv_path, "xlsx": xlsx_path, "json": json_path}
-
-app = FastAPI()
-
-# CORS setup (allow localhost:5173 for Vite dev)
+from utils import file_utils, ai_handler, ai_client, ai_cache, executor, ingest, tasks, jobs, ops, serialize, tracing
+from utils.serialize import FastJSONResponse
+
+# Responses are encoded by serialize.dumps; data endpoints return FastJSONResponse
+# directly, which also skips FastAPI's per-value jsonable_encoder pass
+app = FastAPI(default_response_class=FastJSONResponse)
+
+@app.on_event("startup")
+def recover_jobs():
+	jobs.recover()
+
+@app.on_event("shutdown")
+async def shutdown_executor():
+	executor.shutdown()
+	ingest.shutdown()
+	await ai_client.aclose()
+
+# File upload size limit (default 2 GB), override with MAX_UPLOAD_SIZE (bytes)
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 2 * 1024 * 1024 * 1024))
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+	"""
+	Reject uploads whose declared Content-Length is over the limit before the
+	body is read. Bodies without one (chunked) are cut off by save_upload.
+	"""
+	if request.url.path == "/upload":
+		content_length = request.headers.get("content-length")
+		if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_SIZE + file_utils.MULTIPART_OVERHEAD:
+			return JSONResponse(status_code=413, content={"detail": f"File too large (max {MAX_UPLOAD_SIZE // (1024 * 1024)}MB)."})
+	return await call_next(request)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+	"""
+	Trace each request: stage timings go out as a Server-Timing header and into
+	the /metrics histograms. With PROFILING_ENABLED, ?profile=1 or "X-Profile: 1"
+	also samples the request's stacks; the response then names the profile in X-Profile-Id.
+	"""
+	profile = request.query_params.get("profile") == "1" or request.headers.get("x-profile") == "1"
+	with tracing.request_trace(profile) as trace:
+		status = 500
+		try:
+			response = await call_next(request)
+			status = response.status_code
+			# Streamed responses (SSE) only cover the time to their first byte
+			response.headers["Server-Timing"] = trace.server_timing()
+		finally:
+			route = request.scope.get("route")
+			profile_id = tracing.finish(trace, request.method, getattr(route, "path", "unmatched"), status)
+		if profile_id:
+			response.headers["X-Profile-Id"] = profile_id
+	return response
+
+# CORS setup (allow localhost:5173 for Vite dev); added last so it also wraps early rejections
 origins = [
 	"http://localhost:5173",
 	"http://127.0.0.1:5173",
@@ -73,31 +84,25 @@ app.add_middleware(
 	allow_headers=["*"],
 )
 
-# File upload size limit (20 MB)
-MAX_UPLOAD_SIZE = 20 * 1024 * 1024
-
 @app.post("/upload")
-async def upload(file: UploadFile = File(...)):
-	"""
-	Upload CSV/XLSX/JSON file, save, return dataset_id, preview, columns.
-	"""
-	if file is None or file.filename == "":
-		raise HTTPException(status_code=400, detail="No file uploaded.")
-	ext = os.path.splitext(file.filename)[-1].lower()
-	if ext not in ['.csv', '.xlsx', '.json']:
-		raise HTTPException(status_code=400, detail="Unsupported file type.")
-	file.file.seek(0, 2)
-	size = file.file.tell()
-	file.file.seek(0)
-	if size > MAX_UPLOAD_SIZE:
-		raise HTTPException(status_code=413, detail="File too large (max 20MB).")
-	try:
-		dataset_id = file_utils.save_upload(file)
-		df = file_utils.load_dataframe(dataset_id)
-		# Replace out-of-bounds float values in preview
-		preview = df.head(20).replace([float('inf'), float('-inf')], None).where(pd.notnull(df.head(20)), None).to_dict(orient="records")
-		columns = list(df.columns)
-		return JSONResponse(content={"dataset_id": dataset_id, "preview": preview, "columns": columns})
+async def upload(request: Request):
+	"""
+	Upload CSV/XLSX/JSON file (multipart field "file"), save, return dataset_id, preview, columns.
+	The body is parsed as it arrives, so the file goes straight to disk.
+	"""
+	try:
+		dataset_id = await file_utils.save_upload(request.stream(), request.headers.get("content-type"), max_bytes=MAX_UPLOAD_SIZE)
+	except file_utils.UploadTooLargeError as e:
+		raise HTTPException(status_code=413, detail=str(e))
+	except ValueError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	try:
+		# Parse (and convert to the Arrow copy) in a worker; preview has NaN/inf replaced
+		head = await executor.run_cpu("upload", tasks.head_records, dataset_id, 20)
+		# Aggregate the low-cardinality columns once the response is out (see utils/cube.py)
+		background = BackgroundTasks()
+		background.add_task(executor.run_cpu, "cube", tasks.build_cube, dataset_id)
+		return FastJSONResponse({"dataset_id": dataset_id, "preview": head["preview"], "columns": head["columns"]}, background=background)
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=str(e))
 
@@ -107,13 +112,32 @@ async def preview(dataset_id: str):
 	Return first 20 rows of dataset as preview.
 	"""
 	try:
-		df = file_utils.load_dataframe(dataset_id)
-		preview = df.head(20).to_dict(orient="records")
-		columns = list(df.columns)
-		return JSONResponse(content={"dataset_id": dataset_id, "preview": preview, "columns": columns})
+		head = await executor.run_cpu("preview", tasks.head_records, dataset_id, 20)
+		return FastJSONResponse({"dataset_id": dataset_id, "preview": head["preview"], "columns": head["columns"]})
 	except Exception as e:
 		raise HTTPException(status_code=404, detail=str(e))
 
+@app.get("/rows/{dataset_id}")
+async def get_rows(dataset_id: str, offset: int = 0, limit: int = 50, sort: str = None, filter: str = None):
+	"""
+	Page through a dataset: rows [offset, offset + limit), optionally sorted
+	(sort=col or sort=-col) and filtered (filter = JSON list of {col, cmp, value}).
+	"""
+	try:
+		filters = json.loads(filter) if filter else []
+		if isinstance(filters, dict):
+			filters = [filters]
+		if not isinstance(filters, list) or not all(isinstance(f, dict) for f in filters):
+			raise ValueError("filter must be a JSON object or list of objects.")
+	except ValueError as e:
+		raise HTTPException(status_code=400, detail=f"Invalid filter: {e}")
+	try:
+		return FastJSONResponse(await executor.run_cpu("rows", tasks.rows_page, dataset_id, offset, limit, sort, filters))
+	except ops.OpValidationError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	except FileNotFoundError as e:
+		raise HTTPException(status_code=404, detail=str(e))
+
 @app.post("/clean/{dataset_id}")
 async def clean(dataset_id: str, request: Request):
 	"""
@@ -121,43 +145,32 @@ async def clean(dataset_id: str, request: Request):
 	"""
 	try:
 		body = await request.json()
-		strategy = body.get("strategy", None)
-		df = file_utils.load_dataframe(dataset_id)
-		# Drop columns before cleaning/stats if specified
-		drop_cols = strategy.get("drop_columns", [])
-		if drop_cols:
-			df = df.drop(columns=drop_cols, errors='ignore')
-		cleaned_df = data_handler.auto_clean(df, strategy)
-		# Save cleaned data in all formats for download
-		file_utils.save_dataframe(cleaned_df, dataset_id, format="csv")
-		try:
-			file_utils.save_dataframe(cleaned_df, dataset_id, format="xlsx")
-		except Exception:
-			pass
-		try:
-			file_utils.save_dataframe(cleaned_df, dataset_id, format="json")
-		except Exception:
-			pass
-		preview = data_handler.get_preview(cleaned_df, 20)
-		# Replace out-of-bounds float values in preview
-		import pandas as pd
-		preview = pd.DataFrame(preview).replace([float('inf'), float('-inf')], None).where(pd.notnull(pd.DataFrame(preview)), None).to_dict(orient="records") if preview else []
-		stats = data_handler.get_summary_stats(cleaned_df)
-		save_stats_files(stats, dataset_id)
-		return {"preview": preview, "stats": stats, "cleaned": True}
+		strategy = body.get("strategy") or {}
+		result = await executor.run_cpu("clean", tasks.clean_dataset, dataset_id, strategy)
+		return FastJSONResponse({"preview": result["preview"], "stats": result["stats"], "pipeline": result["pipeline"], "cleaned": True})
+	except ops.OpValidationError as e:
+		raise HTTPException(status_code=400, detail=str(e))
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/memory/{dataset_id}")
+async def memory(dataset_id: str):
+	"""
+	Dataset memory footprint before/after dtype optimization and the resulting column dtypes.
+	"""
+	try:
+		return FastJSONResponse(await executor.run_cpu("memory", tasks.memory_report, dataset_id))
+	except FileNotFoundError as e:
+		raise HTTPException(status_code=404, detail=str(e))
+
 @app.get("/stats/{dataset_id}")
 async def stats(dataset_id: str):
 	"""
 	Return summary statistics for dataset.
 	"""
 	try:
-		df = file_utils.load_dataframe(dataset_id)
-		stats = data_handler.get_summary_stats(df)
-		save_stats_files(stats, dataset_id)
-		return {"dataset_id": dataset_id, "stats": stats}
+		stats = await executor.run_cpu("stats", tasks.dataset_stats, dataset_id)
+		return FastJSONResponse({"dataset_id": dataset_id, "stats": stats})
 	except Exception as e:
 		raise HTTPException(status_code=404, detail=str(e))
 # Download summary stats in any format
@@ -165,22 +178,17 @@ async def stats(dataset_id: str):
 async def download_stats(dataset_id: str, format: str = "csv"):
 	"""
 	Download summary stats as CSV/XLSX/JSON.
+	The requested format is rendered from the persisted stats on first download.
 	"""
+	ext = format.lower()
+	if ext not in ["csv", "xlsx", "json"]:
+		raise HTTPException(status_code=400, detail="Invalid format.")
 	try:
-		stats_dir = os.path.join(os.path.dirname(__file__), 'utils', 'stats_exports')
-		ext = format.lower()
-		if ext not in ["csv", "xlsx", "json"]:
-			raise HTTPException(status_code=400, detail="Invalid format.")
-		file_path = os.path.join(stats_dir, f'stats_{dataset_id}.{ext}')
-		if not os.path.exists(file_path):
-			# Try to generate if missing
-			df = file_utils.load_dataframe(dataset_id)
-			stats = data_handler.get_summary_stats(df)
-			save_stats_files(stats, dataset_id)
-		if not os.path.exists(file_path):
-			raise HTTPException(status_code=404, detail="Stats file not found.")
+		file_path = await executor.run_cpu("download_stats", tasks.stats_export, dataset_id, ext)
 		filename = os.path.basename(file_path)
 		return FileResponse(file_path, media_type="application/octet-stream", filename=filename)
+	except FileNotFoundError as e:
+		raise HTTPException(status_code=404, detail=str(e))
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=str(e))
 
@@ -195,15 +203,82 @@ async def query(request: Request):
 		question = body.get("question")
 		if not dataset_id or not question:
 			raise HTTPException(status_code=400, detail="dataset_id and question required.")
-		df = file_utils.load_dataframe(dataset_id)
-		snapshot = df.head(30).to_json(orient='records')
-		columns = list(df.columns)
-		stats = df.describe(include='all').to_string()
-		ai_response = ai_handler.ask_ai_for_query(snapshot, columns, stats, question)
+		# Repeated questions about unchanged data are answered from the response cache
+		version = await executor.run_io("query", file_utils.dataset_version, dataset_id)
+		ai_response = await ai_handler.cached_query_answer(version, question)
+		if ai_response is None:
+			context = await executor.run_cpu("query", tasks.query_context, dataset_id, ai_handler.profile_token_budget())
+			ai_response = await ai_handler.ask_ai_for_query(context["profile"], question, dataset_version=version)
 		# If AI response is missing, empty, or not useful, return a clear error
 		if not ai_response or not ai_response.get('insight') or not ai_response['insight'].strip():
 			raise HTTPException(status_code=500, detail="AI model returned an empty or invalid response. Please try again or use a different model.")
-		return ai_response
+		if ai_response.get("chart") or ai_response.get("compute"):
+			# Chart data and numeric answers are computed on the full dataset, not taken from the model
+			local = await executor.run_cpu("query", tasks.answer_query, dataset_id, ai_response)
+			ai_response = {**ai_response, **local}
+		return FastJSONResponse(ai_response)
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/query/stream")
+async def query_stream(request: Request):
+	"""
+	Streaming /query: server-sent events with "insight" text deltas while the
+	model generates, then one "result" event with the full answer (or "error").
+	"""
+	body = await request.json()
+	dataset_id = body.get("dataset_id")
+	question = body.get("question")
+	if not dataset_id or not question:
+		raise HTTPException(status_code=400, detail="dataset_id and question required.")
+	try:
+		version = await executor.run_io("query", file_utils.dataset_version, dataset_id)
+	except FileNotFoundError as e:
+		raise HTTPException(status_code=404, detail=str(e))
+
+	def event(name: str, data) -> str:
+		return f"event: {name}\ndata: {serialize.dumps(data).decode()}\n\n"
+
+	async def event_stream():
+		# Flush headers right away so the client sees the first byte immediately
+		yield ": connected\n\n"
+		try:
+			ai_response = await ai_handler.cached_query_answer(version, question)
+			if ai_response is None:
+				context = await executor.run_cpu("query", tasks.query_context, dataset_id, ai_handler.profile_token_budget())
+				async for kind, value in ai_handler.stream_query(context["profile"], question, dataset_version=version):
+					if kind == "insight":
+						yield event("insight", {"text": value})
+					else:
+						ai_response = value
+			if not ai_response or not str(ai_response.get("insight", "")).strip():
+				yield event("error", {"detail": "AI model returned an empty or invalid response. Please try again or use a different model."})
+				return
+			if ai_response.get("chart") or ai_response.get("compute"):
+				local = await executor.run_cpu("query", tasks.answer_query, dataset_id, ai_response)
+				ai_response = {**ai_response, **local}
+			yield event("result", ai_response)
+		except Exception as e:
+			yield event("error", {"detail": str(e)})
+
+	return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/transform")
+async def transform(request: Request):
+	"""
+	Accept dataset_id + ops list (as suggested by the AI), apply them to the full
+	dataset and return a preview; optional chart_spec/compute run on the result.
+	"""
+	body = await request.json()
+	dataset_id = body.get("dataset_id")
+	if not dataset_id:
+		raise HTTPException(status_code=400, detail="dataset_id required.")
+	try:
+		return FastJSONResponse(await executor.run_cpu("transform", tasks.run_ops, dataset_id, body.get("ops") or [], body.get("chart_spec"), body.get("compute")))
+	except ops.OpValidationError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+	except FileNotFoundError as e:
+		raise HTTPException(status_code=404, detail=str(e))
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=str(e))
 
@@ -218,38 +293,169 @@ async def visualize(request: Request):
 		chart_spec = body.get("chart_spec")
 		if not dataset_id or not chart_spec:
 			raise HTTPException(status_code=400, detail="dataset_id and chart_spec required.")
-		df = file_utils.load_dataframe(dataset_id)
-		chart_json = viz_handler.prepare_chart_data(df, chart_spec)
-		return {"chart": chart_json}
+		chart_json = await executor.run_cpu("visualize", tasks.chart_data, dataset_id, chart_spec)
+		return FastJSONResponse({"chart": chart_json})
+	except HTTPException:
+		raise
+	except ops.OpValidationError as e:
+		raise HTTPException(status_code=400, detail=str(e))
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=str(e))
 
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+	tags = [tag.strip() for tag in if_none_match.split(",")]
+	return "*" in tags or etag in tags or f"W/{etag}" in tags
+
 @app.get("/download/{dataset_id}")
-async def download(dataset_id: str, format: str = "csv"):
-	"""
-	Download cleaned file as CSV/XLSX/JSON.
-	"""
-	try:
-		# Prefer cleaned file, fallback to original
-		cleaned_path = None
-		for ext in [".csv", ".xlsx", ".json"]:
-			path = os.path.join(file_utils.UPLOAD_DIR, f"cleaned_{dataset_id}{ext}")
-			if os.path.exists(path) and (format in path):
-				cleaned_path = path
-				break
-		if not cleaned_path:
-			# fallback to original
-			for ext in [".csv", ".xlsx", ".json"]:
-				path = os.path.join(file_utils.UPLOAD_DIR, f"{dataset_id}{ext}")
-				if os.path.exists(path) and (format in path):
-					cleaned_path = path
-					break
-		if not cleaned_path:
-			raise HTTPException(status_code=404, detail="File not found.")
-		filename = os.path.basename(cleaned_path)
-		return FileResponse(cleaned_path, media_type="application/octet-stream", filename=filename)
+async def download(dataset_id: str, request: Request, format: str = "csv"):
+	"""
+	Download cleaned file as CSV/XLSX/JSON/Parquet.
+	The requested format is rendered from the canonical cleaned copy on first
+	download and cached; responses carry an ETag for conditional requests.
+	"""
+	ext = format.lower()
+	if ext not in file_utils.CLEANED_FORMATS:
+		raise HTTPException(status_code=400, detail="Invalid format.")
+	# Prefer cleaned data, fallback to original
+	source = file_utils.cleaned_source(dataset_id) or os.path.join(file_utils.UPLOAD_DIR, f"{dataset_id}.{ext}")
+	if not os.path.exists(source):
+		raise HTTPException(status_code=404, detail="File not found.")
+	# The tag follows the source, so unchanged data can be revalidated without rendering
+	etag = file_utils.file_etag(source, ext)
+	if _etag_matches(request.headers.get("if-none-match", ""), etag):
+		return Response(status_code=304, headers={"ETag": etag})
+	try:
+		file_path = await executor.run_cpu("download", tasks.cleaned_download, dataset_id, ext)
+	except FileNotFoundError as e:
+		raise HTTPException(status_code=404, detail=str(e))
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=str(e))
+	filename = os.path.basename(file_path)
+	return FileResponse(file_path, media_type="application/octet-stream", filename=filename, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@app.post("/jobs/{kind}/{dataset_id}", status_code=202)
+async def submit_job(kind: str, dataset_id: str, request: Request):
+	"""
+	Start a clean/stats/export job in the background and return its id.
+	Body (optional): {"strategy": {...}, "formats": [...]} for clean, {"formats": [...]} for export.
+	"""
+	if kind not in jobs.JOB_KINDS:
+		raise HTTPException(status_code=404, detail=f"Unknown job kind: {kind}")
+	raw = await request.body()
+	try:
+		params = json.loads(raw) if raw else {}
+	except ValueError:
+		raise HTTPException(status_code=400, detail="Invalid JSON body.")
+	try:
+		file_utils.dataset_version(dataset_id)
+	except FileNotFoundError as e:
+		raise HTTPException(status_code=404, detail=str(e))
+	job = jobs.submit(kind, dataset_id, params)
+	return {"job_id": job["id"], "status": job["status"]}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+	"""
+	Return job status, overall progress and per-stage timings.
+	"""
+	job = jobs.get(job_id)
+	if job is None:
+		raise HTTPException(status_code=404, detail="Job not found.")
+	return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+	"""
+	Server-sent events stream of job updates, closed once the job finishes.
+	"""
+	if jobs.get(job_id) is None:
+		raise HTTPException(status_code=404, detail="Job not found.")
+
+	async def event_stream():
+		since = 0.0
+		while True:
+			job = await jobs.wait_for_change(job_id, since)
+			if job is None:
+				return
+			if job.get("updated_at", 0) > since:
+				since = job["updated_at"]
+				yield f"event: progress\ndata: {serialize.dumps(job).decode()}\n\n"
+			else:
+				# Keep idle connections open through proxies
+				yield ": keep-alive\n\n"
+			if job["status"] in jobs.TERMINAL_STATES:
+				return
+
+	return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+	"""
+	Return the result of a finished job (409 while it is still running).
+	"""
+	job = jobs.get(job_id)
+	if job is None:
+		raise HTTPException(status_code=404, detail="Job not found.")
+	if job["status"] != "succeeded":
+		raise HTTPException(status_code=409, detail=f"Job is {job['status']}.")
+	return FastJSONResponse({"job_id": job_id, "result": jobs.get_result(job_id)})
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+	"""
+	Cancel a queued or running job.
+	"""
+	job = jobs.cancel(job_id)
+	if job is None:
+		raise HTTPException(status_code=404, detail="Job not found.")
+	return {"job_id": job_id, "status": job["status"]}
+
+@app.get("/cache/stats")
+async def cache_stats():
+	"""
+	Return dataset and chart aggregate cache counters (hits, misses, evictions, bytes) for sizing.
+	In the executor's process mode each worker keeps its own caches; the counters
+	then come from whichever worker runs this.
+	"""
+	return FastJSONResponse(await executor.run_cpu("cache_stats", tasks.cache_stats))
+
+@app.get("/ai/stats")
+async def ai_stats():
+	"""
+	Return AI client call, retry, latency and token counters, plus response cache hits.
+	"""
+	return {**ai_client.stats(), "cache": await executor.run_io("ai_cache", ai_cache.stats)}
+
+@app.get("/metrics")
+async def metrics():
+	"""
+	Prometheus metrics: request and stage latency histograms, dataset sizes,
+	cache hit rates and executor queue depth. Cache counters come from the
+	worker that runs this, as for /cache/stats.
+	"""
+	caches = await executor.run_cpu("metrics", tasks.cache_stats)
+	caches = {name: stats for name, stats in caches.items() if isinstance(stats, dict)}
+	ai = await executor.run_io("ai_cache", ai_cache.stats)
+	caches["ai_cache"] = {"hits": ai["exact_hits"] + ai["similar_hits"], "misses": ai["misses"], "hit_rate": ai["hit_rate"]}
+	body = tracing.render_metrics(caches, executor.stats()["endpoints"])
+	return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+	"""
+	Collapsed stacks of a profiled request (see trace_requests), for flamegraph tools.
+	"""
+	profile = tracing.get_profile(profile_id)
+	if profile is None:
+		raise HTTPException(status_code=404, detail="Profile not found.")
+	return PlainTextResponse(profile)
+
+@app.get("/executor/stats")
+async def executor_stats():
+	"""
+	Return worker pool configuration and per-endpoint queue depth and latency.
+	"""
+	return executor.stats()
 
 if __name__ == "__main__":
 	uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
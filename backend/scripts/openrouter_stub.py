@@ -0,0 +1,74 @@
+# openrouter_stub.py
+"""
+Local stand-in for the OpenRouter chat completions API, for exercising ai_client
+without network access or API credits.
+
+Run:  python scripts/openrouter_stub.py --port 8001
+Then start the backend with
+	OPENROUTER_URL=http://127.0.0.1:8001/api/v1/chat/completions OPENROUTER_API_KEY=stub
+
+Failure injection flags:
+	--latency 0.2         seconds to wait before answering
+	--fail-every 3        every 3rd request returns 503
+	--rate-limit-every 5  every 5th request returns 429 with Retry-After
+	--token-delay 0.02    seconds between chunks of a streamed ("stream": true) answer
+"""
+import argparse
+import asyncio
+import itertools
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+app = FastAPI()
+config = {"latency": 0.0, "fail_every": 0, "rate_limit_every": 0, "token_delay": 0.02}
+counter = itertools.count(1)
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request):
+	body = await request.json()
+	n = next(counter)
+	await asyncio.sleep(config["latency"])
+	if config["rate_limit_every"] and n % config["rate_limit_every"] == 0:
+		return JSONResponse(status_code=429, content={"error": "rate limited"}, headers={"Retry-After": "0.1"})
+	if config["fail_every"] and n % config["fail_every"] == 0:
+		return JSONResponse(status_code=503, content={"error": "upstream unavailable"})
+	prompt = body["messages"][-1]["content"]
+	content = json.dumps({
+		"insight": f"Stub answer #{n} for a {len(prompt)}-character prompt.",
+		"confidence": "medium",
+	})
+	usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4, "total_tokens": (len(prompt) + len(content)) // 4}
+	if body.get("stream"):
+		return StreamingResponse(_stream(n, content, usage), media_type="text/event-stream")
+	return {
+		"id": f"stub-{n}",
+		"model": body.get("model"),
+		"choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+		"usage": usage,
+	}
+
+async def _stream(n, content, usage):
+	# OpenAI-style chunks of a few characters each, then usage and [DONE]
+	yield ": OPENROUTER PROCESSING\n\n"
+	for i in range(0, len(content), 8):
+		chunk = {"id": f"stub-{n}", "choices": [{"index": 0, "delta": {"content": content[i:i + 8]}, "finish_reason": None}]}
+		yield f"data: {json.dumps(chunk)}\n\n"
+		await asyncio.sleep(config["token_delay"])
+	done = {"id": f"stub-{n}", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+	yield f"data: {json.dumps(done)}\n\n"
+	yield "data: [DONE]\n\n"
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=8001)
+	parser.add_argument("--latency", type=float, default=0.0)
+	parser.add_argument("--fail-every", type=int, default=0)
+	parser.add_argument("--rate-limit-every", type=int, default=0)
+	parser.add_argument("--token-delay", type=float, default=0.02)
+	args = parser.parse_args()
+	config.update(latency=args.latency, fail_every=args.fail_every, rate_limit_every=args.rate_limit_every, token_delay=args.token_delay)
+	uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,108 @@
+# conftest.py
+"""
+Shared fixtures. Tests import the backend as the server does (from utils import ...),
+and anything that touches disk gets its own upload and stats directories.
+"""
+import asyncio
+import importlib.util
+import os
+import sys
+
+import httpx
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# Endpoint work runs in the test's own thread, sharing its patched directories
+os.environ.setdefault("EXECUTOR_MODE", "inline")
+
+from utils import ai_cache, ai_client, ai_handler, file_utils, stats_store  # noqa: E402
+
+STUB_URL = "http://stub/api/v1/chat/completions"
+
+@pytest.fixture
+def data_dirs(tmp_path, monkeypatch):
+	"""
+	Point uploads and persisted stats at temporary directories.
+	"""
+	monkeypatch.setattr(file_utils, "UPLOAD_DIR", str(tmp_path / "uploads"))
+	monkeypatch.setattr(stats_store, "STATS_DIR", str(tmp_path / "stats"))
+	os.makedirs(file_utils.UPLOAD_DIR)
+	file_utils.dataset_cache.clear()
+	yield tmp_path
+	file_utils.dataset_cache.clear()
+
+@pytest.fixture
+def ai_cache_db(tmp_path, monkeypatch):
+	"""
+	An empty AI response cache in its own SQLite file.
+	"""
+	monkeypatch.setattr(ai_cache, "AI_CACHE_PATH", str(tmp_path / "ai_cache.sqlite3"))
+	monkeypatch.setattr(ai_cache, "_conn", None)
+	yield ai_cache
+	if ai_cache._conn is not None:
+		ai_cache._conn.close()
+
+@pytest.fixture
+def ai_stub(monkeypatch):
+	"""
+	scripts/openrouter_stub.py served in-process behind ai_client at STUB_URL,
+	with no backoff or token delay. ai_stub.calls counts requests.
+	"""
+	path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "openrouter_stub.py")
+	spec = importlib.util.spec_from_file_location("openrouter_stub", path)
+	stub = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(stub)
+	stub.config["token_delay"] = 0
+	stub.calls = 0
+
+	async def app(scope, receive, send):
+		if scope["type"] == "http":
+			stub.calls += 1
+		await stub.app(scope, receive, send)
+
+	def get_client():
+		return httpx.AsyncClient(transport=httpx.ASGITransport(app=app)), asyncio.Semaphore(ai_client.AI_MAX_IN_FLIGHT)
+
+	monkeypatch.setattr(ai_client, "_get_client", get_client)
+	monkeypatch.setattr(ai_client, "AI_MAX_RETRIES", 3)
+	monkeypatch.setattr(ai_client, "AI_BACKOFF_MAX", 0)
+	monkeypatch.setattr(ai_handler, "OPENROUTER_URL", STUB_URL)
+	monkeypatch.setattr(ai_handler, "OPENROUTER_API_KEY", "stub")
+	return stub
+
+@pytest.fixture
+def sales() -> pd.DataFrame:
+	"""
+	A frame as read_csv returns it: int, float (some integral with NaN), text and ISO date columns.
+	"""
+	rng = np.random.default_rng(0)
+	n = 5000
+	df = pd.DataFrame({
+		"region": rng.choice(["North", "South", "East", "West"], n),
+		"product": rng.choice([f"p{i}" for i in range(40)], n),
+		"quantity": rng.integers(1, 20, n),
+		"price": rng.normal(100, 30, n).round(2),
+		# Integral values with gaps, stored as float64 by read_csv; totals far above 2**24
+		"units": np.where(rng.random(n) < 0.1, np.nan, rng.integers(100_000, 1_000_000, n)).astype(float),
+		"orderdate": pd.Series(pd.date_range("2024-01-01", periods=90).strftime("%Y-%m-%d")).sample(n, replace=True, random_state=0).to_numpy(),
+		"note": [f"order {i}" for i in range(n)],
+	})
+	df.loc[rng.random(n) < 0.05, "orderdate"] = None
+	df.loc[rng.random(n) < 0.05, "region"] = None
+	return df
+
+@pytest.fixture
+def client(data_dirs):
+	from fastapi.testclient import TestClient
+	import main
+	return TestClient(main.app)
+
+def upload_csv(client, df: pd.DataFrame, name: str = "data.csv") -> str:
+	"""
+	Upload df as a CSV file and return its dataset_id.
+	"""
+	r = client.post("/upload", files={"file": (name, df.to_csv(index=False).encode("utf-8"), "text/csv")})
+	assert r.status_code == 200, r.text
+	return r.json()["dataset_id"]
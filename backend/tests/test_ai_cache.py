@@ -0,0 +1,104 @@
+# test_ai_cache.py
+"""
+AI response cache: hits on the same normalized question, misses once the
+dataset version or model changes, expiry and LRU eviction.
+"""
+import os
+
+import pytest
+
+from utils import ai_handler, file_utils
+from conftest import upload_csv
+
+@pytest.fixture
+def clock(monkeypatch, ai_cache_db):
+	"""
+	Controlled time.time for ai_cache; advance with clock.now += seconds.
+	"""
+	class Clock:
+		now = 1_000_000.0
+
+		def time(self):
+			return self.now
+
+		def perf_counter(self):
+			return self.now
+
+	clock = Clock()
+	monkeypatch.setattr(ai_cache_db, "time", clock)
+	return clock
+
+def _delta(before, after):
+	return {k: after[k] - before[k] for k in ("exact_hits", "similar_hits", "misses", "stores", "evictions")}
+
+def test_hit(ai_cache_db):
+	before = ai_cache_db.stats()
+	ai_cache_db.put("v1", "What is the total revenue?", "m", {"insight": "42"})
+	assert ai_cache_db.get("v1", "  what is the TOTAL revenue ", "m") == {"insight": "42"}
+	assert _delta(before, ai_cache_db.stats()) == {"exact_hits": 1, "similar_hits": 0, "misses": 0, "stores": 1, "evictions": 0}
+
+def test_miss_on_other_version_or_model(ai_cache_db):
+	ai_cache_db.put("v1", "total revenue", "m", {"insight": "42"})
+	before = ai_cache_db.stats()
+	assert ai_cache_db.get("v2", "total revenue", "m") is None
+	assert ai_cache_db.get("v1", "total revenue", "other") is None
+	assert ai_cache_db.get("v1", "average revenue", "m") is None
+	assert _delta(before, ai_cache_db.stats())["misses"] == 3
+
+def test_similar_hit_stays_within_version(ai_cache_db, monkeypatch):
+	monkeypatch.setattr(ai_cache_db, "AI_CACHE_SIMILARITY", 0.8)
+	ai_cache_db.put("v1", "what is the total revenue by region", "m", {"insight": "by region"})
+	before = ai_cache_db.stats()
+	assert ai_cache_db.get("v1", "what is the total revenue per region", "m") is None
+	assert ai_cache_db.get("v1", "what is total revenue by region", "m") == {"insight": "by region"}
+	assert ai_cache_db.get("v2", "what is total revenue by region", "m") is None
+	assert _delta(before, ai_cache_db.stats())["similar_hits"] == 1
+
+def test_evicts_least_recently_used(ai_cache_db, clock, monkeypatch):
+	ai_cache = ai_cache_db
+	monkeypatch.setattr(ai_cache, "AI_CACHE_MAX_ENTRIES", 3)
+	for question in ["q1", "q2", "q3"]:
+		clock.now += 1
+		ai_cache.put("v1", question, "m", {"insight": question})
+	clock.now += 1
+	assert ai_cache.get("v1", "q1", "m") == {"insight": "q1"}
+	before = ai_cache.stats()
+	clock.now += 1
+	ai_cache.put("v1", "q4", "m", {"insight": "q4"})
+	after = ai_cache.stats()
+	assert after["entries"] == 3
+	assert _delta(before, after)["evictions"] == 1
+	# q2 was the least recently used once q1 was read
+	assert ai_cache.get("v1", "q2", "m") is None
+	assert [ai_cache.get("v1", q, "m") for q in ["q1", "q3", "q4"]] == [{"insight": q} for q in ["q1", "q3", "q4"]]
+
+def test_expires_after_ttl(ai_cache_db, clock, monkeypatch):
+	ai_cache = ai_cache_db
+	monkeypatch.setattr(ai_cache, "AI_CACHE_TTL", 60)
+	ai_cache.put("v1", "old", "m", {"insight": "old"})
+	clock.now += 61
+	assert ai_cache.get("v1", "old", "m") is None
+	ai_cache.put("v1", "new", "m", {"insight": "new"})
+	assert ai_cache.stats()["entries"] == 1
+
+def test_query_cached_until_dataset_changes(client, sales, ai_cache_db, monkeypatch):
+	calls = []
+
+	async def complete(prompt, max_tokens=1000):
+		calls.append(prompt)
+		return {"insight": f"answer {len(calls)}", "confidence": "high"}, True
+
+	monkeypatch.setattr(ai_handler, "_complete", complete)
+	dataset_id = upload_csv(client, sales)
+	ask = {"dataset_id": dataset_id, "question": "Which region sells most?"}
+	assert client.post("/query", json=ask).json()["insight"] == "answer 1"
+	assert client.post("/query", json={**ask, "question": "which region sells most"}).json()["insight"] == "answer 1"
+	assert len(calls) == 1
+
+	# New content under the same id is a new dataset version
+	path = os.path.join(file_utils.UPLOAD_DIR, f"{dataset_id}.csv")
+	sales.head(100).to_csv(path, index=False)
+	st = os.stat(path)
+	os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+	assert client.post("/query", json=ask).json()["insight"] == "answer 2"
+	assert len(calls) == 2
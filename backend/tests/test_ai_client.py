@@ -0,0 +1,72 @@
+# test_ai_client.py
+"""
+ai_client retries against the OpenRouter stub (scripts/openrouter_stub.py),
+served in-process: 429/5xx are retried until AI_MAX_RETRIES, other 4xx are not.
+"""
+import asyncio
+
+import pytest
+
+from utils import ai_client
+from conftest import STUB_URL as URL
+
+PAYLOAD = {"model": "stub", "messages": [{"role": "user", "content": "How many rows?"}]}
+
+async def _collect(url):
+	return [chunk async for chunk in ai_client.stream_chat(url, PAYLOAD)]
+
+@pytest.mark.parametrize("flag", ["fail_every", "rate_limit_every"])
+def test_retries_then_succeeds(ai_stub, flag):
+	# Every 2nd request fails: the first call succeeds, the second needs one retry
+	ai_stub.config[flag] = 2
+	retries = ai_client.metrics.retries
+	first = asyncio.run(ai_client.post_json(URL, PAYLOAD))
+	second = asyncio.run(ai_client.post_json(URL, PAYLOAD))
+	assert "#1 " in first["choices"][0]["message"]["content"]
+	assert "#3 " in second["choices"][0]["message"]["content"]
+	assert ai_stub.calls == 3
+	assert ai_client.metrics.retries - retries == 1
+
+@pytest.mark.parametrize("flag, status", [("fail_every", 503), ("rate_limit_every", 429)])
+def test_gives_up_after_max_retries(ai_stub, flag, status):
+	ai_stub.config[flag] = 1
+	failed = ai_client.metrics.failed
+	with pytest.raises(ai_client.AIRequestError) as e:
+		asyncio.run(ai_client.post_json(URL, PAYLOAD))
+	assert e.value.status == status
+	assert ai_stub.calls == ai_client.AI_MAX_RETRIES + 1
+	assert ai_client.metrics.failed - failed == 1
+
+def test_no_retry_on_client_error(ai_stub):
+	with pytest.raises(ai_client.AIRequestError) as e:
+		asyncio.run(ai_client.post_json("http://stub/api/v1/missing", PAYLOAD))
+	assert e.value.status == 404
+	assert ai_stub.calls == 1
+
+def test_stream_retries_before_first_byte(ai_stub):
+	ai_stub.config["fail_every"] = 1
+	with pytest.raises(ai_client.AIRequestError) as e:
+		asyncio.run(_collect(URL))
+	assert e.value.status == 503
+	assert ai_stub.calls == ai_client.AI_MAX_RETRIES + 1
+
+	ai_stub.calls = 0
+	ai_stub.config["fail_every"] = 0
+	chunks = asyncio.run(_collect(URL))
+	assert ai_stub.calls == 1
+	assert chunks[-1] == ("", "stop")
+	assert '"insight"' in "".join(content for content, _ in chunks)
+
+def test_stream_no_retry_on_client_error(ai_stub):
+	with pytest.raises(ai_client.AIRequestError) as e:
+		asyncio.run(_collect("http://stub/api/v1/missing"))
+	assert e.value.status == 404
+	assert ai_stub.calls == 1
+
+def test_backoff(monkeypatch):
+	monkeypatch.setattr(ai_client, "AI_BACKOFF_BASE", 0.5)
+	monkeypatch.setattr(ai_client, "AI_BACKOFF_MAX", 8)
+	assert ai_client._backoff(0, "2") == 2.0
+	assert ai_client._backoff(0, "120") == 8
+	for attempt in range(8):
+		assert 0 <= ai_client._backoff(attempt, "soon") <= min(8, 0.5 * 2 ** attempt)
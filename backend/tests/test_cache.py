@@ -0,0 +1,87 @@
+# test_cache.py
+"""
+The byte-budgeted LRU cache, and the dataset cache staying in step with the files on disk.
+"""
+import io
+import os
+
+import pandas as pd
+
+from utils import file_utils
+from utils.cache import LRUCache, dataset_cache, estimate_size
+from conftest import upload_csv
+
+def test_evicts_least_recently_used_by_bytes():
+	cache = LRUCache(10, sizeof=len)
+	cache.put("a", "xxxx")
+	cache.put("b", "xxxx")
+	assert cache.get("a") == "xxxx"
+	cache.put("c", "xxxx")
+	# "b" was used least recently; 12 bytes do not fit in 10
+	assert cache.get("b") is None
+	assert cache.get("a") == "xxxx" and cache.get("c") == "xxxx"
+	stats = cache.stats()
+	assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 8, 1)
+	assert (stats["hits"], stats["misses"]) == (3, 1)
+
+def test_replacing_and_oversized_entries():
+	cache = LRUCache(10, sizeof=len)
+	cache.put("a", "xxxxxx")
+	cache.put("a", "xx")
+	assert cache.stats()["bytes"] == 2
+	# Larger than the whole budget: not cached, and nothing else is evicted for it
+	cache.put("big", "x" * 11)
+	assert cache.get("big") is None
+	assert cache.get("a") == "xx"
+	assert cache.stats()["evictions"] == 0
+
+def test_invalidate():
+	cache = LRUCache(100, sizeof=len)
+	for key in [("d1", 1), ("d1", 2), ("d2", 1)]:
+		cache.put(key, "xxx")
+	assert cache.invalidate(lambda key: key[0] == "d1") == 2
+	assert cache.stats()["bytes"] == 3
+	assert cache.get(("d2", 1)) == "xxx"
+
+def test_frames_are_sized_deeply():
+	df = pd.DataFrame({"text": ["x" * 100] * 1000})
+	assert estimate_size(df) > 100 * 1000
+	cache = LRUCache(estimate_size(df) * 2)
+	cache.put(1, df)
+	cache.put(2, df.copy())
+	cache.put(3, df.copy())
+	assert cache.stats()["entries"] == 2
+
+def _entries(dataset_id):
+	return [key for key in dataset_cache._data if key[0] == dataset_id]
+
+def test_reload_after_reupload(data_dirs, sales):
+	path = os.path.join(file_utils.UPLOAD_DIR, "ds.csv")
+	sales.to_csv(path, index=False)
+	assert len(file_utils.load_dataframe("ds")) == len(sales)
+	# Projections of a cached frame are served from it
+	file_utils.load_dataframe("ds", columns=["price"])
+	old = _entries("ds")
+	assert len(old) == 1
+	# A new file under the same id, newer than the Arrow copy
+	sales.head(10).to_csv(path, index=False)
+	newer = os.stat(file_utils._columnar_path("ds")).st_mtime_ns + 10**9
+	os.utime(path, ns=(newer, newer))
+	assert len(file_utils.load_dataframe("ds")) == 10
+	assert len(file_utils.load_dataframe("ds", columns=["price"])) == 10
+	# Frames of the old file are dropped, not left to age out
+	assert _entries("ds") and not set(old) & set(_entries("ds"))
+
+def test_clean_keeps_upload_and_replaces_exports(client, sales):
+	dataset_id = upload_csv(client, sales)
+	raw = file_utils.load_dataframe(dataset_id)
+	hits = dataset_cache.stats()["hits"]
+	missing = sales["units"].isna()
+	for fill in ["median", "mean"]:
+		assert client.post(f"/clean/{dataset_id}", json={"strategy": {"numeric": fill}}).status_code == 200
+		# Exports of the previous clean are not served again
+		cleaned = pd.read_csv(io.BytesIO(client.get(f"/download/{dataset_id}?format=csv").content))
+		assert cleaned.loc[missing, "units"].unique().tolist() == [getattr(sales["units"], fill)()]
+	# The upload itself did not change: its cached frame is still served, unmodified
+	assert dataset_cache.stats()["hits"] > hits
+	pd.testing.assert_frame_equal(file_utils.load_dataframe(dataset_id), raw)
@@ -0,0 +1,43 @@
+# test_charts.py
+"""
+Chart and compute specs that aggregate a text column are rejected as bad requests.
+"""
+import pytest
+
+from utils import tasks
+from conftest import upload_csv
+
+@pytest.mark.parametrize("agg", ["sum", "mean", "min", "max"])
+def test_visualize_text_y(client, sales, agg):
+	dataset_id = upload_csv(client, sales)
+	r = client.post("/visualize", json={"dataset_id": dataset_id, "chart_spec": {"type": "bar", "x": "region", "y": "product", "agg": agg}})
+	assert r.status_code == 400, r.text
+	assert "product" in r.json()["detail"]
+
+def test_visualize_counts_text_y(client, sales):
+	dataset_id = upload_csv(client, sales)
+	r = client.post("/visualize", json={"dataset_id": dataset_id, "chart_spec": {"type": "bar", "x": "region", "y": "product", "agg": "count"}})
+	assert r.status_code == 200, r.text
+	assert sum(r.json()["chart"]["datasets"][0]["data"]) == sales["region"].notna().sum()
+
+def test_visualize_unknown_column(client, sales):
+	dataset_id = upload_csv(client, sales)
+	r = client.post("/visualize", json={"dataset_id": dataset_id, "chart_spec": {"type": "bar", "x": "region", "y": "missing"}})
+	assert r.status_code == 400, r.text
+
+def test_transform_compute_on_text(client, sales):
+	dataset_id = upload_csv(client, sales)
+	r = client.post("/transform", json={"dataset_id": dataset_id, "compute": {"agg": "mean", "col": "product"}})
+	assert r.status_code == 400, r.text
+	r = client.post("/transform", json={"dataset_id": dataset_id, "compute": {"agg": "max", "col": "orderdate"}})
+	assert r.status_code == 200, r.text
+	assert r.json()["answer"].startswith("2024-03-30")
+
+def test_answer_query_on_text(client, sales):
+	dataset_id = upload_csv(client, sales)
+	results = tasks.answer_query(dataset_id, {
+		"chart": {"type": "bar", "x": "region", "y": "note", "agg": "sum"},
+		"compute": {"agg": "sum", "col": "product", "group_by": "region"},
+	})
+	assert "note" in results["chart_error"]
+	assert "product" in results["compute_error"]
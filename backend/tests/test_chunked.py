@@ -0,0 +1,44 @@
+# test_chunked.py
+"""
+The streaming (chunked) clean must produce what the in-memory clean produces.
+"""
+import io
+
+import pandas as pd
+import pytest
+
+from utils import file_utils
+from conftest import upload_csv
+
+def _download(client, dataset_id) -> pd.DataFrame:
+	r = client.get(f"/download/{dataset_id}?format=csv")
+	assert r.status_code == 200, r.text
+	return pd.read_csv(io.BytesIO(r.content))
+
+def _clean(client, dataset_id, strategy) -> pd.DataFrame:
+	r = client.post(f"/clean/{dataset_id}", json={"strategy": strategy})
+	assert r.status_code == 200, r.text
+	assert client.get(f"/stats/{dataset_id}").status_code == 200
+	return _download(client, dataset_id)
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+	# Several chunks per test dataset
+	monkeypatch.setattr(file_utils, "CHUNK_ROWS", 700)
+
+def test_value_fill_on_category_columns(client, sales, small_chunks):
+	dataset_id = upload_csv(client, sales)
+	cleaned = _clean(client, dataset_id, {"categorical": "value", "categorical_value": "?", "streaming": True, "drop_duplicates": False})
+	assert (cleaned["region"] == "?").sum() == sales["region"].isna().sum()
+	assert cleaned["product"].notna().all()
+
+@pytest.mark.parametrize("strategy", [
+	{"numeric": "mean", "categorical": "mode"},
+	{"numeric": "mean", "categorical": "value", "categorical_value": "?"},
+])
+def test_streaming_matches_in_memory(client, sales, small_chunks, strategy):
+	dataset_id = upload_csv(client, sales)
+	in_memory = _clean(client, dataset_id, strategy)
+	streamed = _clean(client, dataset_id, {**strategy, "streaming": True})
+	assert streamed["orderdate"].notna().all()
+	pd.testing.assert_frame_equal(streamed, in_memory, check_exact=False, rtol=1e-12)
@@ -0,0 +1,29 @@
+# test_clean.py
+"""
+/clean on uploads whose dtypes were optimized: fills, stats and exports.
+"""
+import io
+
+import pandas as pd
+
+from conftest import upload_csv
+
+def test_value_fill_keeps_dates(client, sales):
+	dataset_id = upload_csv(client, sales)
+	r = client.post(f"/clean/{dataset_id}", json={"strategy": {"categorical": "value", "categorical_value": "?"}})
+	assert r.status_code == 200, r.text
+	assert client.get(f"/stats/{dataset_id}").status_code == 200
+	cleaned = pd.read_csv(io.BytesIO(client.get(f"/download/{dataset_id}?format=csv").content), dtype=str)
+	# Text columns take the constant, dates their most frequent date, written as uploaded
+	assert (cleaned["region"] == "?").sum() == sales["region"].isna().sum()
+	assert cleaned["orderdate"].notna().all()
+	assert cleaned["orderdate"].str.fullmatch(r"\d{4}-\d{2}-\d{2}").all()
+	assert set(cleaned["orderdate"]) <= set(sales["orderdate"].dropna())
+
+def test_exports_write_dates_as_uploaded(client, sales):
+	dataset_id = upload_csv(client, sales)
+	assert client.post(f"/clean/{dataset_id}", json={"strategy": {}}).status_code == 200
+	records = client.get(f"/download/{dataset_id}?format=json").json()
+	assert {r["orderdate"] for r in records} <= set(sales["orderdate"].dropna())
+	xlsx = pd.read_excel(io.BytesIO(client.get(f"/download/{dataset_id}?format=xlsx").content), dtype=str)
+	assert xlsx["orderdate"].str.fullmatch(r"\d{4}-\d{2}-\d{2}").all()
@@ -0,0 +1,119 @@
+# test_cube.py
+"""
+Charts and compute answers read from the cube must equal those computed on the
+rows, whether the cube was built in one pass or merged from row chunks.
+"""
+import itertools
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import cube, dtypes, file_utils, ops, viz_handler
+from conftest import upload_csv
+
+DIMENSIONS = ["region", "product", "orderdate"]
+MEASURES = ["quantity", "price", "units"]
+
+@pytest.fixture
+def frame(sales):
+	return dtypes.optimize(sales)[0]
+
+@pytest.fixture
+def cube_data(frame):
+	return cube.build([frame], "v1")
+
+def _chart(df, spec, cube_data=None):
+	result = viz_handler.prepare_chart_data(df, spec, cube_data=cube_data)
+	result["meta"].pop("cached", None)
+	return result
+
+def _chart_specs():
+	for chart_type, x, y, agg in itertools.product(["bar", "line"], DIMENSIONS, MEASURES, cube.CUBE_AGGS):
+		yield {"type": chart_type, "x": x, "y": y, "agg": agg, "top_n": 50}
+	for x in DIMENSIONS:
+		yield {"type": "bar", "x": x, "top_n": 50}
+		yield {"type": "pie", "x": x, "top_n": 50}
+
+def test_build(cube_data, frame):
+	assert cube_data["rows"] == len(frame)
+	assert cube_data["measures"] == MEASURES
+	assert sorted(cube_data["dimensions"]) == sorted(["region", "product", "orderdate", "quantity"])
+
+@pytest.mark.parametrize("spec", list(_chart_specs()), ids=str)
+def test_charts_match_rows(cube_data, frame, spec):
+	assert viz_handler.cube_answers(spec, cube_data)
+	from_cube = _chart(None, spec, cube_data)
+	assert from_cube["meta"].pop("cube") is True
+	assert from_cube == _chart(frame, spec)
+
+@pytest.mark.parametrize("group_by", [None, "region", "product"])
+@pytest.mark.parametrize("col, agg", list(itertools.product(MEASURES, cube.CUBE_AGGS)) + [(None, "count")])
+def test_compute_matches_plain_pandas(cube_data, sales, col, agg, group_by):
+	spec = ops.validate_compute({"agg": agg, "col": col, "group_by": group_by, "top_n": 50}, sales.columns)
+	values = cube.answer(cube_data, spec)
+	assert values is not None
+	assert ops.answer(values, spec) == ops.compute(sales, spec)
+
+def test_filtered_compute_needs_rows(cube_data):
+	assert cube.answer(cube_data, {"agg": "sum", "col": "price", "filters": [{"col": "region", "cmp": "==", "value": "North"}]}) is None
+
+def test_chunked_build_matches(cube_data, frame):
+	chunked = cube.build((frame.iloc[i:i + 700] for i in range(0, len(frame), 700)), "v1")
+	assert chunked["rows"] == cube_data["rows"]
+	assert chunked["measures"] == cube_data["measures"]
+	assert sorted(chunked["dimensions"]) == sorted(cube_data["dimensions"])
+	for m in MEASURES:
+		for stat, value in cube_data["totals"][m].items():
+			assert chunked["totals"][m][stat] == pytest.approx(value, rel=1e-12), (m, stat)
+	for dim, whole in cube_data["dimensions"].items():
+		merged = chunked["dimensions"][dim]
+		pd.testing.assert_series_equal(merged["sizes"], whole["sizes"], check_names=False, check_index_type=False, check_categorical=False)
+		# Most frequent first; tied values may come in either order
+		assert merged["counts"].is_monotonic_decreasing
+		pd.testing.assert_series_equal(merged["counts"].sort_index(), whole["counts"].sort_index(), check_names=False, check_index_type=False, check_categorical=False)
+		pd.testing.assert_frame_equal(merged["groups"], whole["groups"], rtol=1e-12, check_index_type=False, check_categorical=False, check_dtype=False)
+
+def test_visualize_reads_cube(client, sales):
+	dataset_id = upload_csv(client, sales)
+	spec = {"type": "bar", "x": "region", "y": "units", "agg": "sum"}
+	chart = client.post("/visualize", json={"dataset_id": dataset_id, "chart_spec": spec}).json()["chart"]
+	assert chart["meta"]["cube"] is True
+	expected = sales.groupby("region")["units"].sum().sort_values(ascending=False)
+	assert chart["labels"] == list(expected.index)
+	assert chart["datasets"][0]["data"] == expected.tolist()
+
+def _assert_same_cube(loaded, built):
+	assert {k: v for k, v in loaded.items() if k != "dimensions"} == {k: v for k, v in built.items() if k != "dimensions"}
+	assert list(loaded["dimensions"]) == list(built["dimensions"])
+	for dim, d in built["dimensions"].items():
+		pd.testing.assert_frame_equal(loaded["dimensions"][dim]["groups"], d["groups"], check_exact=True)
+		pd.testing.assert_series_equal(loaded["dimensions"][dim]["sizes"], d["sizes"], check_exact=True)
+		pd.testing.assert_series_equal(loaded["dimensions"][dim]["counts"], d["counts"], check_exact=True)
+
+def test_saved_cube_round_trips(data_dirs, cube_data, frame):
+	cube.save("ds", cube_data)
+	cube.cube_cache.clear()
+	with open(file_utils.cube_path("ds"), encoding="utf-8") as f:
+		json.load(f)
+	loaded = cube.get("ds", "v1")
+	_assert_same_cube(loaded, cube_data)
+	for spec in _chart_specs():
+		assert _chart(None, spec, loaded) == _chart(None, spec, cube_data)
+	assert cube.get("ds", "v2") is None
+
+def test_saved_index_types_round_trip(data_dirs):
+	n = 300
+	df = pd.DataFrame({
+		"day": pd.to_datetime("2024-01-01") + pd.to_timedelta(np.arange(n) % 7, unit="D"),
+		"stamp": pd.date_range("2024-01-01", periods=5, freq="h", tz="Europe/Paris").repeat(n // 5),
+		"flag": np.arange(n) % 2 == 0,
+		"ratio": (np.arange(n) % 4) / 3,
+		"small": (np.arange(n) % 9).astype("int8"),
+		"value": np.linspace(0, 1, n) / 7,
+	})
+	built = cube.build([df], "v1")
+	cube.save("types", built)
+	cube.cube_cache.clear()
+	_assert_same_cube(cube.get("types", "v1"), built)
@@ -0,0 +1,63 @@
+# test_download.py
+"""
+Downloads carry an ETag that follows the source data: a matching
+If-None-Match gets a 304 without rendering, and new data gets a new tag.
+"""
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from utils import file_utils, tasks
+from conftest import upload_csv
+
+def _get(client, dataset_id, fmt="csv", tag=None):
+	headers = {"If-None-Match": tag} if tag else {}
+	return client.get(f"/download/{dataset_id}?format={fmt}", headers=headers)
+
+@pytest.mark.parametrize("header", ["{tag}", "W/{tag}", '"other", {tag}', "*"])
+def test_not_modified(client, sales, monkeypatch, header):
+	dataset_id = upload_csv(client, sales)
+	client.post(f"/clean/{dataset_id}", json={"strategy": {}})
+	tag = _get(client, dataset_id).headers["etag"]
+
+	def render(*args):
+		raise AssertionError("a revalidated download must not be rendered")
+
+	monkeypatch.setattr(tasks, "cleaned_download", render)
+	r = _get(client, dataset_id, tag=header.format(tag=tag))
+	assert r.status_code == 304
+	assert r.headers["etag"] == tag
+	assert r.content == b""
+
+def test_tag_per_format(client, sales):
+	dataset_id = upload_csv(client, sales)
+	client.post(f"/clean/{dataset_id}", json={"strategy": {}})
+	csv_tag = _get(client, dataset_id).headers["etag"]
+	json_tag = _get(client, dataset_id, "json").headers["etag"]
+	assert csv_tag != json_tag
+	assert _get(client, dataset_id, "json", tag=csv_tag).status_code == 200
+
+def test_new_tag_after_reclean(client, sales):
+	dataset_id = upload_csv(client, sales)
+	client.post(f"/clean/{dataset_id}", json={"strategy": {"numeric": "median"}})
+	tag = _get(client, dataset_id).headers["etag"]
+	client.post(f"/clean/{dataset_id}", json={"strategy": {"numeric": "mean"}})
+	r = _get(client, dataset_id, tag=tag)
+	assert r.status_code == 200
+	assert r.headers["etag"] != tag
+	cleaned = pd.read_csv(io.BytesIO(r.content))
+	assert cleaned.loc[sales["units"].isna(), "units"].unique().tolist() == [sales["units"].mean()]
+
+def test_new_tag_after_reupload(client, sales):
+	dataset_id = upload_csv(client, sales)
+	tag = _get(client, dataset_id).headers["etag"]
+	assert _get(client, dataset_id, tag=tag).status_code == 304
+	# The upload replaced under the same id: same size, newer mtime
+	path = os.path.join(file_utils.UPLOAD_DIR, f"{dataset_id}.csv")
+	st = os.stat(path)
+	os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+	r = _get(client, dataset_id, tag=tag)
+	assert r.status_code == 200
+	assert r.headers["etag"] != tag
@@ -0,0 +1,48 @@
+# test_dtypes.py
+"""
+dtypes.optimize must not change any answer computed from the frame.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import dtypes
+
+NUMERIC = ["quantity", "price", "units"]
+
+def test_numeric_dtypes(sales):
+	df, _ = dtypes.optimize(sales)
+	assert df["quantity"].dtype == np.int8
+	# Floats are never narrowed, not even integral ones
+	assert df["price"].dtype == np.float64
+	assert df["units"].dtype == np.float64
+
+@pytest.mark.parametrize("agg", ["sum", "mean", "std", "min", "max", "median", "count"])
+def test_column_aggregates_match(sales, agg):
+	df, _ = dtypes.optimize(sales)
+	for col in NUMERIC:
+		assert df[col].agg(agg) == sales[col].agg(agg), col
+
+@pytest.mark.parametrize("agg", ["sum", "mean", "std", "min", "max"])
+def test_groupby_aggregates_match(sales, agg):
+	df, _ = dtypes.optimize(sales)
+	for col in NUMERIC:
+		optimized = df.groupby("region", observed=True)[col].agg(agg)
+		plain = sales.groupby("region")[col].agg(agg)
+		assert optimized.index.astype(str).tolist() == plain.index.tolist()
+		assert optimized.tolist() == plain.tolist(), col
+
+def test_large_integral_float_sum_is_exact():
+	# The sum of 2M values near 600 is far past float32's 2**24 integer range
+	values = pd.Series(np.where(np.arange(2_000_000) % 7 == 0, np.nan, 593.0 + np.arange(2_000_000) % 3))
+	df, _ = dtypes.optimize(pd.DataFrame({"g": np.arange(len(values)) % 2, "v": values}))
+	assert df["v"].sum() == values.sum()
+	assert df.groupby("g")["v"].sum().tolist() == values.groupby(np.arange(len(values)) % 2).sum().tolist()
+
+def test_duplicate_column_names():
+	raw = pd.DataFrame([[1, "a", 2.5, "2024-01-01"], [2, "a", 3.5, "2024-01-02"]], columns=["x", "x", "y", "y"])
+	df, report = dtypes.optimize(raw)
+	assert list(df.columns) == ["x", "x", "y", "y"]
+	assert [str(t) for t in df.dtypes] == ["int8", "category", "float64", "datetime64[ns]"]
+	assert df.iloc[:, 1].tolist() == ["a", "a"]
+	assert report["columns"]["y"] == ["object", "datetime64[ns]"]
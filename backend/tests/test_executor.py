@@ -0,0 +1,19 @@
+# test_executor.py
+"""
+Process mode runs work in spawned workers, each with caches of its own.
+"""
+import asyncio
+import os
+
+from utils import executor, tasks
+
+def test_process_mode_spawns(monkeypatch):
+	monkeypatch.setattr(executor, "EXECUTOR_MODE", "process")
+	monkeypatch.setattr(executor, "CPU_WORKERS", 1)
+	executor._reset_cpu_pool()
+	try:
+		result = asyncio.run(executor.run_cpu("cache_stats", tasks.cache_stats))
+		assert executor._get_cpu_pool()._mp_context.get_start_method() == "spawn"
+		assert result["pid"] != os.getpid()
+	finally:
+		executor._reset_cpu_pool()
@@ -0,0 +1,73 @@
+# test_ingest.py
+"""
+Byte ranges for parallel parsing start on row boundaries, so parsing them
+separately gives the same frame as one read_csv of the file.
+"""
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import ingest
+
+@pytest.fixture
+def quoted_csv(tmp_path):
+	"""
+	A CSV whose text fields hold quoted newlines, commas and escaped quotes.
+	"""
+	rng = np.random.default_rng(2)
+	n = 400
+	notes = [f'line one\nline "{i}", two' if i % 3 == 0 else f"plain {i}" for i in range(n)]
+	df = pd.DataFrame({"id": range(n), "note": notes, "value": rng.normal(0, 1, n).round(4)})
+	path = tmp_path / "quoted.csv"
+	df.to_csv(path, index=False)
+	return str(path)
+
+def _parse(path, ranges):
+	options = ingest.sniff(path)
+	names = list(pd.read_csv(path, nrows=0, **options).columns)
+	return pd.concat([ingest._parse_range(path, names, options, (), r) for r in ranges], ignore_index=True)
+
+@pytest.mark.parametrize("parts", [1, 2, 3, 7, 16, 64])
+@pytest.mark.parametrize("block", [7, 64 * 1024])
+def test_split_ranges(quoted_csv, monkeypatch, parts, block):
+	# Small blocks move boundaries across several reads
+	monkeypatch.setattr(ingest, "BOUNDARY_BLOCK", block)
+	ranges = ingest.split_ranges(quoted_csv, parts)
+	with open(quoted_csv, "rb") as f:
+		data = f.read()
+	assert ranges[0][0] == data.index(b"\n") + 1
+	assert ranges[-1][1] == len(data)
+	assert all(stop == start for (_, stop), (start, _) in zip(ranges, ranges[1:]))
+	assert len(ranges) <= parts
+	for start, _ in ranges:
+		# Each range starts right after a newline outside quotes
+		assert data[start - 1:start] == b"\n" and data[:start].count(b'"') % 2 == 0
+	pd.testing.assert_frame_equal(_parse(quoted_csv, ranges), pd.read_csv(quoted_csv))
+
+def test_split_ranges_header_only(tmp_path):
+	path = tmp_path / "empty.csv"
+	path.write_text("a,b\n")
+	assert ingest.split_ranges(str(path), 4) == []
+
+def test_parallel_read_matches_serial(tmp_path, monkeypatch):
+	# Numbers in the first rows, text further down: every part reads the column as text
+	df = pd.DataFrame({"id": range(3000), "code": [str(i) for i in range(2000)] + [f"x{i}" for i in range(1000)]})
+	path = tmp_path / "mixed.csv"
+	df.to_csv(path, index=False)
+	monkeypatch.setattr(ingest, "INGEST_WORKERS", 2)
+	monkeypatch.setattr(ingest, "PARALLEL_INGEST_MIN_BYTES", 0)
+	try:
+		result = ingest.read_csv(str(path))
+		assert ingest._pool is not None
+	finally:
+		ingest.shutdown(wait=True)
+	pd.testing.assert_frame_equal(result, pd.read_csv(path, dtype={"code": str}))
+
+def test_worker_processes_parse_serially(quoted_csv, monkeypatch):
+	monkeypatch.setattr(ingest, "INGEST_WORKERS", 4)
+	monkeypatch.setattr(ingest, "PARALLEL_INGEST_MIN_BYTES", 0)
+	monkeypatch.setattr(multiprocessing, "parent_process", lambda: object())
+	pd.testing.assert_frame_equal(ingest.read_csv(quoted_csv), pd.read_csv(quoted_csv))
+	assert ingest._pool is None
@@ -0,0 +1,119 @@
+# test_jobs.py
+"""
+Job lifecycle over the /jobs endpoints: queued -> running -> succeeded,
+failed or cancelled, with results only for jobs that succeeded.
+"""
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from utils import executor, jobs
+from conftest import upload_csv
+
+@pytest.fixture
+def jobs_client(data_dirs, monkeypatch):
+	monkeypatch.setattr(jobs, "JOBS_DIR", str(data_dirs / "jobs"))
+	# Stages run in worker threads, so a blocked stage does not block the event loop
+	monkeypatch.setattr(executor, "EXECUTOR_MODE", "thread")
+	with TestClient(main.app) as client:
+		yield client
+
+@pytest.fixture
+def gate():
+	event = threading.Event()
+	yield event
+	event.set()
+
+def _wait(client, job_id, statuses, timeout=10.0):
+	deadline = time.monotonic() + timeout
+	while True:
+		job = client.get(f"/jobs/{job_id}").json()
+		if job["status"] in statuses or time.monotonic() > deadline:
+			return job
+		time.sleep(0.02)
+
+def _stages(monkeypatch, *stages):
+	monkeypatch.setattr(jobs, "_stages", lambda kind, dataset_id, params: list(stages))
+
+def test_succeeds(jobs_client, sales, monkeypatch, gate):
+	dataset_id = upload_csv(jobs_client, sales)
+	_stages(monkeypatch, ("wait", gate.wait, ()), ("rows", lambda: {"rows": 3}, ()))
+	r = jobs_client.post(f"/jobs/stats/{dataset_id}")
+	assert r.status_code == 202
+	assert r.json()["status"] == "queued"
+	job_id = r.json()["job_id"]
+	job = _wait(jobs_client, job_id, ["running"])
+	assert job["status"] == "running"
+	assert [s["status"] for s in job["stages"]] == ["running", "pending"]
+	assert jobs_client.get(f"/jobs/{job_id}/result").status_code == 409
+	gate.set()
+	job = _wait(jobs_client, job_id, jobs.TERMINAL_STATES)
+	assert job["status"] == "succeeded"
+	assert job["progress"] == 1.0
+	assert [s["status"] for s in job["stages"]] == ["done", "done"]
+	assert jobs_client.get(f"/jobs/{job_id}/result").json()["result"] == {"wait": True, "rows": 3}
+
+def test_fails(jobs_client, sales, monkeypatch):
+	dataset_id = upload_csv(jobs_client, sales)
+
+	def boom():
+		raise ValueError("boom")
+
+	_stages(monkeypatch, ("first", lambda: {}, ()), ("second", boom, ()), ("third", lambda: {}, ()))
+	job_id = jobs_client.post(f"/jobs/stats/{dataset_id}").json()["job_id"]
+	job = _wait(jobs_client, job_id, jobs.TERMINAL_STATES)
+	assert (job["status"], job["error"]) == ("failed", "boom")
+	assert [s["status"] for s in job["stages"]] == ["done", "failed", "pending"]
+	assert jobs_client.get(f"/jobs/{job_id}/result").status_code == 409
+
+def test_cancel(jobs_client, sales, monkeypatch, gate):
+	dataset_id = upload_csv(jobs_client, sales)
+	_stages(monkeypatch, ("wait", gate.wait, ()), ("never", lambda: {}, ()))
+	job_id = jobs_client.post(f"/jobs/stats/{dataset_id}").json()["job_id"]
+	_wait(jobs_client, job_id, ["running"])
+	assert jobs_client.delete(f"/jobs/{job_id}").json()["status"] == "cancelling"
+	job = _wait(jobs_client, job_id, jobs.TERMINAL_STATES)
+	assert job["status"] == "cancelled"
+	assert [s["status"] for s in job["stages"]] == ["cancelled", "cancelled"]
+
+def test_clean_job(jobs_client, sales):
+	dataset_id = upload_csv(jobs_client, sales)
+	r = jobs_client.post(f"/jobs/clean/{dataset_id}", json={"strategy": {}, "formats": ["csv", "json"]})
+	job = _wait(jobs_client, r.json()["job_id"], jobs.TERMINAL_STATES, timeout=60)
+	assert job["status"] == "succeeded", job["error"]
+	assert [s["name"] for s in job["stages"]] == ["clean", "export", "stats"]
+	result = jobs_client.get(f"/jobs/{job['id']}/result").json()["result"]
+	assert result["exports"] == ["csv", "json"]
+	assert result["stats"] == jobs_client.post(f"/clean/{dataset_id}", json={"strategy": {}}).json()["stats"]
+
+def test_unknown(jobs_client, sales):
+	for r in [
+		jobs_client.get("/jobs/missing"),
+		jobs_client.get("/jobs/missing/result"),
+		jobs_client.get("/jobs/missing/events"),
+		jobs_client.delete("/jobs/missing"),
+		jobs_client.post("/jobs/stats/missing"),
+		jobs_client.post(f"/jobs/reindex/{upload_csv(jobs_client, sales)}"),
+	]:
+		assert r.status_code == 404, r.text
+
+def test_recover_marks_interrupted_jobs(data_dirs, monkeypatch):
+	monkeypatch.setattr(jobs, "JOBS_DIR", str(data_dirs / "jobs"))
+	for job_id, status in [("a", "running"), ("b", "queued"), ("c", "succeeded")]:
+		jobs._save({"id": job_id, "status": status, "stages": []})
+	assert jobs.recover() == 2
+	assert [jobs.get(job_id)["status"] for job_id in "abc"] == ["failed", "failed", "succeeded"]
+
+def test_events_end_with_the_final_state(jobs_client, sales, monkeypatch):
+	dataset_id = upload_csv(jobs_client, sales)
+	_stages(monkeypatch, ("first", lambda: {}, ()), ("second", lambda: {}, ()))
+	job_id = jobs_client.post(f"/jobs/stats/{dataset_id}").json()["job_id"]
+	with jobs_client.stream("GET", f"/jobs/{job_id}/events") as r:
+		events = [json.loads(line[len("data: "):]) for line in r.iter_lines() if line.startswith("data: ")]
+	progress = [e["progress"] for e in events]
+	assert progress == sorted(progress)
+	assert events[-1]["status"] == "succeeded"
@@ -0,0 +1,52 @@
+# test_ops.py
+"""
+Fused runs of filters and fills must give the same frame as applying the ops one by one.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import ops
+
+def _one_by_one(df, op_list):
+	for spec in op_list:
+		df = ops.apply_ops(df, [spec])
+	return df
+
+def test_outliers_after_filter():
+	df = pd.DataFrame({
+		"year": [2022] * 10 + [2023] * 10,
+		"rev": [1_000_000] * 10 + [10, 11, 12, 10, 11, 12, 10, 11, 12, 500],
+	})
+	op_list = [{"op": "filter", "col": "year", "cmp": "==", "value": 2023}, {"op": "drop_outliers", "col": "rev"}]
+	result = ops.apply_ops(df, op_list)
+	assert len(result) == 9
+	pd.testing.assert_frame_equal(result, _one_by_one(df, op_list))
+
+def test_second_fill_of_a_column():
+	df = pd.DataFrame({"a": [1.0, np.nan, 3.0]})
+	op_list = [{"op": "fillna", "col": "a", "method": "mean"}, {"op": "fillna", "col": "a", "method": "zero"}]
+	assert ops.apply_ops(df, op_list)["a"].tolist() == [1.0, 2.0, 3.0]
+
+STEPS = [
+	{"op": "filter", "col": "g", "cmp": "!=", "value": "b"},
+	{"op": "dropna", "col": "x"},
+	{"op": "drop_outliers", "col": "y", "method": "zscore", "threshold": 1.0},
+	{"op": "fillna", "col": "x", "method": "mean"},
+	{"op": "fillna", "col": "x", "method": "zero"},
+	{"op": "fillna", "col": "y", "method": "median"},
+	{"op": "fillna", "col": "y", "method": "ffill"},
+]
+
+@pytest.mark.parametrize("op_list", list(itertools.permutations(STEPS, 3)), ids=str)
+def test_fused_matches_one_by_one(op_list):
+	rng = np.random.default_rng(1)
+	df = pd.DataFrame({
+		"g": rng.choice(["a", "b", "c"], 60),
+		"x": np.where(rng.random(60) < 0.3, np.nan, rng.normal(0, 1, 60)),
+		"y": np.where(rng.random(60) < 0.3, np.nan, rng.normal(0, 5, 60)),
+	})
+	op_list = list(op_list)
+	pd.testing.assert_frame_equal(ops.apply_ops(df, op_list), _one_by_one(df, op_list))
@@ -0,0 +1,45 @@
+# test_profile.py
+"""
+Dataset profiles: the row sample is stratified on a low-cardinality column,
+wherever that column sits in a wide table.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import profile
+from utils.data_handler import get_summary_stats
+
+@pytest.fixture
+def wide() -> pd.DataFrame:
+	"""
+	30 high-cardinality numeric columns, then a 5-value segment column where one value dominates.
+	"""
+	rng = np.random.default_rng(0)
+	n = 2000
+	df = pd.DataFrame({f"m{i}": rng.normal(size=n).round(3) for i in range(30)})
+	df["segment"] = np.where(rng.random(n) < 0.9, "bulk", rng.choice(["a", "b", "c", "d"], n))
+	return df
+
+def _sample(text: str) -> pd.DataFrame:
+	return pd.read_csv(io.StringIO(text.split("Sample rows (CSV):\n", 1)[1]))
+
+def test_stratified_sample_covers_strata(wide):
+	sample = profile.stratified_sample(wide, 10, "segment")
+	assert len(sample) == 10
+	assert set(sample["segment"]) == {"bulk", "a", "b", "c", "d"}
+	assert sample.index.is_monotonic_increasing
+
+def test_stratified_sample_unknown_column(wide):
+	with pytest.raises(ValueError, match="missing"):
+		profile.stratified_sample(wide, 10, "missing")
+	with pytest.raises(ValueError, match="missing"):
+		profile.stratified_sample(wide.head(5), 10, "missing")
+
+def test_profile_samples_by_trailing_stratify_column(wide):
+	text = profile.build_profile(wide, get_summary_stats(wide), budget=100_000)
+	sample = _sample(text)
+	assert list(sample.columns) == [f"m{i}" for i in range(profile.MAX_SAMPLE_COLUMNS)] + ["segment"]
+	assert set(sample["segment"]) == {"bulk", "a", "b", "c", "d"}
@@ -0,0 +1,158 @@
+# test_query_stream.py
+"""
+Streamed answers: StreamingJSONExtractor decodes the insight however the
+model's output is chunked, and /query/stream sends "insight" deltas followed
+by exactly one "result" or "error" event.
+"""
+import json
+
+import pytest
+
+from utils import ai_client, ai_handler, serialize, tasks
+from utils.ai_handler import StreamingJSONExtractor
+from conftest import upload_csv
+
+ANSWER = {
+	"insight": 'North sells "most": 41% of units\\orders,\nthen South — é, 😀, \t done',
+	"confidence": "high",
+	"chart": {"type": "bar", "x": "region", "y": "units", "agg": "sum", "top_n": 10},
+}
+
+def _feed(text: str, size: int):
+	extractor = StreamingJSONExtractor()
+	deltas = [extractor.feed(text[i:i + size]) for i in range(0, len(text), size)]
+	return extractor, deltas
+
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64])
+def test_extractor_split_chunks(size, ensure_ascii):
+	text = "Here you go:\n```json\n" + json.dumps(ANSWER, ensure_ascii=ensure_ascii, indent=1) + "\n```"
+	extractor, deltas = _feed(text, size)
+	assert "".join(deltas) == ANSWER["insight"]
+	assert extractor.result() == ANSWER
+	# Every delta is sent as its own SSE event, so each must encode on its own
+	for delta in deltas:
+		serialize.dumps({"text": delta})
+
+def test_extractor_skips_text_before_object():
+	text = 'Using {region} as the key: {"confidence": "low", "insight": "a {b} \\"c\\""}'
+	extractor, deltas = _feed(text, 4)
+	assert "".join(deltas) == 'a {b} "c"'
+	assert extractor.result() == {"confidence": "low", "insight": 'a {b} "c"'}
+
+def test_extractor_incomplete():
+	extractor, deltas = _feed('{"insight": "half an ans', 3)
+	assert "".join(deltas) == "half an ans"
+	assert extractor.result() is None
+
+def test_extractor_without_insight():
+	extractor, deltas = _feed('{"chart": {"type": "pie"}}', 2)
+	assert deltas == [""] * len(deltas)
+	assert extractor.result() == {"chart": {"type": "pie"}}
+
+def _events(response) -> list:
+	events = []
+	for block in response.text.split("\n\n"):
+		fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+		if fields:
+			events.append((fields["event"], json.loads(fields["data"])))
+	return events
+
+def _assert_order(events) -> dict:
+	kinds = [kind for kind, _ in events]
+	assert kinds[-1] in ("result", "error")
+	assert set(kinds[:-1]) <= {"insight"}
+	return events[-1][1]
+
+@pytest.fixture
+def scripted(monkeypatch, ai_stub):
+	"""
+	Replace the upstream stream with chunks set per test: script.chunks is a
+	list of (content, finish_reason) or an exception to raise at that point.
+	"""
+	class Script:
+		chunks = []
+		calls = 0
+
+	async def stream_chat(url, payload, headers=None):
+		Script.calls += 1
+		for chunk in Script.chunks:
+			if isinstance(chunk, Exception):
+				raise chunk
+			yield chunk
+
+	monkeypatch.setattr(ai_client, "stream_chat", stream_chat)
+	return Script
+
+def _stream(client, dataset_id, question="Which region sells most?"):
+	return client.post("/query/stream", json={"dataset_id": dataset_id, "question": question})
+
+def test_stub_stream_then_cached(client, sales, ai_cache_db, ai_stub):
+	dataset_id = upload_csv(client, sales)
+	r = _stream(client, dataset_id)
+	assert r.status_code == 200
+	assert r.headers["content-type"].startswith("text/event-stream")
+	events = _events(r)
+	result = _assert_order(events)
+	assert events[-1][0] == "result"
+	assert len(events) > 2
+	assert "".join(data["text"] for _, data in events[:-1]) == result["insight"]
+	assert result["insight"].startswith("Stub answer")
+	assert ai_stub.calls == 1
+
+	# The stored answer comes back as a single result, without calling upstream
+	cached = _events(_stream(client, dataset_id))
+	assert cached == [("result", result)]
+	assert ai_stub.calls == 1
+
+def test_result_with_local_chart(client, sales, ai_cache_db, scripted):
+	dataset_id = upload_csv(client, sales)
+	text = json.dumps(ANSWER)
+	scripted.chunks = [(text[i:i + 5], None) for i in range(0, len(text), 5)] + [("", "stop")]
+	events = _events(_stream(client, dataset_id))
+	result = _assert_order(events)
+	assert events[-1][0] == "result"
+	assert "".join(data["text"] for _, data in events[:-1]) == ANSWER["insight"]
+	assert result["chart"] == ANSWER["chart"]
+	expected = sales.groupby("region")["units"].sum().sort_values(ascending=False)
+	assert result["chart_data"]["labels"] == expected.index.tolist()
+	assert result["chart_data"]["datasets"][0]["data"] == pytest.approx(expected.tolist())
+
+@pytest.mark.parametrize("chunks, message", [
+	([('{"insight": "Nor', None), ("th", "length")], ai_handler.TRUNCATED_MESSAGE),
+	([('{"insight": "Nor', None), ai_client.AIRequestError("Stream interrupted")], "AI request failed: Stream interrupted"),
+])
+def test_failed_upstream_is_not_cached(client, sales, ai_cache_db, scripted, chunks, message):
+	dataset_id = upload_csv(client, sales)
+	scripted.chunks = chunks
+	events = _events(_stream(client, dataset_id))
+	_assert_order(events)
+	assert "North".startswith("".join(data["text"] for _, data in events[:-1]))
+	assert events[-1] == ("result", {"insight": message, "confidence": "low"})
+	_events(_stream(client, dataset_id))
+	assert scripted.calls == 2
+
+def test_empty_answer_is_an_error(client, sales, ai_cache_db, scripted):
+	dataset_id = upload_csv(client, sales)
+	scripted.chunks = [('{"insight": "  "}', "stop")]
+	events = _events(_stream(client, dataset_id))
+	_assert_order(events)
+	assert events[-1][0] == "error"
+
+def test_local_failure_is_an_error(client, sales, ai_cache_db, scripted, monkeypatch):
+	dataset_id = upload_csv(client, sales)
+	scripted.chunks = [(json.dumps(ANSWER), "stop")]
+
+	def answer_query(*args):
+		raise RuntimeError("cube unavailable")
+
+	monkeypatch.setattr(tasks, "answer_query", answer_query)
+	events = _events(_stream(client, dataset_id))
+	_assert_order(events)
+	assert events[-1] == ("error", {"detail": "cube unavailable"})
+	assert [kind for kind, _ in events[:-1]] == ["insight"]
+
+def test_unknown_dataset(client, ai_cache_db, scripted):
+	assert _stream(client, "missing").status_code == 404
+	assert client.post("/query/stream", json={"dataset_id": "x"}).status_code == 400
+	assert scripted.calls == 0
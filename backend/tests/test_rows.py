@@ -0,0 +1,109 @@
+# test_rows.py
+"""
+Paging through a dataset: CSV pages read through the row index must equal
+the same slice of read_csv, and sorted/filtered views must page like pandas.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import file_utils, rows
+
+@pytest.fixture
+def stride(monkeypatch):
+	monkeypatch.setattr(file_utils, "ROW_INDEX_STRIDE", 7)
+	return 7
+
+def _write_csv(df: pd.DataFrame, dataset_id: str = "ds", trailing_newline: bool = True) -> str:
+	# Written straight into uploads/, so pages come from the CSV and its row index
+	path = os.path.join(file_utils.UPLOAD_DIR, f"{dataset_id}.csv")
+	text = df.to_csv(index=False)
+	with open(path, "w", encoding="utf-8", newline="") as f:
+		f.write(text if trailing_newline else text.rstrip("\n"))
+	return path
+
+def _frame(n: int, seed: int = 3) -> pd.DataFrame:
+	rng = np.random.default_rng(seed)
+	return pd.DataFrame({
+		"id": np.arange(n),
+		"note": [f'two\nlines, "{i}"' if i % 4 == 0 else f"row {i}" for i in range(n)],
+		"score": np.where(rng.random(n) < 0.2, np.nan, rng.integers(0, 50, n)),
+		"group": rng.choice(["a", "b", "c"], n),
+	})
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_row_index(data_dirs, stride, trailing_newline):
+	df = _frame(100)
+	path = _write_csv(df, trailing_newline=trailing_newline)
+	index = file_utils._build_csv_row_index(path, block_size=16)
+	assert index[0] == len(df)
+	with open(path, "rb") as f:
+		data = f.read()
+	for block, offset in enumerate(index[1:]):
+		# Each offset is the start of row block * stride
+		assert data[offset - 1:offset] == b"\n"
+		row = pd.read_csv(path, skiprows=range(1, block * stride + 1), nrows=1)
+		assert row["id"].iloc[0] == block * stride
+
+@pytest.mark.parametrize("start, stop", [(0, 10), (5, 9), (7, 14), (13, 40), (95, 120), (100, 110), (3, 3)])
+def test_read_rows_from_csv(data_dirs, stride, start, stop):
+	df = _frame(100)
+	_write_csv(df)
+	page = file_utils.read_rows("ds", start, stop)
+	assert not os.path.exists(file_utils._columnar_path("ds"))
+	expected = pd.read_csv(file_utils._find_source("ds")[0]).iloc[start:stop]
+	pd.testing.assert_frame_equal(page, expected, check_index_type=False, check_dtype=False)
+	assert file_utils.row_count("ds") == len(df)
+
+def test_row_index_rebuilt_after_reupload(data_dirs, stride):
+	path = _write_csv(_frame(100))
+	assert file_utils.row_count("ds") == 100
+	assert file_utils.read_rows("ds", 50, 51)["id"].tolist() == [50]
+	built = os.stat(file_utils._row_index_path("ds")).st_mtime_ns
+	_write_csv(_frame(30, seed=4).assign(id=lambda d: d["id"] + 1000))
+	# The new file is newer than the old index
+	os.utime(path, ns=(built + 10**9, built + 10**9))
+	assert file_utils.row_count("ds") == 30
+	assert file_utils.read_rows("ds", 20, 22)["id"].tolist() == [1020, 1021]
+
+def test_pages_match_pandas(client, stride):
+	df = _frame(100)
+	_write_csv(df)
+	expected = pd.read_csv(file_utils._find_source("ds")[0])
+	got = []
+	for offset in range(0, 100, 30):
+		r = client.get("/rows/ds", params={"offset": offset, "limit": 30})
+		assert r.status_code == 200, r.text
+		body = r.json()
+		assert body["total"] == 100
+		got.extend(body["rows"])
+	assert [r["_row"] for r in got] == list(range(100))
+	assert [r["note"] for r in got] == expected["note"].tolist()
+
+@pytest.mark.parametrize("sort", ["score", "-score", "group", None])
+def test_sorted_filtered_views(client, sort):
+	df = _frame(100)
+	_write_csv(df)
+	expected = pd.read_csv(file_utils._find_source("ds")[0])
+	filters = '[{"col": "group", "cmp": "!=", "value": "b"}]'
+	view = expected[expected["group"] != "b"]
+	if sort:
+		view = view.sort_values(sort.lstrip("-"), ascending=not sort.startswith("-"), kind="stable", na_position="last")
+	rows.view_cache.clear()
+	before = rows.view_cache.stats()
+	got = []
+	for offset in (0, 25, 50, 75):
+		r = client.get("/rows/ds", params={"offset": offset, "limit": 25, "sort": sort, "filter": filters})
+		assert r.status_code == 200, r.text
+		assert r.json()["total"] == len(view)
+		got.extend(r.json()["rows"])
+	assert [r["_row"] for r in got] == view.index.tolist()
+	# The view is resolved once; later pages slice the cached positions
+	after = rows.view_cache.stats()
+	assert (after["misses"] - before["misses"], after["hits"] - before["hits"]) == (1, 3)
+
+def test_bad_sort_column(client):
+	_write_csv(_frame(10))
+	assert client.get("/rows/ds", params={"sort": "missing"}).status_code == 400
@@ -0,0 +1,37 @@
+# test_stats.py
+"""
+Summary stats must serialize for any column type.
+"""
+import numpy as np
+import pandas as pd
+
+from utils import serialize, stats_engine
+
+def test_value_counts_keys_serialize():
+	df = pd.DataFrame({
+		"mixed": pd.Series([pd.Timestamp("2024-01-01"), "?", "?", pd.Timestamp("2024-01-02"), None], dtype=object),
+		"codes": pd.Series([1, 2, 2, 3, 3], dtype="category"),
+		"ints": pd.Series(np.array([1, 1, 2, 2, 2], dtype=np.int64).astype(object)),
+	})
+	stats = stats_engine.summarize(df)
+	assert stats["value_counts"]["mixed"] == {"?": 2, "2024-01-01T00:00:00": 1, "2024-01-02T00:00:00": 1, None: 1}
+	assert stats["value_counts"]["codes"] == {2: 2, 3: 2, 1: 1}
+	serialize.dumps(stats)
+
+def test_raw_and_cleaned_stats_persist_side_by_side(client, sales, monkeypatch):
+	from utils import data_handler
+	from conftest import upload_csv
+
+	dataset_id = upload_csv(client, sales)
+	calls = []
+	summarize = data_handler.get_summary_stats
+	monkeypatch.setattr(data_handler, "get_summary_stats", lambda df: calls.append(len(df)) or summarize(df))
+	strategy = {"strategy": {"drop_duplicates": True}}
+	raw = client.get(f"/stats/{dataset_id}").json()["stats"]
+	cleaned = client.post(f"/clean/{dataset_id}", json=strategy).json()["stats"]
+	assert len(calls) == 2
+	assert client.get(f"/stats/{dataset_id}").json()["stats"] == raw
+	assert client.post(f"/clean/{dataset_id}", json=strategy).json()["stats"] == cleaned
+	assert len(calls) == 2
+	# Downloads follow /download: the cleaned stats once the dataset is cleaned
+	assert client.get(f"/download_stats/{dataset_id}?format=json").json() == cleaned
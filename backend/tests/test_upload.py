@@ -0,0 +1,85 @@
+# test_upload.py
+"""
+Uploads are parsed from the request stream and cut off at the size limit,
+whether or not the client declares a Content-Length.
+"""
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+import main
+from utils import file_utils
+
+BOUNDARY = "testboundary"
+
+def _body(data: bytes, filename: str = "data.csv", field: str = "file") -> bytes:
+	return (
+		f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nhello\r\n"
+		f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+		"Content-Type: text/csv\r\n\r\n"
+	).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+def _chunked(body: bytes, size: int, sent: list):
+	# A generator body is sent without Content-Length
+	for i in range(0, len(body), size):
+		sent.append(size)
+		yield body[i:i + size]
+
+def _post(client, content, **headers):
+	return client.post("/upload", content=content, headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}", **headers})
+
+def _leftovers():
+	return os.listdir(file_utils.UPLOAD_DIR)
+
+@pytest.mark.parametrize("size", [7, 4096])
+def test_chunked_upload(client, size):
+	data = b"a,b\n" + b"".join(f"{i},x{i}\n".encode() for i in range(2000))
+	r = _post(client, _chunked(_body(data), size, []))
+	assert r.status_code == 200, r.text
+	meta = file_utils.get_upload_meta(r.json()["dataset_id"])
+	assert meta["filename"] == "data.csv"
+	assert meta["size"] == len(data)
+	assert meta["sha256"] == hashlib.sha256(data).hexdigest()
+	assert r.json()["columns"] == ["a", "b"]
+
+def test_oversized_chunked_upload(client, monkeypatch):
+	monkeypatch.setattr(main, "MAX_UPLOAD_SIZE", 10_000)
+	sent = []
+	body = _body(b"a\n" + b"1\n" * 500_000)
+	r = _post(client, _chunked(body, 1024, sent))
+	assert r.status_code == 413, r.text
+	assert _leftovers() == []
+
+def test_stream_stops_at_the_limit(data_dirs):
+	sent = []
+
+	async def stream():
+		for chunk in _chunked(_body(b"a\n" + b"1\n" * 500_000), 1024, sent):
+			yield chunk
+
+	content_type = f"multipart/form-data; boundary={BOUNDARY}"
+	with pytest.raises(file_utils.UploadTooLargeError):
+		asyncio.run(file_utils.save_upload(stream(), content_type, max_bytes=10_000))
+	# Rejected once the file passes the limit, not after the whole body arrived
+	assert len(sent) * 1024 <= 10_000 + 2048
+	assert _leftovers() == []
+
+def test_oversized_declared_upload(client, monkeypatch):
+	monkeypatch.setattr(main, "MAX_UPLOAD_SIZE", 10_000)
+	r = _post(client, _body(b"a\n" + b"1\n" * 500_000))
+	assert r.status_code == 413, r.text
+	assert _leftovers() == []
+
+@pytest.mark.parametrize("body, content_type", [
+	(_body(b"a\n1\n", filename="data.txt"), f"multipart/form-data; boundary={BOUNDARY}"),
+	(_body(b"a\n1\n", field="other"), f"multipart/form-data; boundary={BOUNDARY}"),
+	(_body(b"a\n1\n", filename=""), f"multipart/form-data; boundary={BOUNDARY}"),
+	(_body(b"a\n1\n")[:-30], f"multipart/form-data; boundary={BOUNDARY}"),
+	(b"a\n1\n", "text/csv"),
+])
+def test_rejected_uploads(client, body, content_type):
+	r = client.post("/upload", content=body, headers={"Content-Type": content_type})
+	assert r.status_code == 400, r.text
+	assert _leftovers() == []
@@ -0,0 +1,139 @@
+# ai_cache.py
+"""
+Persistent cache of AI query responses in SQLite, keyed by dataset version,
+normalized question and model. Entries expire after a TTL and the least
+recently used are evicted beyond a size bound. Near-identical questions can
+optionally be matched by character-trigram similarity.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+AI_CACHE_PATH = os.getenv("AI_CACHE_PATH", os.path.join(os.path.dirname(__file__), '..', 'ai_cache.sqlite3'))
+# Entry lifetime in seconds (default 7 days)
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", 7 * 24 * 3600))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", 5000))
+# Minimum trigram Jaccard similarity for a fuzzy hit, e.g. 0.9; 0 disables fuzzy matching.
+# Keep it high: questions that differ only in a number ("top 3" vs "top 5") still score well.
+AI_CACHE_SIMILARITY = float(os.getenv("AI_CACHE_SIMILARITY", 0))
+
+_lock = threading.Lock()
+_conn = None
+_stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_hit_latencies = deque(maxlen=1000)
+
+def normalize_question(question: str) -> str:
+	"""
+	Lowercase, drop punctuation and collapse whitespace.
+	"""
+	return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+def _trigrams(text: str) -> set:
+	padded = f"  {text} "
+	return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _similarity(a: set, b: set) -> float:
+	return len(a & b) / len(a | b) if a or b else 1.0
+
+def _key(dataset_version: str, normalized: str, model: str) -> str:
+	return hashlib.sha256(f"{dataset_version}\0{model}\0{normalized}".encode("utf-8")).hexdigest()
+
+def _connection() -> sqlite3.Connection:
+	global _conn
+	if _conn is None:
+		_conn = sqlite3.connect(AI_CACHE_PATH, check_same_thread=False)
+		_conn.execute("PRAGMA journal_mode=WAL")
+		_conn.execute(
+			"CREATE TABLE IF NOT EXISTS responses ("
+			"key TEXT PRIMARY KEY, dataset TEXT, model TEXT, question TEXT, "
+			"response TEXT, created REAL, accessed REAL)"
+		)
+		_conn.execute("CREATE INDEX IF NOT EXISTS responses_dataset ON responses (dataset, model)")
+		_conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+		_conn.commit()
+	return _conn
+
+def get(dataset_version: str, question: str, model: str):
+	"""
+	Cached response for the question, or None. Tries an exact match on the
+	normalized question, then (if enabled) the most similar cached question.
+	"""
+	started = time.perf_counter()
+	normalized = normalize_question(question)
+	now = time.time()
+	with _lock:
+		conn = _connection()
+		row = conn.execute(
+			"SELECT key, response FROM responses WHERE key = ? AND created > ?",
+			(_key(dataset_version, normalized, model), now - AI_CACHE_TTL),
+		).fetchone()
+		match = "exact_hits"
+		if row is None and AI_CACHE_SIMILARITY > 0:
+			grams = _trigrams(normalized)
+			best = 0.0
+			for key, cached_question, response in conn.execute(
+				"SELECT key, question, response FROM responses WHERE dataset = ? AND model = ? AND created > ?",
+				(dataset_version, model, now - AI_CACHE_TTL),
+			):
+				score = _similarity(grams, _trigrams(cached_question))
+				if score >= AI_CACHE_SIMILARITY and score > best:
+					best, row = score, (key, response)
+			match = "similar_hits"
+		if row is None:
+			_stats["misses"] += 1
+			return None
+		conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, row[0]))
+		conn.commit()
+		_stats[match] += 1
+		_hit_latencies.append(time.perf_counter() - started)
+	return json.loads(row[1])
+
+def put(dataset_version: str, question: str, model: str, response: dict):
+	"""
+	Store a response, then drop expired entries and the least recently used beyond AI_CACHE_MAX_ENTRIES.
+	"""
+	normalized = normalize_question(question)
+	now = time.time()
+	with _lock:
+		conn = _connection()
+		conn.execute(
+			"INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+			(_key(dataset_version, normalized, model), dataset_version, model, normalized, json.dumps(response), now, now),
+		)
+		evicted = conn.execute("DELETE FROM responses WHERE created <= ?", (now - AI_CACHE_TTL,)).rowcount
+		evicted += conn.execute(
+			"DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+			(AI_CACHE_MAX_ENTRIES,),
+		).rowcount
+		conn.commit()
+		_stats["stores"] += 1
+		_stats["evictions"] += evicted
+
+def stats() -> dict:
+	"""
+	Hit/miss counters and hit latency, kept apart from upstream call latency.
+	"""
+	with _lock:
+		latencies = sorted(_hit_latencies)
+		lookups = _stats["exact_hits"] + _stats["similar_hits"] + _stats["misses"]
+		entries = _connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+		return {
+			**_stats,
+			"entries": entries,
+			"hit_rate": (lookups - _stats["misses"]) / lookups if lookups else 0.0,
+			"hit_latency_ms": {
+				"p50": 1000 * latencies[len(latencies) // 2] if latencies else 0.0,
+				"max": 1000 * latencies[-1] if latencies else 0.0,
+			},
+			"similarity_threshold": AI_CACHE_SIMILARITY,
+		}
+
+def clear():
+	with _lock:
+		_connection().execute("DELETE FROM responses")
+		_connection().commit()
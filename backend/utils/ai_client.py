@@ -0,0 +1,235 @@
+# ai_client.py
+"""
+Pooled async HTTP client for the AI provider.
+One httpx.AsyncClient per event loop reuses connections across requests; a
+semaphore bounds in-flight calls, and 429/5xx responses and transport errors
+are retried with exponential backoff. Latency, time to first byte and token
+usage are recorded per call.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import httpx
+
+from . import tracing
+
+AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", 20))
+AI_MAX_IN_FLIGHT = int(os.getenv("AI_MAX_IN_FLIGHT", 8))
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", 60))
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", 10))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", 3))
+# Backoff before retry n is a random delay up to min(AI_BACKOFF_MAX, AI_BACKOFF_BASE * 2**n) seconds
+AI_BACKOFF_BASE = float(os.getenv("AI_BACKOFF_BASE", 0.5))
+AI_BACKOFF_MAX = float(os.getenv("AI_BACKOFF_MAX", 8))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class AIRequestError(Exception):
+	"""
+	Raised when the provider call fails after all retries.
+	"""
+	def __init__(self, message: str, status: int = None):
+		super().__init__(message)
+		self.status = status
+
+class _Metrics:
+	"""
+	Call counters, recent latencies and token usage.
+	"""
+	def __init__(self, window: int = 1000):
+		self._lock = threading.Lock()
+		self.calls = 0
+		self.succeeded = 0
+		self.failed = 0
+		self.retries = 0
+		self.in_flight = 0
+		self.max_in_flight = 0
+		self.prompt_tokens = 0
+		self.completion_tokens = 0
+		self.latencies = deque(maxlen=window)
+		self.first_bytes = deque(maxlen=window)
+
+	def started(self):
+		with self._lock:
+			self.calls += 1
+			self.in_flight += 1
+			self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+	def first_byte(self, seconds: float):
+		with self._lock:
+			self.first_bytes.append(seconds)
+
+	def retried(self):
+		with self._lock:
+			self.retries += 1
+
+	def finished(self, seconds: float, ok: bool, usage: dict = None):
+		with self._lock:
+			self.in_flight -= 1
+			self.latencies.append(seconds)
+			if ok:
+				self.succeeded += 1
+			else:
+				self.failed += 1
+			if usage:
+				self.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+				self.completion_tokens += int(usage.get("completion_tokens") or 0)
+
+	def snapshot(self) -> dict:
+		with self._lock:
+			def pct(values, q):
+				return 1000 * values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+			latencies = sorted(self.latencies)
+			first_bytes = sorted(self.first_bytes)
+			return {
+				"calls": self.calls,
+				"succeeded": self.succeeded,
+				"failed": self.failed,
+				"retries": self.retries,
+				"in_flight": self.in_flight,
+				"max_in_flight": self.max_in_flight,
+				"latency_ms": {"p50": pct(latencies, 0.5), "p95": pct(latencies, 0.95), "max": pct(latencies, 1.0)},
+				# Streamed calls only: time until the first upstream byte
+				"ttfb_ms": {"p50": pct(first_bytes, 0.5), "p95": pct(first_bytes, 0.95), "max": pct(first_bytes, 1.0)},
+				"tokens": {
+					"prompt": self.prompt_tokens,
+					"completion": self.completion_tokens,
+					"total": self.prompt_tokens + self.completion_tokens,
+				},
+			}
+
+metrics = _Metrics()
+_client = None
+_semaphore = None
+_loop = None
+
+def _get_client():
+	# Client and semaphore belong to one event loop; rebuild them if the loop changed (e.g. in tests)
+	global _client, _semaphore, _loop
+	loop = asyncio.get_running_loop()
+	if _loop is not loop:
+		_client = httpx.AsyncClient(
+			timeout=httpx.Timeout(AI_TIMEOUT, connect=AI_CONNECT_TIMEOUT),
+			limits=httpx.Limits(max_connections=AI_MAX_CONNECTIONS, max_keepalive_connections=AI_MAX_CONNECTIONS),
+		)
+		_semaphore = asyncio.Semaphore(AI_MAX_IN_FLIGHT)
+		_loop = loop
+	return _client, _semaphore
+
+def _backoff(attempt: int, retry_after: str = None) -> float:
+	if retry_after:
+		try:
+			return min(float(retry_after), AI_BACKOFF_MAX)
+		except ValueError:
+			pass
+	return random.uniform(0, min(AI_BACKOFF_MAX, AI_BACKOFF_BASE * 2 ** attempt))
+
+async def post_json(url: str, payload: dict, headers: dict = None) -> dict:
+	"""
+	POST payload as JSON and return the decoded response body.
+	Retries 429/5xx and connection/timeout errors up to AI_MAX_RETRIES times;
+	raises AIRequestError when the call ultimately fails.
+	"""
+	client, semaphore = _get_client()
+	async with semaphore:
+		metrics.started()
+		started = time.perf_counter()
+		result = None
+		try:
+			for attempt in range(AI_MAX_RETRIES + 1):
+				retry_after = None
+				try:
+					response = await client.post(url, json=payload, headers=headers)
+				except (httpx.TimeoutException, httpx.TransportError) as e:
+					error = AIRequestError(f"{type(e).__name__}: {e}")
+				else:
+					if response.status_code < 400:
+						result = response.json()
+						return result
+					error = AIRequestError(f"HTTP {response.status_code}: {response.text[:200]}", response.status_code)
+					if response.status_code not in RETRY_STATUSES:
+						raise error
+					retry_after = response.headers.get("retry-after")
+				if attempt == AI_MAX_RETRIES:
+					raise error
+				metrics.retried()
+				await asyncio.sleep(_backoff(attempt, retry_after))
+		finally:
+			usage = result.get("usage") if isinstance(result, dict) else None
+			metrics.finished(time.perf_counter() - started, result is not None, usage)
+			tracing.add_span("ai", time.perf_counter() - started)
+
+async def stream_chat(url: str, payload: dict, headers: dict = None):
+	"""
+	Stream a chat completion (OpenAI-style SSE) and yield (content, finish_reason)
+	for each chunk. Failures before the first byte are retried like post_json;
+	once data has arrived an error is raised as AIRequestError.
+	"""
+	client, semaphore = _get_client()
+	async with semaphore:
+		metrics.started()
+		started = time.perf_counter()
+		ok, usage = False, None
+		try:
+			for attempt in range(AI_MAX_RETRIES + 1):
+				retry_after = None
+				received = False
+				try:
+					async with client.stream("POST", url, json={**payload, "stream": True}, headers=headers) as response:
+						if response.status_code >= 400:
+							body = (await response.aread()).decode("utf-8", "replace")
+							error = AIRequestError(f"HTTP {response.status_code}: {body[:200]}", response.status_code)
+							if response.status_code not in RETRY_STATUSES:
+								raise error
+							retry_after = response.headers.get("retry-after")
+						else:
+							async for line in response.aiter_lines():
+								if not received:
+									received = True
+									metrics.first_byte(time.perf_counter() - started)
+								# Skip blank separators and ": keep-alive" comments
+								if not line.startswith("data:"):
+									continue
+								data = line[5:].strip()
+								if data == "[DONE]":
+									break
+								chunk = json.loads(data)
+								usage = chunk.get("usage") or usage
+								choice = (chunk.get("choices") or [{}])[0]
+								content = (choice.get("delta") or {}).get("content") or ""
+								if content or choice.get("finish_reason"):
+									yield content, choice.get("finish_reason")
+							ok = True
+							return
+				except (httpx.TimeoutException, httpx.TransportError) as e:
+					if received:
+						raise AIRequestError(f"Stream interrupted: {type(e).__name__}: {e}")
+					error = AIRequestError(f"{type(e).__name__}: {e}")
+				if attempt == AI_MAX_RETRIES:
+					raise error
+				metrics.retried()
+				await asyncio.sleep(_backoff(attempt, retry_after))
+		finally:
+			metrics.finished(time.perf_counter() - started, ok, usage)
+			tracing.add_span("ai", time.perf_counter() - started)
+
+def stats() -> dict:
+	"""
+	Client configuration plus call, retry, latency and token counters.
+	"""
+	return {
+		"max_connections": AI_MAX_CONNECTIONS,
+		"max_in_flight": AI_MAX_IN_FLIGHT,
+		"max_retries": AI_MAX_RETRIES,
+		**metrics.snapshot(),
+	}
+
+async def aclose():
+	global _client, _semaphore, _loop
+	if _client is not None:
+		await _client.aclose()
+	_client = _semaphore = _loop = None
@@ -3,20 +3,35 @@
 Handles OpenRouter API calls and prompt formatting for AI queries, visualization, and transform suggestions.
 """
 import os
-import requests
-
+import re
 import json
 
+from . import ai_client, ai_cache, executor, profile
+
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
 DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek/deepseek-r1:free")
+# Model context window in tokens; the dataset profile is sized to fit in it
+AI_CONTEXT_TOKENS = int(os.getenv("AI_CONTEXT_TOKENS", 16000))
+QUERY_MAX_TOKENS = 1000
+# Instructions and question around the profile
+PROMPT_OVERHEAD_TOKENS = 300
+
+NO_KEY_MESSAGE = "AI API key is not set in backend environment."
+EMPTY_MESSAGE = "AI model returned an empty response. Please try again or use a different model."
+TRUNCATED_MESSAGE = "AI model response was cut off. Please rephrase your question or use a smaller dataset."
+
+def profile_token_budget() -> int:
+	"""
+	Tokens available for the dataset profile in a query prompt.
+	"""
+	return max(256, min(profile.PROFILE_TOKEN_BUDGET, AI_CONTEXT_TOKENS - QUERY_MAX_TOKENS - PROMPT_OVERHEAD_TOKENS))
 
 def extract_json_or_text(content):
 	"""
 	Try to extract JSON from LLM response, fallback to text.
 	"""
 	# Try to find JSON in code block
-	import re
 	match = re.search(r'```(?:json)?\s*([\s\S]+?)\s*```', content)
 	if match:
 		content = match.group(1)
@@ -34,13 +49,108 @@ def extract_json_or_text(content):
 	# Fallback: return as text
 	return {"insight": content.strip(), "confidence": "low"}
 
-def ask_openrouter(prompt_text: str, max_tokens: int = 1000):
+class StreamingJSONExtractor:
 	"""
-	Call OpenRouter API with prompt_text, return parsed response (JSON or text).
-	Handles empty/truncated responses and increases max_tokens for better results.
+	Incremental parser for a streamed JSON answer. feed() returns the new
+	characters of the "insight" string as they arrive; result() is the whole
+	object once its closing brace has been seen (code fences and text around
+	it are ignored).
+	"""
+	INSIGHT_KEY = re.compile(r'"insight"\s*:\s*"')
+	HIGH_SURROGATE = re.compile(r'\\u[dD][89abAB][0-9a-fA-F]{2}')
+
+	def __init__(self):
+		self.text = ""
+		self._pos = 0
+		self._depth = 0
+		self._in_string = False
+		self._escape = False
+		self._start = None
+		self._value = None
+		self._emitted = 0
+
+	def feed(self, chunk: str) -> str:
+		self.text += chunk
+		if self._value is None:
+			self._scan()
+		return self._insight_delta()
+
+	def _scan(self):
+		# Track brace depth outside strings to find where the top-level object ends
+		for i in range(self._pos, len(self.text)):
+			ch = self.text[i]
+			if self._in_string:
+				if self._escape:
+					self._escape = False
+				elif ch == "\\":
+					self._escape = True
+				elif ch == '"':
+					self._in_string = False
+			elif ch == '"' and self._start is not None:
+				self._in_string = True
+			elif ch == "{":
+				if self._depth == 0:
+					self._start = i
+				self._depth += 1
+			elif ch == "}" and self._depth > 0:
+				self._depth -= 1
+				if self._depth == 0:
+					try:
+						self._value = json.loads(self.text[self._start:i + 1])
+						self._pos = i + 1
+						return
+					except ValueError:
+						# Not valid JSON after all: look for the next object
+						self._start = None
+		self._pos = len(self.text)
+
+	def _insight_delta(self) -> str:
+		if self._start is None:
+			return ""
+		match = self.INSIGHT_KEY.search(self.text, self._start)
+		if not match:
+			return ""
+		decoded = []
+		i = match.end()
+		while i < len(self.text):
+			ch = self.text[i]
+			if ch == '"':
+				break
+			if ch == "\\":
+				escape = self._escape_at(i)
+				if escape is None:
+					break  # escape sequence split across chunks
+				try:
+					decoded.append(json.loads(f'"{escape}"'))
+				except ValueError:
+					decoded.append(escape)
+				i += len(escape)
+				continue
+			decoded.append(ch)
+			i += 1
+		insight = "".join(decoded)
+		delta = insight[self._emitted:]
+		self._emitted = len(insight)
+		return delta
+
+	def _escape_at(self, i: int):
+		# A \uD800-\uDBFF escape is decoded together with the low surrogate after it
+		size = 6 if self.text[i + 1:i + 2] == "u" else 2
+		if size == 6 and self.HIGH_SURROGATE.fullmatch(self.text, i, i + 6):
+			size = 12
+		escape = self.text[i:i + size]
+		return escape if len(escape) == size else None
+
+	def result(self):
+		"""
+		The parsed object if it is complete, else None.
+		"""
+		return self._value
+
+def _request(prompt_text: str, max_tokens: int):
+	"""
+	(payload, headers) for an OpenRouter chat completion.
 	"""
-	if not OPENROUTER_API_KEY:
-		return {"insight": "AI API key is not set in backend environment.", "confidence": "low"}
 	payload = {
 		"model": DEEPSEEK_MODEL,
 		"messages": [
@@ -53,37 +163,100 @@ def ask_openrouter(prompt_text: str, max_tokens: int = 1000):
 		"Authorization": f"Bearer {OPENROUTER_API_KEY}",
 		"Content-Type": "application/json"
 	}
+	return payload, headers
+
+async def _complete(prompt_text: str, max_tokens: int = 1000):
+	"""
+	Call OpenRouter and return (response, ok); ok is False when the response
+	is an error message rather than a model answer.
+	"""
+	if not OPENROUTER_API_KEY:
+		return {"insight": NO_KEY_MESSAGE, "confidence": "low"}, False
+	payload, headers = _request(prompt_text, max_tokens)
 	try:
-		r = requests.post(OPENROUTER_URL, headers=headers, json=payload, timeout=60)
-		r.raise_for_status()
-		result = r.json()
+		result = await ai_client.post_json(OPENROUTER_URL, payload, headers=headers)
 		content = result['choices'][0]['message'].get('content', '')
 		if not content or content.strip() == '':
-			return {"insight": "AI model returned an empty response. Please try again or use a different model.", "confidence": "low"}
+			return {"insight": EMPTY_MESSAGE, "confidence": "low"}, False
 		# Check for truncated response
 		finish_reason = result['choices'][0].get('finish_reason', '')
 		if finish_reason == 'length':
-			return {"insight": "AI model response was cut off. Please rephrase your question or use a smaller dataset.", "confidence": "low"}
-		return extract_json_or_text(content)
+			return {"insight": TRUNCATED_MESSAGE, "confidence": "low"}, False
+		return extract_json_or_text(content), True
 	except Exception as e:
-		return {"insight": f"AI request failed: {e}", "confidence": "low"}
+		return {"insight": f"AI request failed: {e}", "confidence": "low"}, False
 
-def ask_ai_for_query(dataset_snapshot: str, columns: list, stats: str, question: str) -> dict:
+async def ask_openrouter(prompt_text: str, max_tokens: int = 1000):
 	"""
-	Format and send a query prompt to OpenRouter, return AI response.
+	Call OpenRouter API with prompt_text, return parsed response (JSON or text).
+	Handles empty/truncated responses and increases max_tokens for better results.
+	Uses the pooled ai_client, which retries rate limits and server errors.
+	"""
+	response, _ = await _complete(prompt_text, max_tokens)
+	return response
+
+def _query_prompt(dataset_profile: str, question: str) -> str:
+	"""
+	Prompt asking for an insight plus optional chart and compute specs as JSON.
 	"""
 	system = "You are a concise data analyst. Always respond in JSON only."
 	user = (
-		f"Here is a dataset snapshot (first rows): {dataset_snapshot}\n"
-		f"Columns: {columns}\nStats: {stats}\n"
+		f"Dataset profile:\n{dataset_profile}\n"
 		f"Question: \"{question}\"\n"
 		"Please reply exactly with JSON:\n"
-		"{\n  \"insight\": \"<short explanation — 1-3 sentences>\",\n  \"confidence\": \"low|medium|high\",\n  \"chart\": { \"type\": \"bar|line|pie|scatter|histogram\", \"x\": \"column\", \"y\":\"column\", \"agg\":\"sum|mean|count|none\", \"top_n\":10 }  // chart optional\n}"
+		"{\n  \"insight\": \"<short explanation — 1-3 sentences>\",\n  \"confidence\": \"low|medium|high\",\n  \"chart\": { \"type\": \"bar|line|pie|scatter|histogram\", \"x\": \"column\", \"y\":\"column\", \"agg\":\"sum|mean|count|none\", \"top_n\":10 },  // chart optional\n"
+		"  \"compute\": { \"agg\": \"sum|mean|median|min|max|count|nunique\", \"col\": \"column\", \"filters\": [{ \"col\": \"column\", \"cmp\": \"==|!=|>|>=|<|<=|in|contains\", \"value\": 1, \"part\": \"year|month|day|weekday|quarter (dates only, optional)\" }], \"group_by\": \"column (optional)\" }  // include when the question asks for a number; it is computed exactly on the full data\n}"
 	)
-	prompt = f"System: {system}\nUser: {user}"
-	return ask_openrouter(prompt)
+	return f"System: {system}\nUser: {user}"
+
+async def cached_query_answer(dataset_version: str, question: str):
+	"""
+	Cached answer to question for this dataset version and model, or None.
+	"""
+	return await executor.run_io("ai_cache", ai_cache.get, dataset_version, question, DEEPSEEK_MODEL)
+
+async def ask_ai_for_query(dataset_profile: str, question: str, dataset_version: str = None) -> dict:
+	"""
+	Format and send a query prompt to OpenRouter, return AI response.
+	dataset_profile is the compact profile from profile.build_profile.
+	With dataset_version, successful answers are stored in the response cache.
+	"""
+	prompt = _query_prompt(dataset_profile, question)
+	response, ok = await _complete(prompt, QUERY_MAX_TOKENS)
+	if ok and dataset_version:
+		await executor.run_io("ai_cache", ai_cache.put, dataset_version, question, DEEPSEEK_MODEL, response)
+	return response
+
+async def stream_query(dataset_profile: str, question: str, dataset_version: str = None):
+	"""
+	Streaming variant of ask_ai_for_query. Yields ("insight", text) with each
+	new piece of the insight as tokens arrive, then ("result", response) once.
+	"""
+	if not OPENROUTER_API_KEY:
+		yield "result", {"insight": NO_KEY_MESSAGE, "confidence": "low"}
+		return
+	payload, headers = _request(_query_prompt(dataset_profile, question), QUERY_MAX_TOKENS)
+	extractor = StreamingJSONExtractor()
+	try:
+		async for content, finish_reason in ai_client.stream_chat(OPENROUTER_URL, payload, headers=headers):
+			delta = extractor.feed(content)
+			if delta:
+				yield "insight", delta
+			if finish_reason == "length":
+				yield "result", {"insight": TRUNCATED_MESSAGE, "confidence": "low"}
+				return
+	except Exception as e:
+		yield "result", {"insight": f"AI request failed: {e}", "confidence": "low"}
+		return
+	if not extractor.text.strip():
+		yield "result", {"insight": EMPTY_MESSAGE, "confidence": "low"}
+		return
+	response = extractor.result() or extract_json_or_text(extractor.text)
+	if dataset_version:
+		await executor.run_io("ai_cache", ai_cache.put, dataset_version, question, DEEPSEEK_MODEL, response)
+	yield "result", response
 
-def ask_ai_for_visualization(dataset_snapshot: str, ask_text: str) -> dict:
+async def ask_ai_for_visualization(dataset_snapshot: str, ask_text: str) -> dict:
 	"""
 	Format and send a visualization prompt to OpenRouter, return chart spec.
 	"""
@@ -93,9 +266,9 @@ def ask_ai_for_visualization(dataset_snapshot: str, ask_text: str) -> dict:
 		"Return JSON: { \"type\":\"bar\", \"x\":\"col\", \"y\":\"col\", \"agg\":\"sum\", \"top_n\":10 }"
 	)
 	prompt = f"System: {system}\nUser: {user}"
-	return ask_openrouter(prompt)
+	return await ask_openrouter(prompt)
 
-def ask_ai_for_transform(dataset_snapshot: str, question: str) -> dict:
+async def ask_ai_for_transform(dataset_snapshot: str, question: str) -> dict:
 	"""
 	Format and send a transform suggestion prompt to OpenRouter, return ops list.
 	"""
@@ -106,4 +279,4 @@ def ask_ai_for_transform(dataset_snapshot: str, question: str) -> dict:
 		"Reply: {\"ops\":[ {\"op\":\"fillna\",\"col\":\"A\",\"method\":\"median\"}, {\"op\":\"drop_outliers\",\"col\":\"B\",\"method\":\"iqr\",\"threshold\":1.5} ]}"
 	)
 	prompt = f"System: {system}\nUser: {user}"
-	return ask_openrouter(prompt)
+	return await ask_openrouter(prompt)
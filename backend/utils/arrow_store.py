@@ -0,0 +1,92 @@
+# arrow_store.py
+"""
+The canonical columnar copy of an upload, kept as an uncompressed Arrow IPC
+file. Readers memory-map it: numeric, date and categorical columns come back
+as NumPy arrays over the mapped pages instead of copies, so every worker
+process that opens a dataset shares one copy in the page cache and its own
+memory holds only text columns. Each column is written as one contiguous
+chunk, which pandas can wrap without concatenating, and float NaN is stored
+as a value rather than a null, so it needs no fill pass on read. Arrays
+backed by the map are read-only.
+"""
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+try:
+	import pyarrow as pa
+	import pyarrow.ipc
+	HAS_PYARROW = True
+except ImportError:
+	HAS_PYARROW = False
+
+def _table(df: pd.DataFrame):
+	table = pa.Table.from_pandas(df, preserve_index=False)
+	for i in range(df.shape[1]):
+		values = df.iloc[:, i]
+		# from_pandas turns NaN into nulls, which to_pandas has to copy to fill back in
+		if isinstance(values.dtype, np.dtype) and values.dtype.kind == "f":
+			table = table.set_column(i, table.schema.field(i), pa.array(values.to_numpy(), from_pandas=False))
+	return table.combine_chunks()
+
+def write(df: pd.DataFrame, path: str) -> bool:
+	"""
+	Write df as an Arrow IPC file atomically. Returns False if pyarrow is
+	missing or the frame cannot be represented (e.g. mixed-type object columns).
+	"""
+	if not HAS_PYARROW:
+		return False
+	tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+	try:
+		table = _table(df)
+		with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+			writer.write_table(table)
+		os.replace(tmp_path, path)
+		return True
+	except Exception:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+		return False
+
+def open_table(path: str, columns: list = None):
+	"""
+	The file as a pyarrow Table over a memory map; nothing is read until used.
+	"""
+	table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+	return table.select(list(columns)) if columns else table
+
+def to_frame(table) -> pd.DataFrame:
+	# split_blocks keeps one block per column, so pandas does not consolidate (copy) them
+	return table.to_pandas(split_blocks=True)
+
+def read_frame(path: str, columns: list = None) -> pd.DataFrame:
+	"""
+	The file (or just `columns`) as a DataFrame sharing memory with the map where the dtype allows.
+	"""
+	return to_frame(open_table(path, columns))
+
+def column_names(path: str) -> list:
+	return list(pa.ipc.open_file(pa.memory_map(path)).schema.names)
+
+def num_rows(path: str) -> int:
+	return open_table(path).num_rows
+
+def read_slice(path: str, start: int, stop: int, columns: list = None) -> pd.DataFrame:
+	"""
+	Rows [start, stop) indexed by row position.
+	"""
+	table = open_table(path, columns)
+	start = min(start, table.num_rows)
+	df = to_frame(table.slice(start, max(min(stop, table.num_rows) - start, 0)))
+	df.index = pd.RangeIndex(start, start + len(df))
+	return df
+
+def iter_frames(path: str, chunksize: int, columns: list = None):
+	"""
+	Yield the file as DataFrames of at most chunksize rows.
+	"""
+	table = open_table(path, columns)
+	for start in range(0, table.num_rows, chunksize):
+		yield to_frame(table.slice(start, chunksize))
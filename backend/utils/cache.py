@@ -0,0 +1,93 @@
+# cache.py
+"""
+In-process LRU cache with a byte budget, shared by the dataset loaders.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Default memory budget for cached DataFrames (256 MB), override with DATASET_CACHE_MAX_BYTES
+DATASET_CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+def estimate_size(value) -> int:
+	"""
+	Approximate in-memory size of a cached value in bytes.
+	"""
+	if isinstance(value, pd.DataFrame):
+		return int(value.memory_usage(index=True, deep=True).sum())
+	if isinstance(value, pd.Series):
+		return int(value.memory_usage(index=True, deep=True))
+	return sys.getsizeof(value)
+
+class LRUCache:
+	"""
+	Thread-safe least-recently-used cache bounded by total byte size.
+	Entries larger than the whole budget are not cached at all.
+	"""
+	def __init__(self, max_bytes: int, sizeof=estimate_size):
+		self.max_bytes = max_bytes
+		self.sizeof = sizeof
+		self._data = OrderedDict()
+		self._lock = threading.Lock()
+		self.current_bytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, key, default=None):
+		with self._lock:
+			if key in self._data:
+				self._data.move_to_end(key)
+				self.hits += 1
+				return self._data[key][0]
+			self.misses += 1
+			return default
+
+	def put(self, key, value):
+		size = self.sizeof(value)
+		with self._lock:
+			if key in self._data:
+				self.current_bytes -= self._data.pop(key)[1]
+			if size > self.max_bytes:
+				return
+			self._data[key] = (value, size)
+			self.current_bytes += size
+			while self.current_bytes > self.max_bytes and self._data:
+				_, (_, evicted_size) = self._data.popitem(last=False)
+				self.current_bytes -= evicted_size
+				self.evictions += 1
+
+	def invalidate(self, predicate) -> int:
+		"""
+		Drop every entry whose key matches predicate(key). Returns number removed.
+		"""
+		with self._lock:
+			keys = [k for k in self._data if predicate(k)]
+			for k in keys:
+				self.current_bytes -= self._data.pop(k)[1]
+			return len(keys)
+
+	def clear(self):
+		with self._lock:
+			self._data.clear()
+			self.current_bytes = 0
+
+	def stats(self) -> dict:
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				"entries": len(self._data),
+				"bytes": self.current_bytes,
+				"max_bytes": self.max_bytes,
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"hit_rate": (self.hits / lookups) if lookups else 0.0,
+			}
+
+# Shared cache of parsed datasets, keyed by (dataset_id, path of the upload or its
+# Arrow copy, that file's mtime_ns, projected columns); see file_utils.load_dataframe
+dataset_cache = LRUCache(DATASET_CACHE_MAX_BYTES)
@@ -0,0 +1,112 @@
+# chunked.py
+"""
+Out-of-core cleaning and summary stats: process datasets larger than memory in row chunks.
+Stats come from the mergeable StatsAccumulator so chunks (or workers) can be combined.
+"""
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from . import dtypes, ops, tracing
+from .stats_engine import StatsAccumulator
+
+class RowDeduplicator:
+	"""
+	Drops rows already seen in earlier chunks using a sorted array of 64-bit row digests.
+	"""
+	def __init__(self):
+		self.seen = np.empty(0, dtype=np.uint64)
+
+	def filter(self, chunk: pd.DataFrame) -> pd.DataFrame:
+		if chunk.empty:
+			return chunk
+		digests = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+		keep = ~pd.Series(digests).duplicated().to_numpy()
+		if len(self.seen):
+			pos = np.searchsorted(self.seen, digests)
+			pos[pos == len(self.seen)] = 0
+			keep &= self.seen[pos] != digests
+		self.seen = np.union1d(self.seen, digests[keep])
+		return chunk[keep]
+
+def fill_values(stats: StatsAccumulator, strategy: dict) -> dict:
+	"""
+	Per-column fill values matching auto_clean's numeric/categorical strategy.
+	"""
+	fills = {}
+	for col in stats.numeric:
+		if stats.sketches[col].n:
+			if strategy.get("numeric", "median") == "mean":
+				fills[col] = stats.mean(col)
+			else:
+				fills[col] = stats.quantile(col, 0.5)
+	for col in stats.temporal:
+		# Dates always take their mode, like pipeline._missing_fills; empty columns stay empty
+		mode = stats.mode(col)
+		if mode is not None:
+			fills[col] = mode
+	for col in stats.other:
+		if strategy.get("categorical", "mode") == "mode":
+			mode = stats.mode(col)
+			fills[col] = mode if mode is not None else "<missing>"
+		else:
+			fills[col] = strategy.get("categorical_value", "<missing>")
+	return fills
+
+@tracing.traced("stats")
+def get_summary_stats_chunked(chunks) -> dict:
+	"""
+	Summary stats over an iterable of DataFrame chunks, same layout as get_summary_stats.
+	"""
+	stats = StatsAccumulator()
+	for chunk in chunks:
+		stats.update(chunk)
+	return stats.result()
+
+@tracing.traced("clean")
+def auto_clean_chunked(chunk_source, strategy: dict, out_path: str, preview_rows: int = 20):
+	"""
+	Out-of-core auto_clean. chunk_source() must return a fresh iterator of chunks.
+	Pass 1 deduplicates and gathers fill values; pass 2 deduplicates again,
+	fills, appends each chunk to out_path (CSV) and accumulates stats of the
+	cleaned output. Returns (preview records, stats dict, cleaned row count).
+	"""
+	if strategy is None:
+		strategy = {"numeric": "median", "categorical": "mode", "drop_duplicates": True}
+	drop_cols = set(strategy.get("drop_columns", []))
+	dedupe = strategy.get("drop_duplicates", True)
+
+	def cleaned_chunks():
+		dedup = RowDeduplicator() if dedupe else None
+		for chunk in chunk_source():
+			if drop_cols:
+				chunk = chunk.drop(columns=[c for c in chunk.columns if c in drop_cols])
+			yield dedup.filter(chunk) if dedup else chunk
+
+	fill_stats = StatsAccumulator()
+	for chunk in cleaned_chunks():
+		fill_stats.update(chunk)
+	fills = fill_values(fill_stats, strategy)
+
+	output_stats = StatsAccumulator()
+	preview = []
+	rows = 0
+	tmp_path = f"{out_path}.{uuid.uuid4().hex}.tmp"
+	try:
+		first = True
+		for chunk in cleaned_chunks():
+			# Adds a fill value missing from a category column's categories first, as the in-memory path does
+			chunk = ops.fill_frame(chunk, {c: v for c, v in fills.items() if c in chunk.columns})
+			dtypes.dates_as_text(chunk).to_csv(tmp_path, mode='w' if first else 'a', header=first, index=False)
+			first = False
+			output_stats.update(chunk)
+			if len(preview) < preview_rows:
+				preview.extend(chunk.head(preview_rows - len(preview)).to_dict(orient="records"))
+			rows += len(chunk)
+		os.replace(tmp_path, out_path)
+	finally:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+	return preview, output_stats.result(), rows
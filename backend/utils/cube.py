@@ -0,0 +1,285 @@
+# cube.py
+"""
+Materialized aggregates for low-cardinality columns. A background step after
+upload groups the dataset once by every column with at most CUBE_MAX_GROUPS
+distinct values (the dimensions) and keeps, per group and numeric column (the
+measures), the count, sum, mean, min, max and sum of squares, along with each
+dimension's value counts and whole-column totals. Bar/line/pie charts and
+unfiltered compute answers over those columns are then read from the cube
+instead of scanning the rows.
+
+Count, sum, min, max and sum of squares merge across row chunks, so datasets
+too large to load are aggregated chunk by chunk; their means are then
+sum / count. The cube is persisted as JSON next to the upload, tagged with
+the dataset version it describes, and cached in memory (per worker process in
+the executor's process mode).
+"""
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from . import file_utils
+from .cache import LRUCache, estimate_size
+
+# Columns with at most this many distinct values become cube dimensions
+CUBE_MAX_GROUPS = int(os.getenv("CUBE_MAX_GROUPS", 1000))
+# Memory budget for cached cubes (32 MB, per worker process in process mode), override with CUBE_CACHE_MAX_BYTES
+CUBE_CACHE_MAX_BYTES = int(os.getenv("CUBE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+# Aggregations answered from the cube; the rest (median, nunique) need the rows
+CUBE_AGGS = ["count", "sum", "mean", "min", "max"]
+
+def _cube_size(cube: dict) -> int:
+	size = sys.getsizeof(cube)
+	for dimension in cube["dimensions"].values():
+		size += sum(estimate_size(value) for value in dimension.values())
+	return size
+
+cube_cache = LRUCache(CUBE_CACHE_MAX_BYTES, sizeof=_cube_size)
+
+def _is_measure(s: pd.Series) -> bool:
+	# Plain NumPy numbers only: booleans, dates and nullable extension types are not summed
+	return isinstance(s.dtype, np.dtype) and s.dtype.kind in "iuf"
+
+def _dimension(df: pd.DataFrame, dim: str, measures: list, squares: pd.DataFrame):
+	"""
+	{"groups", "sizes", "counts"} of one chunk grouped by dim, or None if dim
+	has too many values or its values cannot be grouped (e.g. mixed types).
+	"""
+	if df[dim].nunique() > CUBE_MAX_GROUPS:
+		return None
+	cols = [m for m in measures if m != dim]
+	try:
+		grouped = df.groupby(dim, observed=True)
+		sizes = grouped.size()
+		if cols:
+			groups = grouped[cols].agg(CUBE_AGGS)
+			sumsq = squares[cols].groupby(df[dim], observed=True).sum()
+			sumsq.columns = pd.MultiIndex.from_product([cols, ["sumsq"]])
+			groups = pd.concat([groups, sumsq], axis=1)
+		else:
+			groups = pd.DataFrame(index=sizes.index, columns=pd.MultiIndex.from_arrays([[], []]))
+	except TypeError:
+		return None
+	counts = df[dim].value_counts()
+	if isinstance(df[dim].dtype, pd.CategoricalDtype):
+		# Categorical columns also list categories that no longer occur, with a zero count
+		counts = counts[counts > 0]
+	return {"groups": groups, "sizes": sizes, "counts": counts}
+
+def _totals(df: pd.DataFrame, measures: list, squares: pd.DataFrame) -> dict:
+	# The same reductions compute() runs on a whole column
+	return {m: {**{agg: df[m].agg(agg) for agg in CUBE_AGGS}, "sumsq": squares[m].sum()} for m in measures}
+
+def _chunk(df: pd.DataFrame, dimensions: list, measures: list) -> dict:
+	# Sums of squares are kept so variances can be derived without a rescan
+	squares = df[measures].astype("float64") ** 2
+	return {
+		"rows": len(df),
+		"totals": _totals(df, measures, squares),
+		"dimensions": {dim: _dimension(df, dim, measures, squares) for dim in dimensions},
+	}
+
+def _merge_groups(frames: list, measures: list) -> pd.DataFrame:
+	groups = pd.concat(frames)
+	stat = groups.columns.get_level_values(1)
+	grouped = groups.groupby(level=0, observed=True)
+	merged = pd.concat([
+		grouped[list(groups.columns[stat.isin(["count", "sum", "sumsq"])])].sum(),
+		grouped[list(groups.columns[stat == "min"])].min(),
+		grouped[list(groups.columns[stat == "max"])].max(),
+	], axis=1)
+	for m in measures:
+		if (m, "sum") in merged.columns:
+			merged[(m, "mean")] = merged[(m, "sum")] / merged[(m, "count")].where(merged[(m, "count")] > 0)
+	return merged[[c for c in groups.columns if c in merged.columns]]
+
+def _merge(parts: list, measures: list, dimensions: list) -> dict:
+	"""
+	Combine per-chunk aggregates; a single chunk is returned as computed.
+	"""
+	if len(parts) == 1:
+		return parts[0]
+	totals = {}
+	for m in measures:
+		stats = pd.DataFrame([part["totals"][m] for part in parts])
+		count = stats["count"].sum()
+		totals[m] = {
+			"count": count, "sum": stats["sum"].sum(), "min": stats["min"].min(), "max": stats["max"].max(),
+			"sumsq": stats["sumsq"].sum(), "mean": stats["sum"].sum() / count if count else float("nan"),
+		}
+	merged = {}
+	for dim in dimensions:
+		pieces = [part["dimensions"][dim] for part in parts]
+		sizes = pd.concat([p["sizes"] for p in pieces]).groupby(level=0, observed=True).sum()
+		if len(sizes) > CUBE_MAX_GROUPS:
+			continue
+		counts = pd.concat([p["counts"] for p in pieces]).groupby(level=0, observed=True).sum()
+		groups = _merge_groups([p["groups"][[c for c in p["groups"].columns if c[0] in measures]] for p in pieces], measures)
+		merged[dim] = {"groups": groups, "sizes": sizes, "counts": counts.sort_values(ascending=False, kind="stable")}
+	return {"rows": sum(part["rows"] for part in parts), "totals": totals, "dimensions": merged}
+
+def build(frames, version: str) -> dict:
+	"""
+	Cube over frames (the dataset as one DataFrame or as row chunks), tagged with version.
+	"""
+	columns, measures, dimensions, parts = None, None, None, []
+	for df in frames:
+		if columns is None:
+			columns = list(df.columns)
+			measures = [c for c in columns if _is_measure(df[c])]
+			dimensions = list(columns)
+		# A column parsed as text in a later chunk stops being a measure
+		measures = [m for m in measures if _is_measure(df[m])]
+		part = _chunk(df, dimensions, measures)
+		dimensions = [dim for dim in dimensions if part["dimensions"][dim] is not None]
+		parts.append(part)
+	if not parts:
+		return {"version": version, "rows": 0, "columns": [], "measures": [], "totals": {}, "dimensions": {}}
+	cube = _merge(parts, measures, dimensions)
+	return {
+		"version": version,
+		"rows": cube["rows"],
+		"columns": columns,
+		"measures": measures,
+		"totals": {m: cube["totals"][m] for m in measures},
+		"dimensions": {dim: cube["dimensions"][dim] for dim in dimensions if dim in cube["dimensions"]},
+	}
+
+def _encode_index(index: pd.Index) -> dict:
+	# Values with their dtype: datetimes as integer ticks, categoricals as codes into their categories
+	if isinstance(index.dtype, pd.CategoricalDtype):
+		return {"categories": _encode_index(index.categories), "codes": index.codes.tolist(), "ordered": bool(index.dtype.ordered)}
+	values = index.asi8.tolist() if index.dtype.kind in "mM" else index.tolist()
+	return {"dtype": str(index.dtype), "values": values}
+
+def _decode_index(data: dict, name=None) -> pd.Index:
+	if "codes" in data:
+		categories = _decode_index(data["categories"])
+		return pd.CategoricalIndex(pd.Categorical.from_codes(data["codes"], categories, ordered=data["ordered"]), name=name)
+	dtype = pd.api.types.pandas_dtype(data["dtype"])
+	if dtype.kind not in "mM":
+		return pd.Index(data["values"], dtype=dtype, name=name)
+	tz = getattr(dtype, "tz", None)
+	unit = dtype.unit if tz is not None else np.datetime_data(dtype)[0]
+	index = pd.Index(np.array(data["values"], dtype="int64").view(f"{dtype.kind}8[{unit}]"), name=name)
+	return index.tz_localize("UTC").tz_convert(tz) if tz is not None else index
+
+def _encode_series(s: pd.Series) -> dict:
+	return {"name": s.name, "index": _encode_index(s.index), "dtype": str(s.dtype), "values": s.tolist()}
+
+def _decode_series(data: dict) -> pd.Series:
+	return pd.Series(np.array(data["values"], dtype=data["dtype"]), index=_decode_index(data["index"]), name=data["name"])
+
+def _encode(cube: dict) -> dict:
+	"""
+	JSON-ready form of a cube; floats keep every digit, indexes their dtypes.
+	"""
+	dimensions = {}
+	for dim, d in cube["dimensions"].items():
+		groups = d["groups"]
+		dimensions[dim] = {
+			"index": _encode_index(groups.index),
+			"columns": [[m, stat, str(groups[(m, stat)].dtype), groups[(m, stat)].tolist()] for m, stat in groups.columns],
+			"sizes": _encode_series(d["sizes"]),
+			"counts": _encode_series(d["counts"]),
+		}
+	totals = {m: {stat: np.asarray(v).item() for stat, v in t.items()} for m, t in cube["totals"].items()}
+	return {**cube, "totals": totals, "dimensions": dimensions}
+
+def _decode(data: dict) -> dict:
+	dimensions = {}
+	for dim, d in data["dimensions"].items():
+		index = _decode_index(d["index"], dim)
+		columns = d["columns"]
+		groups = pd.DataFrame(
+			{(m, stat): np.array(values, dtype=dtype) for m, stat, dtype, values in columns},
+			index=index, columns=pd.MultiIndex.from_tuples([(m, stat) for m, stat, _, _ in columns]) if columns else pd.MultiIndex.from_arrays([[], []]),
+		)
+		sizes, counts = _decode_series(d["sizes"]), _decode_series(d["counts"])
+		sizes.index.name = counts.index.name = dim
+		dimensions[dim] = {"groups": groups, "sizes": sizes, "counts": counts}
+	return {**data, "dimensions": dimensions}
+
+def save(dataset_id: str, cube: dict):
+	"""
+	Persist the cube of dataset_id atomically.
+	"""
+	def write(path):
+		with open(path, "w", encoding="utf-8") as f:
+			json.dump(_encode(cube), f)
+	file_utils._atomic_write(file_utils.cube_path(dataset_id), write)
+	cube_cache.put((dataset_id, cube["version"]), cube)
+
+def get(dataset_id: str, version: str):
+	"""
+	The cube built for this version of the dataset, or None if there is none (yet).
+	"""
+	key = (dataset_id, version)
+	cube = cube_cache.get(key)
+	if cube is not None:
+		return cube
+	path = file_utils.cube_path(dataset_id)
+	if not os.path.exists(path):
+		return None
+	try:
+		with open(path, encoding="utf-8") as f:
+			data = json.load(f)
+		# Built for an earlier upload under the same id
+		if data.get("version") != version:
+			return None
+		cube = _decode(data)
+	except (OSError, ValueError, KeyError, TypeError):
+		return None
+	cube_cache.put(key, cube)
+	return cube
+
+def describe(cube: dict) -> dict:
+	"""
+	{"rows", "dimensions": {dim: groups}, "measures"} of a cube.
+	"""
+	return {
+		"rows": cube["rows"],
+		"dimensions": {dim: len(d["sizes"]) for dim, d in cube["dimensions"].items()},
+		"measures": cube["measures"],
+	}
+
+def group_values(cube, dim: str, measure, agg: str):
+	"""
+	agg of measure per group of dim (group sizes when measure is None) in
+	groupby order, as df.groupby(dim, observed=True)[measure].agg(agg) would
+	return it; None when the cube does not hold it.
+	"""
+	dimension = cube["dimensions"].get(dim) if cube is not None else None
+	if dimension is None:
+		return None
+	if measure is None:
+		return dimension["sizes"]
+	if agg not in CUBE_AGGS or measure == dim or (measure, agg) not in dimension["groups"].columns:
+		return None
+	return dimension["groups"][(measure, agg)].rename(measure)
+
+def value_counts(cube, column: str):
+	"""
+	Non-zero value counts of a dimension, most frequent first; None if column is not one.
+	"""
+	dimension = cube["dimensions"].get(column) if cube is not None else None
+	return dimension["counts"] if dimension is not None else None
+
+def answer(cube, spec: dict):
+	"""
+	Raw result of a validated compute spec (a scalar, or per-group values
+	before top_n) when the cube holds it, else None. Filtered specs need the rows.
+	"""
+	if cube is None or spec.get("filters"):
+		return None
+	agg = spec["agg"]
+	col = spec.get("col")
+	if spec.get("group_by"):
+		return group_values(cube, spec["group_by"], col, agg)
+	if col is None:
+		return cube["rows"]
+	totals = cube["totals"].get(col)
+	return totals[agg] if totals is not None and agg in CUBE_AGGS else None
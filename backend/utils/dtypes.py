@@ -0,0 +1,93 @@
+# dtypes.py
+"""
+Dtype inference for freshly parsed uploads, to shrink their memory footprint.
+Integers are downcast to the smallest signed type that holds them,
+low-cardinality text becomes category and text columns of ISO dates
+(YYYY-MM-DD) become datetime64; text exports render them back the same way.
+Floats stay float64: pandas reduces float32 columns in float32, so sums,
+means and deviations would lose digits even where every stored value is exact.
+The optimized frame is what the Arrow copy stores, so the dataset cache and
+every endpoint see the same dtypes.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# Text becomes category when its distinct values are at most this share of the rows...
+CATEGORY_MAX_RATIO = float(os.getenv("CATEGORY_MAX_RATIO", 0.5))
+# ...and at most this many
+CATEGORY_MAX_VALUES = int(os.getenv("CATEGORY_MAX_VALUES", 10_000))
+# Text is parsed as dates only if this many leading values all look like ISO dates.
+# Times are left as text: exports could not tell how they were written (T or space, seconds)
+DATE_SAMPLE_ROWS = 1000
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def memory_bytes(df: pd.DataFrame) -> int:
+	return int(df.memory_usage(index=True, deep=True).sum())
+
+def _parse_dates(s: pd.Series):
+	sample = s.dropna().head(DATE_SAMPLE_ROWS)
+	if sample.empty or not all(ISO_DATE.match(v) for v in sample):
+		return None
+	dates = pd.to_datetime(s, format="ISO8601", errors="coerce")
+	# Any value that fails to parse means this is not a date column after all
+	return dates if dates.isna().sum() == s.isna().sum() else None
+
+def _date_text(s: pd.Series) -> pd.Series:
+	values = s.to_numpy(dtype="datetime64[ns]")
+	present = values[~np.isnat(values)]
+	# Plain dates as uploaded (YYYY-MM-DD); the time only where a value has one
+	if (present == present.astype("datetime64[D]")).all():
+		text = pd.Series(np.datetime_as_string(values, unit="D"), index=s.index, dtype=object)
+	else:
+		text = pd.Series(np.datetime_as_string(values, unit="s"), index=s.index, dtype=object).str.replace("T", " ", regex=False)
+	return text.where(s.notna(), None)
+
+def dates_as_text(df: pd.DataFrame) -> pd.DataFrame:
+	"""
+	df with its datetime columns rendered as text, for CSV/XLSX/JSON exports.
+	"""
+	dates = [i for i in range(df.shape[1]) if isinstance(df.dtypes.iloc[i], np.dtype) and df.dtypes.iloc[i].kind == "M"]
+	if not dates:
+		return df
+	df = df.copy(deep=False)
+	for i in dates:
+		df.isetitem(i, _date_text(df.iloc[:, i]))
+	return df
+
+def _optimize_column(s: pd.Series) -> pd.Series:
+	if pd.api.types.is_integer_dtype(s.dtype) and s.dtype.kind == 'i':
+		return pd.to_numeric(s, downcast="integer")
+	# Mixed-type object columns stay as they are; Parquet could not store them as one type
+	if s.dtype != object or pd.api.types.infer_dtype(s, skipna=True) != "string":
+		return s
+	dates = _parse_dates(s)
+	if dates is not None:
+		return dates
+	unique = s.nunique()
+	if unique <= CATEGORY_MAX_VALUES and unique <= CATEGORY_MAX_RATIO * len(s):
+		return s.astype("category")
+	return s
+
+def optimize(df: pd.DataFrame):
+	"""
+	Return (optimized frame, report). report has the deep memory size before and
+	after and the {column: [old dtype, new dtype]} changes.
+	"""
+	before = memory_bytes(df)
+	changes = {}
+	columns = {}
+	# By position: uploads may repeat a column name
+	for i in range(df.shape[1]):
+		old = df.iloc[:, i]
+		s = _optimize_column(old)
+		if s.dtype != old.dtype:
+			columns[i] = s
+			changes[str(df.columns[i])] = [str(old.dtype), str(s.dtype)]
+	if columns:
+		df = df.copy(deep=False)
+		for i, s in columns.items():
+			df.isetitem(i, s)
+	return df, {"before_bytes": before, "after_bytes": memory_bytes(df), "columns": changes}
@@ -0,0 +1,175 @@
+# executor.py
+"""
+Execution layer that keeps blocking work off the event loop.
+CPU-bound pandas work goes to a bounded worker pool, blocking I/O (HTTP calls,
+file writes) to a thread pool. Each endpoint has its own concurrency limit and
+queue-depth counters.
+
+The CPU pool runs threads by default: pandas releases the GIL in most heavy
+kernels, and the threads share one set of dataset, transform, aggregate and
+cube caches. EXECUTOR_MODE=process isolates work in spawned processes instead
+(forking a threaded server is unsafe), but each worker then keeps its own
+copy of every cache: memory use grows up to CPU_WORKERS times the configured
+cache budgets, and each worker only hits on the requests routed to it.
+"""
+import asyncio
+import os
+import threading
+import time
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import tracing
+
+# "thread" (default, shares the caches), "process" (per-worker caches, see above) or "inline" (debugging)
+EXECUTOR_MODE = os.getenv("EXECUTOR_MODE", "thread")
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", os.cpu_count() or 1))
+IO_WORKERS = int(os.getenv("IO_WORKERS", 16))
+# Per-endpoint concurrency, e.g. "clean=2,stats=4"; unlisted endpoints use DEFAULT_ENDPOINT_LIMIT
+DEFAULT_ENDPOINT_LIMIT = int(os.getenv("DEFAULT_ENDPOINT_LIMIT", CPU_WORKERS * 2))
+
+def _parse_limits(spec: str) -> dict:
+	limits = {}
+	for item in filter(None, (part.strip() for part in spec.split(","))):
+		name, _, value = item.partition("=")
+		limits[name.strip()] = int(value)
+	return limits
+
+ENDPOINT_LIMITS = _parse_limits(os.getenv("ENDPOINT_CONCURRENCY", ""))
+
+class _Gate:
+	"""
+	Concurrency limit plus queue-depth/latency counters for one endpoint.
+	"""
+	def __init__(self, limit: int):
+		self.limit = limit
+		self.waiting = 0
+		self.running = 0
+		self.max_waiting = 0
+		self.completed = 0
+		self.failed = 0
+		self.wait_seconds = 0.0
+		self.run_seconds = 0.0
+		self._semaphore = None
+		self._loop = None
+
+	def semaphore(self) -> asyncio.Semaphore:
+		# A semaphore belongs to one event loop; rebuild it if the loop changed (e.g. in tests)
+		loop = asyncio.get_running_loop()
+		if self._loop is not loop:
+			self._semaphore = asyncio.Semaphore(self.limit)
+			self._loop = loop
+		return self._semaphore
+
+	def snapshot(self) -> dict:
+		return {
+			"limit": self.limit,
+			"waiting": self.waiting,
+			"running": self.running,
+			"max_waiting": self.max_waiting,
+			"completed": self.completed,
+			"failed": self.failed,
+			"avg_wait_ms": 1000 * self.wait_seconds / max(self.completed + self.failed, 1),
+			"avg_run_ms": 1000 * self.run_seconds / max(self.completed + self.failed, 1),
+		}
+
+_gates = {}
+_cpu_pool = None
+_io_pool = None
+_pool_lock = threading.Lock()
+
+def _gate(endpoint: str) -> _Gate:
+	if endpoint not in _gates:
+		_gates[endpoint] = _Gate(ENDPOINT_LIMITS.get(endpoint, DEFAULT_ENDPOINT_LIMIT))
+	return _gates[endpoint]
+
+def _get_cpu_pool():
+	global _cpu_pool
+	with _pool_lock:
+		if _cpu_pool is None:
+			if EXECUTOR_MODE == "process":
+				# Spawn, not fork: the server already runs threads (see ingest.py)
+				_cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=get_context("spawn"))
+			else:
+				_cpu_pool = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+		return _cpu_pool
+
+def _get_io_pool():
+	global _io_pool
+	with _pool_lock:
+		if _io_pool is None:
+			_io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+		return _io_pool
+
+def _reset_cpu_pool():
+	global _cpu_pool
+	with _pool_lock:
+		if _cpu_pool is not None:
+			_cpu_pool.shutdown(wait=False, cancel_futures=True)
+		_cpu_pool = None
+
+async def _run(endpoint: str, pool_getter, fn, args, kwargs):
+	gate = _gate(endpoint)
+	gate.waiting += 1
+	gate.max_waiting = max(gate.max_waiting, gate.waiting)
+	queued_at = time.perf_counter()
+	async with gate.semaphore():
+		gate.waiting -= 1
+		gate.running += 1
+		started_at = time.perf_counter()
+		gate.wait_seconds += started_at - queued_at
+		try:
+			# Spans (and profile samples) recorded by fn come back with its result
+			profile = tracing.profiling()
+			if EXECUTOR_MODE == "inline":
+				result, record = tracing.run_traced(fn, args, kwargs, profile)
+			else:
+				loop = asyncio.get_running_loop()
+				result, record = await loop.run_in_executor(pool_getter(), tracing.run_traced, fn, args, kwargs, profile)
+			tracing.merge(record)
+			gate.completed += 1
+			return result
+		except BrokenProcessPool:
+			# A worker died (e.g. OOM); start a fresh pool for the next request
+			gate.failed += 1
+			_reset_cpu_pool()
+			raise
+		except BaseException:
+			gate.failed += 1
+			raise
+		finally:
+			gate.running -= 1
+			gate.run_seconds += time.perf_counter() - started_at
+
+async def run_cpu(endpoint: str, fn, *args, **kwargs):
+	"""
+	Run a CPU-bound function in the worker pool under the endpoint's limit.
+	With the process pool, fn and its arguments must be picklable (module-level functions).
+	"""
+	return await _run(endpoint, _get_cpu_pool, fn, args, kwargs)
+
+async def run_io(endpoint: str, fn, *args, **kwargs):
+	"""
+	Run a blocking I/O function in the thread pool under the endpoint's limit.
+	"""
+	return await _run(endpoint, _get_io_pool, fn, args, kwargs)
+
+def stats() -> dict:
+	"""
+	Pool configuration and per-endpoint queue depth, throughput and latency.
+	"""
+	return {
+		"mode": EXECUTOR_MODE,
+		"cpu_workers": CPU_WORKERS,
+		"io_workers": IO_WORKERS,
+		"endpoints": {name: gate.snapshot() for name, gate in sorted(_gates.items())},
+	}
+
+def shutdown():
+	global _cpu_pool, _io_pool
+	with _pool_lock:
+		for pool in (_cpu_pool, _io_pool):
+			if pool is not None:
+				pool.shutdown(wait=False, cancel_futures=True)
+		_cpu_pool = _io_pool = None
@@ -3,83 +3,582 @@
 Handles file upload, loading, saving, and deletion for datasets.
 """
 import os
+import json
 import uuid
+import hashlib
+import numpy as np
 import pandas as pd
+from starlette.concurrency import run_in_threadpool
+
+try:
+	from python_multipart.multipart import MultipartParser, MultipartParseError, parse_options_header
+except ImportError:
+	# python-multipart before 0.0.13
+	from multipart.multipart import MultipartParser, MultipartParseError, parse_options_header
+
+from . import arrow_store, dtypes, ingest, tracing
+from .cache import dataset_cache
+
+try:
+	import pyarrow  # noqa: F401
+	HAS_PYARROW = True
+except ImportError:
+	HAS_PYARROW = False
 
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), '..', 'uploads')
+# Files are hashed and read back in chunks of this size so memory stays flat
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Allowance for multipart boundaries and part headers on top of the file size limit
+MULTIPART_OVERHEAD = 64 * 1024
+# Sources larger than this (bytes) are processed in row chunks instead of loaded whole
+STREAMING_THRESHOLD_BYTES = int(os.getenv("STREAMING_THRESHOLD_BYTES", 512 * 1024 * 1024))
+# Rows per chunk for out-of-core processing
+CHUNK_ROWS = int(os.getenv("CHUNK_ROWS", 100_000))
+# Rows per Parquet row group of cleaned copies and exports
+PARQUET_ROW_GROUP_ROWS = int(os.getenv("PARQUET_ROW_GROUP_ROWS", 100_000))
+# The CSV row index records the byte offset of every ROW_INDEX_STRIDE-th row
+ROW_INDEX_STRIDE = int(os.getenv("ROW_INDEX_STRIDE", 10_000))
+# Formats the cleaned dataset can be downloaded in
+CLEANED_FORMATS = ["csv", "xlsx", "json", "parquet"]
 
-def save_upload(upload_file) -> str:
+class UploadTooLargeError(ValueError):
+	"""
+	Raised when an upload exceeds the configured size limit.
 	"""
-	Save uploaded file to uploads/ using a generated dataset_id.
+
+def _meta_path(dataset_id: str) -> str:
+	return os.path.join(UPLOAD_DIR, f"{dataset_id}.meta.json")
+
+def _memory_path(dataset_id: str) -> str:
+	return os.path.join(UPLOAD_DIR, f"{dataset_id}.memory.json")
+
+def _multipart_parser(content_type: str, events: list):
+	"""
+	Incremental multipart/form-data parser for a request body. Each part is
+	reported by appending ("part", {header: value}), then ("data", bytes)
+	pieces, then ("end", None) to events, so the caller can await its writes.
+	"""
+	_, params = parse_options_header(content_type or "")
+	boundary = params.get(b"boundary")
+	if not boundary:
+		raise ValueError("Expected a multipart/form-data body.")
+	headers = {}
+	header = [b"", b""]
+
+	def on_header_field(data, start, end):
+		header[0] += data[start:end]
+
+	def on_header_value(data, start, end):
+		header[1] += data[start:end]
+
+	def on_header_end():
+		headers[header[0].lower()] = header[1]
+		header[0] = header[1] = b""
+
+	def on_headers_finished():
+		events.append(("part", dict(headers)))
+		headers.clear()
+
+	return MultipartParser(boundary, {
+		"on_header_field": on_header_field,
+		"on_header_value": on_header_value,
+		"on_header_end": on_header_end,
+		"on_headers_finished": on_headers_finished,
+		"on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+		"on_part_end": lambda: events.append(("end", None)),
+	})
+
+async def save_upload(stream, content_type: str, max_bytes: int = None, field: str = "file") -> str:
+	"""
+	Stream the `field` file of a multipart/form-data request body (an async
+	iterator of byte chunks, e.g. request.stream()) to uploads/ under a
+	generated dataset_id, hashing as it goes; only the chunk being parsed is
+	held in memory. Raises UploadTooLargeError as soon as the file passes
+	max_bytes (or the body passes it by more than MULTIPART_OVERHEAD), and
+	ValueError for a malformed body or a missing or unsupported file.
 	Returns dataset_id (str).
 	"""
 	if not os.path.exists(UPLOAD_DIR):
 		os.makedirs(UPLOAD_DIR)
-	ext = os.path.splitext(upload_file.filename)[-1].lower()
-	if ext not in ['.csv', '.xlsx', '.json']:
-		raise ValueError("Unsupported file type. Only .csv, .xlsx, .json allowed.")
+	events = []
+	parser = _multipart_parser(content_type, events)
+	too_large = UploadTooLargeError(f"File too large (max {max_bytes // (1024 * 1024)}MB).") if max_bytes is not None else None
 	dataset_id = str(uuid.uuid4())
-	dest_path = os.path.join(UPLOAD_DIR, f"{dataset_id}{ext}")
-	with open(dest_path, "wb") as f:
-		content = upload_file.file.read()
-		f.write(content)
+	filename = tmp_path = f = None
+	writing = done = False
+	digest = hashlib.sha256()
+	size = received = 0
+	try:
+		async for chunk in stream:
+			received += len(chunk)
+			if max_bytes is not None and received > max_bytes + MULTIPART_OVERHEAD:
+				raise too_large
+			try:
+				parser.write(chunk)
+			except MultipartParseError as e:
+				raise ValueError(f"Malformed upload: {e}")
+			for kind, value in events:
+				if kind == "part" and filename is None:
+					_, options = parse_options_header(value.get(b"content-disposition", b""))
+					if options.get(b"name") != field.encode() or b"filename" not in options:
+						continue
+					filename = options[b"filename"].decode("utf-8", errors="replace")
+					if not filename:
+						raise ValueError("No file uploaded.")
+					ext = os.path.splitext(filename)[-1].lower()
+					if ext not in ['.csv', '.xlsx', '.json']:
+						raise ValueError("Unsupported file type. Only .csv, .xlsx, .json allowed.")
+					dest_path = os.path.join(UPLOAD_DIR, f"{dataset_id}{ext}")
+					tmp_path = f"{dest_path}.part"
+					f = open(tmp_path, "wb")
+					writing = True
+				elif kind == "data" and writing:
+					size += len(value)
+					if max_bytes is not None and size > max_bytes:
+						raise too_large
+					digest.update(value)
+					await run_in_threadpool(f.write, value)
+				elif kind == "end" and writing:
+					writing, done = False, True
+			events.clear()
+		if not done:
+			raise ValueError("No file uploaded." if filename is None else "Upload ended before the file did.")
+		f.close()
+		os.replace(tmp_path, dest_path)
+	finally:
+		if f is not None:
+			f.close()
+		if tmp_path is not None and os.path.exists(tmp_path):
+			os.remove(tmp_path)
+	with open(_meta_path(dataset_id), "w", encoding="utf-8") as meta:
+		json.dump({"filename": filename, "size": size, "sha256": digest.hexdigest()}, meta)
+	tracing.observe_size("bytes", size)
 	return dataset_id
 
-def load_dataframe(dataset_id: str) -> pd.DataFrame:
+def get_upload_meta(dataset_id: str) -> dict:
 	"""
-	Load dataset into pandas DataFrame by dataset_id.
-	Handles csv/xlsx/json.
+	Return {filename, size, sha256} recorded at upload time, or {} if unknown.
+	"""
+	try:
+		with open(_meta_path(dataset_id), encoding="utf-8") as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+# sha256 of files hashed on demand, keyed by (path, mtime_ns, size)
+_version_memo = {}
+
+def dataset_version(dataset_id: str) -> str:
+	"""
+	Content hash (sha256) of the uploaded file. Uses the hash recorded at
+	upload time when the file is unchanged, otherwise hashes it once per mtime.
+	"""
+	path, _ = _find_source(dataset_id)
+	if path is None:
+		raise FileNotFoundError(f"Dataset {dataset_id} not found.")
+	st = os.stat(path)
+	meta = get_upload_meta(dataset_id)
+	if meta.get("sha256") and meta.get("size") == st.st_size and os.stat(_meta_path(dataset_id)).st_mtime_ns >= st.st_mtime_ns:
+		return meta["sha256"]
+	key = (path, st.st_mtime_ns, st.st_size)
+	if key not in _version_memo:
+		digest = hashlib.sha256()
+		with open(path, "rb") as f:
+			for block in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+				digest.update(block)
+		_version_memo[key] = digest.hexdigest()
+	return _version_memo[key]
+
+def derived_version(base_version: str, params) -> str:
+	"""
+	Version hash of data derived from base_version by a deterministic step with params.
+	"""
+	payload = json.dumps(params, sort_keys=True, default=str)
+	return hashlib.sha256(f"{base_version}:{payload}".encode("utf-8")).hexdigest()
+
+def _find_source(dataset_id: str):
+	"""
+	Return (path, ext) of the uploaded file for dataset_id, or (None, None).
 	"""
-	# Try all supported extensions
 	for ext in ['.csv', '.xlsx', '.json']:
 		path = os.path.join(UPLOAD_DIR, f"{dataset_id}{ext}")
 		if os.path.exists(path):
+			return path, ext
+	return None, None
+
+def _columnar_path(dataset_id: str) -> str:
+	# Memory-mapped Arrow IPC copy of the parsed upload (see arrow_store.py)
+	return os.path.join(UPLOAD_DIR, f"{dataset_id}.arrow")
+
+def _parse_file(path: str, ext: str) -> pd.DataFrame:
+	if ext == '.csv':
+		# Encoding and delimiter sniffed once; large files are parsed in parallel (see ingest.py)
+		df = ingest.read_csv(path)
+	elif ext == '.xlsx':
+		df = pd.read_excel(path, engine='openpyxl')
+	elif ext == '.json':
+		df = pd.read_json(path)
+	# Optionally normalize column names
+	df.columns = [str(c).strip().lower() for c in df.columns]
+	return df
+
+def _write_columnar(df: pd.DataFrame, path: str) -> bool:
+	"""
+	Write df as Parquet atomically. Returns False if pyarrow is missing or
+	the frame cannot be represented (e.g. mixed-type object columns).
+	"""
+	if not HAS_PYARROW:
+		return False
+	tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+	try:
+		df.to_parquet(tmp_path, index=False, engine='pyarrow', row_group_size=PARQUET_ROW_GROUP_ROWS)
+		os.replace(tmp_path, path)
+		return True
+	except Exception:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+		return False
+
+def _is_fresh(path: str, derived: str) -> bool:
+	# A derived file (Arrow copy, rendered export) is valid if written after its source
+	return os.path.exists(derived) and os.stat(derived).st_mtime_ns >= os.stat(path).st_mtime_ns
+
+def _atomic_write(path: str, write):
+	# Keep the real extension last: pandas picks the Excel writer from it
+	root, ext = os.path.splitext(path)
+	tmp_path = f"{root}.{uuid.uuid4().hex}.tmp{ext}"
+	try:
+		write(tmp_path)
+		os.replace(tmp_path, path)
+	finally:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+
+def _project(df: pd.DataFrame, columns) -> pd.DataFrame:
+	missing = [c for c in columns if c not in df.columns]
+	if missing:
+		raise KeyError(f"Columns not found: {missing}")
+	return df[list(columns)]
+
+@tracing.traced("load")
+def load_dataframe(dataset_id: str, columns: list = None) -> pd.DataFrame:
+	"""
+	Load dataset into pandas DataFrame by dataset_id.
+	Handles csv/xlsx/json. The first load optimizes dtypes (see dtypes.py) and
+	converts the upload into an Arrow IPC copy with those dtypes preserved;
+	later loads memory-map that copy, restricted to `columns` when given, so
+	processes loading the same dataset share its pages. The original file is
+	kept for downloads.
+	Parsed frames are served from the shared dataset cache while the file's
+	mtime is unchanged; callers get a shallow copy and must not modify
+	values in place.
+	"""
+	path, ext = _find_source(dataset_id)
+	if path is None:
+		raise FileNotFoundError(f"Dataset {dataset_id} not found.")
+	columns = tuple(dict.fromkeys(columns)) if columns else None
+	columnar = _columnar_path(dataset_id)
+	store = columnar if _is_fresh(path, columnar) else path
+	mtime = os.stat(store).st_mtime_ns
+	full_key = (dataset_id, store, mtime, None)
+	df = dataset_cache.get(full_key)
+	if df is not None:
+		return _project(df, columns).copy(deep=False) if columns else df.copy(deep=False)
+	if columns and store == columnar:
+		key = (dataset_id, store, mtime, columns)
+		df = dataset_cache.get(key)
+		if df is None:
 			try:
-				if ext == '.csv':
-					try:
-						df = pd.read_csv(path, encoding='utf-8', engine='python')
-					except Exception:
-						df = pd.read_csv(path, encoding='latin1', engine='python')
-				elif ext == '.xlsx':
-					df = pd.read_excel(path, engine='openpyxl')
-				elif ext == '.json':
-					df = pd.read_json(path)
-				# Optionally normalize column names
-				df.columns = [str(c).strip().lower() for c in df.columns]
-				return df
+				df = arrow_store.read_frame(store, columns)
 			except Exception as e:
 				raise ValueError(f"Failed to load file: {e}")
-	raise FileNotFoundError(f"Dataset {dataset_id} not found.")
+			_project(df, columns)
+			dataset_cache.put(key, df)
+		return df.copy(deep=False)
+	try:
+		if store == columnar:
+			df = arrow_store.read_frame(store)
+		else:
+			df, report = dtypes.optimize(_parse_file(path, ext))
+			tracing.observe_size("rows", len(df))
+	except Exception as e:
+		raise ValueError(f"Failed to load file: {e}")
+	if store == path:
+		_atomic_write(_memory_path(dataset_id), lambda tmp: _write_report(tmp, report))
+	# Drop entries for older versions of this dataset before caching the new one
+	invalidate_cache(dataset_id)
+	if store == path and arrow_store.write(df, columnar):
+		full_key = (dataset_id, columnar, os.stat(columnar).st_mtime_ns, None)
+	dataset_cache.put(full_key, df)
+	return _project(df, columns).copy(deep=False) if columns else df.copy(deep=False)
+
+def dataset_columns(dataset_id: str) -> list:
+	"""
+	Column names of a dataset, read from the Arrow schema when the
+	columnar copy is fresh rather than loading the data.
+	"""
+	path, _ = _find_source(dataset_id)
+	if path is None:
+		raise FileNotFoundError(f"Dataset {dataset_id} not found.")
+	columnar = _columnar_path(dataset_id)
+	if HAS_PYARROW and _is_fresh(path, columnar):
+		return arrow_store.column_names(columnar)
+	if is_large(dataset_id):
+		return list(next(iter_chunks(dataset_id, chunksize=1)).columns)
+	return list(load_dataframe(dataset_id).columns)
 
-def save_dataframe(df: pd.DataFrame, dataset_id: str, format: str = "csv") -> str:
+def _write_report(path: str, report: dict):
+	with open(path, "w", encoding="utf-8") as f:
+		json.dump(report, f)
+
+def memory_report(dataset_id: str) -> dict:
+	"""
+	{before_bytes, after_bytes, columns} recorded when the upload was parsed
+	and its dtypes optimized, or {} if it has not been loaded yet.
+	"""
+	try:
+		with open(_memory_path(dataset_id), encoding="utf-8") as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+def is_large(dataset_id: str) -> bool:
+	"""
+	True if the uploaded file is big enough to need the chunked (out-of-core) path.
 	"""
-	Save DataFrame to disk in specified format (csv/xlsx).
-	Returns file path.
+	path, _ = _find_source(dataset_id)
+	if path is None:
+		raise FileNotFoundError(f"Dataset {dataset_id} not found.")
+	return os.path.getsize(path) > STREAMING_THRESHOLD_BYTES
+
+def iter_chunks(dataset_id: str, chunksize: int = None, columns: list = None):
+	"""
+	Yield the dataset as DataFrames of at most chunksize rows without
+	materializing it. Slices the mapped Arrow copy when present,
+	CSV with a chunked reader, and falls back to slicing a full load for
+	xlsx/json, which have no incremental parser.
+	"""
+	chunksize = chunksize or CHUNK_ROWS
+	path, ext = _find_source(dataset_id)
+	if path is None:
+		raise FileNotFoundError(f"Dataset {dataset_id} not found.")
+	columnar = _columnar_path(dataset_id)
+	if HAS_PYARROW and _is_fresh(path, columnar):
+		yield from arrow_store.iter_frames(columnar, chunksize, columns)
+	elif ext == '.csv':
+		reader = pd.read_csv(path, chunksize=chunksize, **ingest.sniff(path))
+		for chunk in reader:
+			chunk.columns = [str(c).strip().lower() for c in chunk.columns]
+			yield _project(chunk, columns) if columns else chunk
+	else:
+		df = load_dataframe(dataset_id, columns=columns)
+		for start in range(0, len(df), chunksize):
+			yield df.iloc[start:start + chunksize]
+
+def _row_index_path(dataset_id: str) -> str:
+	return os.path.join(UPLOAD_DIR, f"{dataset_id}.rowindex.npy")
+
+def _build_csv_row_index(path: str, block_size: int = 8 * UPLOAD_CHUNK_SIZE) -> np.ndarray:
+	"""
+	[row count, offset of row 0, offset of row ROW_INDEX_STRIDE, ...] for a CSV
+	file, in one vectorized pass over its bytes. Newlines inside quoted fields
+	do not end a row.
+	"""
+	offsets = []
+	rows = -1  # the header line ends first
+	quotes = 0
+	last = b"\n"
+	with open(path, "rb") as f:
+		position = 0
+		for block in iter(lambda: f.read(block_size), b""):
+			data = np.frombuffer(block, dtype=np.uint8)
+			in_quotes = (quotes + np.cumsum(data == ord('"'))) % 2 == 1
+			ends = np.flatnonzero((data == ord("\n")) & ~in_quotes)
+			numbers = rows + 1 + np.arange(len(ends))
+			starts = position + ends + 1
+			offsets.extend(starts[numbers % ROW_INDEX_STRIDE == 0].tolist())
+			rows += len(ends)
+			quotes += int((data == ord('"')).sum())
+			position += len(block)
+			last = block[-1:]
+	if last != b"\n":
+		rows += 1  # final row without a trailing newline
+	offsets = [o for o in offsets if o < position]
+	return np.array([max(rows, 0)] + offsets, dtype=np.int64)
+
+def _csv_row_index(dataset_id: str, path: str) -> np.ndarray:
+	index_path = _row_index_path(dataset_id)
+	if _is_fresh(path, index_path):
+		return np.load(index_path)
+	index = _build_csv_row_index(path)
+	_atomic_write(index_path, lambda tmp: np.save(tmp, index))
+	return index
+
+def row_count(dataset_id: str) -> int:
+	"""
+	Number of rows, from the Arrow copy, the CSV row index or a full load.
+	"""
+	path, ext = _find_source(dataset_id)
+	if path is None:
+		raise FileNotFoundError(f"Dataset {dataset_id} not found.")
+	columnar = _columnar_path(dataset_id)
+	if HAS_PYARROW and _is_fresh(path, columnar):
+		return arrow_store.num_rows(columnar)
+	if ext == '.csv':
+		return int(_csv_row_index(dataset_id, path)[0])
+	return len(load_dataframe(dataset_id))
+
+def read_rows(dataset_id: str, start: int, stop: int) -> pd.DataFrame:
+	"""
+	Rows [start, stop) of a dataset without materializing the whole of it:
+	sliced from the cached frame if loaded, else from the mapped Arrow copy,
+	else read from the CSV starting at the nearest indexed row offset. The result keeps the dataset's row positions as its index.
+	"""
+	path, ext = _find_source(dataset_id)
+	if path is None:
+		raise FileNotFoundError(f"Dataset {dataset_id} not found.")
+	columnar = _columnar_path(dataset_id)
+	store = columnar if _is_fresh(path, columnar) else path
+	cached = dataset_cache.get((dataset_id, store, os.stat(store).st_mtime_ns, None))
+	if cached is not None:
+		return cached.iloc[start:stop]
+	if HAS_PYARROW and store == columnar:
+		return arrow_store.read_slice(columnar, start, stop)
+	if ext == '.csv':
+		index = _csv_row_index(dataset_id, path)
+		options = ingest.sniff(path)
+		columns = [str(c).strip().lower() for c in pd.read_csv(path, nrows=0, **options).columns]
+		block = start // ROW_INDEX_STRIDE
+		if stop <= start or block + 1 >= len(index):
+			return pd.DataFrame(columns=columns)
+		with open(path, "rb") as f:
+			f.seek(int(index[block + 1]))
+			df = pd.read_csv(
+				f, header=None, names=columns, **options,
+				skiprows=start - block * ROW_INDEX_STRIDE, nrows=stop - start,
+			)
+		df.index = pd.RangeIndex(start, start + len(df))
+		return df
+	return load_dataframe(dataset_id).iloc[start:stop]
+
+def cube_path(dataset_id: str) -> str:
+	"""
+	Path of the persisted aggregate cube of dataset_id (see cube.py).
+	"""
+	return os.path.join(UPLOAD_DIR, f"{dataset_id}.cube.json")
+
+def cleaned_path(dataset_id: str, format: str) -> str:
+	"""
+	Path of the cleaned export of dataset_id in the given format.
+	"""
+	return os.path.join(UPLOAD_DIR, f"cleaned_{dataset_id}.{format}")
+
+def cleaned_source(dataset_id: str):
+	"""
+	Path of the canonical cleaned copy (Parquet, else CSV), or None if the dataset was never cleaned.
+	"""
+	for fmt in ["parquet", "csv"]:
+		path = cleaned_path(dataset_id, fmt)
+		if os.path.exists(path):
+			return path
+	return None
+
+def load_cleaned(dataset_id: str) -> pd.DataFrame:
+	"""
+	Load the cleaned dataset from its canonical copy.
+	"""
+	source = cleaned_source(dataset_id)
+	if source is None:
+		raise FileNotFoundError(f"Cleaned dataset {dataset_id} not found.")
+	if source.endswith(".parquet"):
+		return pd.read_parquet(source, engine='pyarrow')
+	return pd.read_csv(source)
+
+def reset_cleaned(dataset_id: str):
+	"""
+	Remove the cleaned copy and every export rendered from it, before a re-clean.
+	The cached upload stays valid: it is keyed by the upload's own mtime.
+	"""
+	for fmt in CLEANED_FORMATS:
+		path = cleaned_path(dataset_id, fmt)
+		if os.path.exists(path):
+			os.remove(path)
+
+@tracing.traced("export")
+def save_cleaned(df: pd.DataFrame, dataset_id: str) -> str:
+	"""
+	Persist the cleaned dataset once, as Parquet (CSV if Parquet cannot hold it).
+	Other formats are rendered on first download by cleaned_export.
 	"""
 	if not os.path.exists(UPLOAD_DIR):
 		os.makedirs(UPLOAD_DIR)
+	reset_cleaned(dataset_id)
+	path = cleaned_path(dataset_id, "parquet")
+	if not _write_columnar(df, path):
+		path = cleaned_path(dataset_id, "csv")
+		_atomic_write(path, lambda tmp: dtypes.dates_as_text(df).to_csv(tmp, index=False))
+	return path
+
+@tracing.traced("export")
+def cleaned_export(dataset_id: str, format: str) -> str:
+	"""
+	Path of the cleaned dataset in csv/xlsx/json/parquet, rendered from the
+	canonical copy on first request and reused while that copy is unchanged.
+	"""
+	if format not in CLEANED_FORMATS:
+		raise ValueError("Unsupported format. Use csv, xlsx, json, or parquet.")
+	source = cleaned_source(dataset_id)
+	if source is None:
+		raise FileNotFoundError(f"Cleaned dataset {dataset_id} not found.")
+	path = cleaned_path(dataset_id, format)
+	if path == source or _is_fresh(source, path):
+		return path
+	df = load_cleaned(dataset_id)
+	if format != "parquet":
+		# Dates as they were uploaded, not as timestamps
+		df = dtypes.dates_as_text(df)
 	if format == "csv":
-		path = os.path.join(UPLOAD_DIR, f"cleaned_{dataset_id}.csv")
-		df.to_csv(path, index=False)
+		_atomic_write(path, lambda tmp: df.to_csv(tmp, index=False))
 	elif format == "xlsx":
-		path = os.path.join(UPLOAD_DIR, f"cleaned_{dataset_id}.xlsx")
-		df.to_excel(path, index=False, engine='openpyxl')
+		_atomic_write(path, lambda tmp: df.to_excel(tmp, index=False, engine='openpyxl'))
 	elif format == "json":
-		path = os.path.join(UPLOAD_DIR, f"cleaned_{dataset_id}.json")
-		df.to_json(path, orient='records')
-	else:
-		raise ValueError("Unsupported format. Use csv, xlsx, or json.")
+		_atomic_write(path, lambda tmp: df.to_json(tmp, orient='records', date_format='iso'))
+	elif not _write_columnar(df, path):
+		raise ValueError("Parquet output requires pyarrow and uniformly typed columns.")
 	return path
 
+def file_etag(path: str, variant: str = "") -> str:
+	"""
+	Strong ETag for a file (and representation), from its size and mtime.
+	"""
+	st = os.stat(path)
+	return f'"{st.st_mtime_ns:x}-{st.st_size:x}{"-" + variant if variant else ""}"'
+
+def invalidate_cache(dataset_id: str) -> int:
+	"""
+	Remove all cached frames for dataset_id. Returns number of entries dropped.
+	"""
+	return dataset_cache.invalidate(lambda key: key[0] == dataset_id)
+
+def cache_stats() -> dict:
+	"""
+	Hit/miss/eviction counters and memory usage of the dataset cache.
+	"""
+	return dataset_cache.stats()
+
 def delete_dataset(dataset_id: str):
 	"""
 	Delete dataset files for cleanup (optional).
 	"""
+	invalidate_cache(dataset_id)
 	removed = False
 	for prefix in ["", "cleaned_"]:
-		for ext in ['.csv', '.xlsx', '.json']:
+		for ext in ['.csv', '.xlsx', '.json', '.parquet', '.arrow']:
 			path = os.path.join(UPLOAD_DIR, f"{prefix}{dataset_id}{ext}")
 			if os.path.exists(path):
 				os.remove(path)
 				removed = True
+	for path in [_meta_path(dataset_id), _memory_path(dataset_id), _row_index_path(dataset_id), cube_path(dataset_id)]:
+		if os.path.exists(path):
+			os.remove(path)
 	return removed
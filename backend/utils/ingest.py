@@ -0,0 +1,218 @@
+# ingest.py
+"""
+CSV parsing for uploads. Encoding and delimiter are detected once from a
+sample of the file. Files of at least PARALLEL_INGEST_MIN_BYTES are split into
+byte ranges that each start on a row boundary (a newline outside quoted
+fields), the ranges are parsed concurrently in worker processes, and the
+parts are concatenated under one schema: a column read as text in any part is
+re-read as text in the others, so no column mixes numbers and strings. A
+range that does not decode with the sniffed encoding is re-read as latin1 on
+its own instead of re-parsing the whole file.
+
+Only the server process keeps a parsing pool. Loads that run in the
+executor's worker processes parse serially: those workers already occupy
+the CPUs, and a pool per worker would start about CPU_WORKERS * INGEST_WORKERS
+processes.
+"""
+import codecs
+import csv
+import functools
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+# Worker processes for parallel parsing; 1 disables it
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+# Files smaller than this (bytes) are parsed in one pass: process start-up and
+# moving the parts back outweigh the parallel speed-up
+PARALLEL_INGEST_MIN_BYTES = int(os.getenv("PARALLEL_INGEST_MIN_BYTES", 64 * 1024 * 1024))
+# Bytes read to detect the encoding; the delimiter is sniffed from the whole
+# lines in the first DIALECT_SAMPLE_CHARS of it (csv.Sniffer's regexes are slow on long text)
+SAMPLE_BYTES = 1024 * 1024
+DIALECT_SAMPLE_CHARS = 64 * 1024
+DELIMITERS = ",;\t|"
+# Bytes read at a time when moving a range boundary to the next row start
+BOUNDARY_BLOCK = 64 * 1024
+
+_QUOTE = ord('"')
+_NEWLINE = ord("\n")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def sniff_encoding(sample: bytes) -> str:
+	"""
+	"utf-8" if the sample decodes as UTF-8 (a character cut off at its end is fine), else "latin1".
+	"""
+	try:
+		codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+		return 'utf-8'
+	except UnicodeDecodeError:
+		return 'latin1'
+
+def sniff_delimiter(text: str) -> str:
+	"""
+	Field delimiter of CSV text, one of DELIMITERS; "," when the sample is inconclusive.
+	"""
+	# Only whole lines: a row cut off at the end of the sample skews the field counts
+	lines = text[:DIALECT_SAMPLE_CHARS].split("\n")
+	text = "\n".join(lines[:-1] if len(lines) > 1 else lines)
+	try:
+		delimiter = csv.Sniffer().sniff(text, delimiters=DELIMITERS).delimiter
+	except csv.Error:
+		return ","
+	# The header must contain it too, otherwise the sniffer keyed on data values
+	return delimiter if delimiter in lines[0] else ","
+
+def sniff(path: str) -> dict:
+	"""
+	read_csv options ({"encoding", "sep"}) for a CSV file, from its first SAMPLE_BYTES.
+	"""
+	with open(path, "rb") as f:
+		sample = f.read(SAMPLE_BYTES)
+	encoding = sniff_encoding(sample)
+	return {"encoding": encoding, "sep": sniff_delimiter(sample.decode(encoding, errors="ignore"))}
+
+def _row_start(f, position: int, in_quotes: bool):
+	"""
+	Offset of the first row starting at or after `position`, given whether
+	`position` is inside a quoted field. None if no row starts there.
+	"""
+	f.seek(position)
+	while True:
+		block = f.read(BOUNDARY_BLOCK)
+		if not block:
+			return None
+		data = np.frombuffer(block, dtype=np.uint8)
+		quoted = (int(in_quotes) + np.cumsum(data == _QUOTE)) % 2 == 1
+		ends = np.flatnonzero((data == _NEWLINE) & ~quoted)
+		if len(ends):
+			return position + int(ends[0]) + 1
+		in_quotes = bool(quoted[-1])
+		position += len(block)
+
+def _count_quotes(path: str, start: int, stop: int) -> int:
+	count = 0
+	with open(path, "rb") as f:
+		f.seek(start)
+		remaining = stop - start
+		while remaining > 0:
+			block = f.read(min(remaining, 8 * 1024 * 1024))
+			if not block:
+				break
+			count += block.count(b'"')
+			remaining -= len(block)
+	return count
+
+def split_ranges(path: str, parts: int, pool=None) -> list:
+	"""
+	About `parts` (start, stop) byte ranges covering the data rows of a CSV
+	file (the header line excluded), each starting on a row boundary. Quote
+	counts per equal-sized slice, taken in `pool` when given, tell whether a
+	slice starts inside a quoted field; the boundary then moves to the first
+	newline outside quotes.
+	"""
+	size = os.path.getsize(path)
+	with open(path, "rb") as f:
+		first = _row_start(f, 0, False)
+		if first is None or first >= size:
+			return []
+		step = max((size - first) // parts, 1)
+		cuts = list(range(first, size, step))[:parts] + [size]
+		slices = list(zip(cuts[:-1], cuts[1:]))
+		args = ([path] * len(slices), [s for s, _ in slices], [e for _, e in slices])
+		counts = list(pool.map(_count_quotes, *args)) if pool is not None else list(map(_count_quotes, *args))
+		# A slice starts inside a quoted field when an odd number of quotes precede it
+		quotes = _count_quotes(path, 0, first)
+		bounds = [first]
+		for (start, _), count in zip(slices, counts):
+			if start > first:
+				boundary = _row_start(f, start, quotes % 2 == 1)
+				if boundary is not None and bounds[-1] < boundary < size:
+					bounds.append(boundary)
+			quotes += count
+	bounds.append(size)
+	return list(zip(bounds[:-1], bounds[1:]))
+
+def _parse_range(path: str, names: list, options: dict, text_columns: tuple, bounds: tuple) -> pd.DataFrame:
+	start, stop = bounds
+	with open(path, "rb") as f:
+		f.seek(start)
+		data = f.read(stop - start)
+	dtype = {c: str for c in text_columns} or None
+	try:
+		return pd.read_csv(io.BytesIO(data), header=None, names=names, dtype=dtype, **options)
+	except UnicodeDecodeError:
+		# Bytes past the sniffed sample are not UTF-8: only this range is read again
+		return pd.read_csv(io.BytesIO(data), header=None, names=names, dtype=dtype, **{**options, "encoding": "latin1"})
+
+def _get_pool():
+	global _pool
+	with _pool_lock:
+		if _pool is None:
+			# Spawned, not forked: loads run in threaded servers, where a forked
+			# child can inherit a held lock
+			_pool = ProcessPoolExecutor(max_workers=INGEST_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+		return _pool
+
+def _parse_parts(path: str, ranges: list, names: list, options: dict) -> list:
+	pool = _get_pool()
+	parse = functools.partial(_parse_range, path, names, options, ())
+	parts = list(pool.map(parse, ranges))
+	# A column that is text in some parts but numeric (or empty) in others is text
+	text_columns = tuple(c for c in names if len({part[c].dtype == object for part in parts}) > 1)
+	if text_columns:
+		redo = [i for i, part in enumerate(parts) if any(part[c].dtype != object for c in text_columns)]
+		parse = functools.partial(_parse_range, path, names, options, text_columns)
+		for i, part in zip(redo, pool.map(parse, [ranges[i] for i in redo])):
+			parts[i] = part
+	return parts
+
+def _read_parallel(path: str, options: dict) -> pd.DataFrame:
+	names = list(pd.read_csv(path, nrows=0, **options).columns)
+	ranges = split_ranges(path, INGEST_WORKERS, _get_pool())
+	if len(ranges) < 2:
+		return _read_serial(path, options)
+	return pd.concat(_parse_parts(path, ranges, names, options), ignore_index=True)
+
+def _read_serial(path: str, options: dict) -> pd.DataFrame:
+	try:
+		return pd.read_csv(path, **options)
+	except UnicodeDecodeError:
+		return pd.read_csv(path, **{**options, "encoding": "latin1"})
+	except pd.errors.ParserError:
+		# Malformed rows: the python engine is slower but more forgiving
+		return pd.read_csv(path, engine="python", **options)
+
+def read_csv(path: str, options: dict = None) -> pd.DataFrame:
+	"""
+	Parse a CSV file with the given read_csv options (sniffed when None), in
+	INGEST_WORKERS processes when it is at least PARALLEL_INGEST_MIN_BYTES and
+	this is not itself a worker process.
+	"""
+	options = options or sniff(path)
+	parallel = INGEST_WORKERS > 1 and multiprocessing.parent_process() is None
+	if parallel and os.path.getsize(path) >= PARALLEL_INGEST_MIN_BYTES:
+		try:
+			return _read_parallel(path, options)
+		except pd.errors.ParserError:
+			# Malformed rows are left to the serial path's python-engine fallback
+			pass
+		except BrokenProcessPool:
+			# A worker died (e.g. OOM); start a fresh pool next time
+			shutdown()
+			raise
+	return _read_serial(path, options)
+
+def shutdown(wait: bool = False):
+	global _pool
+	with _pool_lock:
+		if _pool is not None:
+			_pool.shutdown(wait=wait, cancel_futures=True)
+		_pool = None
@@ -0,0 +1,181 @@
+# jobs.py
+"""
+Asynchronous jobs for long-running clean/stats/export work.
+Jobs are persisted as JSON files under jobs/ so status and results survive a
+restart; each job runs as a sequence of stages on the executor and records
+per-stage progress and timings.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from . import executor, tasks
+
+JOBS_DIR = os.path.join(os.path.dirname(__file__), '..', 'jobs')
+TERMINAL_STATES = ("succeeded", "failed", "cancelled")
+
+# Running asyncio tasks by job id, for cancellation
+_running = {}
+
+def _job_path(job_id: str) -> str:
+	return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+def _result_path(job_id: str) -> str:
+	return os.path.join(JOBS_DIR, f"{job_id}.result.json")
+
+def _write_json(path: str, data: dict):
+	if not os.path.exists(JOBS_DIR):
+		os.makedirs(JOBS_DIR)
+	tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+	with open(tmp_path, "w", encoding="utf-8") as f:
+		json.dump(data, f, default=str)
+	os.replace(tmp_path, path)
+
+def get(job_id: str):
+	"""
+	Job record (status, progress, stages, timings) or None if unknown.
+	"""
+	try:
+		with open(_job_path(job_id), encoding="utf-8") as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
+
+def get_result(job_id: str):
+	try:
+		with open(_result_path(job_id), encoding="utf-8") as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
+
+def _save(job: dict):
+	job["updated_at"] = time.time()
+	_write_json(_job_path(job["id"]), job)
+
+def _stages(kind: str, dataset_id: str, params: dict) -> list:
+	"""
+	(stage name, task function, args) for each stage of a job kind.
+	"""
+	if kind == "clean":
+		strategy = params.get("strategy") or {}
+		stages = [("clean", tasks.clean_stage, (dataset_id, strategy))]
+		# Exports are rendered on download; pre-render only formats asked for
+		if params.get("formats"):
+			stages.append(("export", tasks.export_stage, (dataset_id, params["formats"])))
+		stages.append(("stats", tasks.cleaned_stats_stage, (dataset_id, strategy)))
+		return stages
+	if kind == "stats":
+		return [("stats", tasks.dataset_stats, (dataset_id,))]
+	if kind == "export":
+		return [("export", tasks.export_stage, (dataset_id, params.get("formats") or ["csv", "xlsx", "json"]))]
+	raise ValueError(f"Unknown job kind: {kind}")
+
+JOB_KINDS = ("clean", "stats", "export")
+
+def submit(kind: str, dataset_id: str, params: dict) -> dict:
+	"""
+	Create a job and start it on the running event loop. Returns the job record.
+	"""
+	stages = _stages(kind, dataset_id, params)
+	job = {
+		"id": str(uuid.uuid4()),
+		"kind": kind,
+		"dataset_id": dataset_id,
+		"params": params,
+		"status": "queued",
+		"progress": 0.0,
+		"stages": [{"name": name, "status": "pending", "seconds": None} for name, _, _ in stages],
+		"error": None,
+		"created_at": time.time(),
+	}
+	_save(job)
+	_running[job["id"]] = asyncio.get_running_loop().create_task(_run(job, stages))
+	return job
+
+async def _run(job: dict, stages: list):
+	result = {}
+	started = time.perf_counter()
+	try:
+		job["status"] = "running"
+		_save(job)
+		for i, (name, fn, args) in enumerate(stages):
+			stage = job["stages"][i]
+			stage["status"] = "running"
+			stage["started_at"] = time.time()
+			_save(job)
+			t0 = time.perf_counter()
+			output = await executor.run_cpu(f"job_{name}", fn, *args)
+			stage["seconds"] = time.perf_counter() - t0
+			stage["status"] = "done"
+			if isinstance(output, dict):
+				result.update(output)
+			else:
+				result[name] = output
+			job["progress"] = (i + 1) / len(stages)
+			_save(job)
+		_write_json(_result_path(job["id"]), result)
+		job["status"] = "succeeded"
+	except asyncio.CancelledError:
+		# The current stage may finish in its worker; its output is discarded
+		job["status"] = "cancelled"
+		for stage in job["stages"]:
+			if stage["status"] in ("pending", "running"):
+				stage["status"] = "cancelled"
+	except Exception as e:
+		job["status"] = "failed"
+		job["error"] = str(e)
+		for stage in job["stages"]:
+			if stage["status"] == "running":
+				stage["status"] = "failed"
+	finally:
+		job["seconds"] = time.perf_counter() - started
+		_save(job)
+		_running.pop(job["id"], None)
+
+def cancel(job_id: str):
+	"""
+	Cancel a queued/running job. Returns the updated record, or None if unknown.
+	"""
+	job = get(job_id)
+	if job is None:
+		return None
+	task = _running.get(job_id)
+	if task is not None and not task.done():
+		task.cancel()
+		job["status"] = "cancelling"
+	elif job["status"] not in TERMINAL_STATES:
+		# No live task (e.g. lost in a restart): mark it directly
+		job["status"] = "cancelled"
+		_save(job)
+	return job
+
+async def wait_for_change(job_id: str, since: float, timeout: float = 15.0, interval: float = 0.25):
+	"""
+	Poll the store until the job record is updated after `since` or timeout passes.
+	"""
+	deadline = time.monotonic() + timeout
+	while True:
+		job = get(job_id)
+		if job is None or job.get("updated_at", 0) > since or time.monotonic() >= deadline:
+			return job
+		await asyncio.sleep(interval)
+
+def recover():
+	"""
+	On startup, mark jobs left queued/running by a previous process as failed.
+	"""
+	if not os.path.exists(JOBS_DIR):
+		return 0
+	recovered = 0
+	for name in os.listdir(JOBS_DIR):
+		if not name.endswith(".json") or name.endswith(".result.json"):
+			continue
+		job = get(name[:-len(".json")])
+		if job and job["status"] not in TERMINAL_STATES and job["id"] not in _running:
+			job["status"] = "failed"
+			job["error"] = "Interrupted by server restart; resubmit the job."
+			_save(job)
+			recovered += 1
+	return recovered
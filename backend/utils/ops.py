@@ -0,0 +1,332 @@
+# ops.py
+"""
+Validated execution of AI-suggested operations: transform ops lists, chart
+specs and compute specs. Only whitelisted operations with checked parameters
+are run (no eval/query strings), so model output cannot execute arbitrary code.
+Consecutive row filters are combined into one boolean mask and consecutive
+fills into one fillna call, so an ops list is applied as a single vectorized
+plan over the full dataset.
+"""
+import json
+import operator
+import os
+
+import numpy as np
+import pandas as pd
+
+from . import serialize
+from .cache import LRUCache
+
+# Memory budget for transformed frames (128 MB), override with OPS_CACHE_MAX_BYTES
+OPS_CACHE_MAX_BYTES = int(os.getenv("OPS_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+MAX_OPS = 50
+MAX_TOP_N = 1000
+CHART_TYPES = ["bar", "line", "pie", "scatter", "histogram"]
+CHART_AGGS = ["sum", "mean", "count", "min", "max", "none"]
+COMPUTE_AGGS = ["sum", "mean", "median", "min", "max", "count", "nunique"]
+# Aggregations that only apply to numbers; min/max also order dates
+NUMERIC_AGGS = ["sum", "mean", "median"]
+# Chart types that aggregate y per x
+GROUPED_CHARTS = ["bar", "line", "histogram"]
+FILL_METHODS = ["mean", "median", "mode", "zero", "value", "ffill", "bfill"]
+COMPARISONS = {
+	"==": operator.eq, "!=": operator.ne, ">": operator.gt,
+	">=": operator.ge, "<": operator.lt, "<=": operator.le,
+}
+DATE_PARTS = ["year", "month", "day", "weekday", "quarter"]
+
+# Row-filtering ops, fused into one mask per run
+MASK_OPS = {"filter", "dropna", "drop_outliers"}
+FILL_OPS = {"fillna"}
+
+frame_cache = LRUCache(OPS_CACHE_MAX_BYTES)
+
+class OpValidationError(ValueError):
+	"""
+	Raised when an op, chart spec or compute spec is malformed or refers to unknown columns.
+	"""
+
+def require_column(col, columns, field="col"):
+	if not isinstance(col, str) or col not in columns:
+		raise OpValidationError(f"Unknown column for '{field}': {col!r}")
+
+def _validate_filter(spec: dict, columns):
+	require_column(spec.get("col"), columns)
+	cmp = spec.get("cmp", "==")
+	if cmp not in COMPARISONS and cmp not in ("in", "contains"):
+		raise OpValidationError(f"Unsupported comparison: {cmp!r}")
+	if spec.get("part") is not None and spec["part"] not in DATE_PARTS:
+		raise OpValidationError(f"Unsupported date part: {spec['part']!r}")
+	if "value" not in spec:
+		raise OpValidationError("filter needs a 'value'.")
+	if cmp == "in" and not isinstance(spec["value"], list):
+		raise OpValidationError("'in' filter needs a list value.")
+
+def validate_ops(ops, columns) -> list:
+	"""
+	Check an ops list against the dataset columns. Returns the ops; raises OpValidationError.
+	"""
+	if not isinstance(ops, list) or len(ops) > MAX_OPS:
+		raise OpValidationError(f"ops must be a list of at most {MAX_OPS} operations.")
+	columns = list(columns)
+	for spec in ops:
+		if not isinstance(spec, dict):
+			raise OpValidationError("Each op must be an object.")
+		op = spec.get("op")
+		if op == "filter":
+			_validate_filter(spec, columns)
+		elif op == "fillna":
+			require_column(spec.get("col"), columns)
+			if spec.get("method", "value") not in FILL_METHODS:
+				raise OpValidationError(f"Unsupported fillna method: {spec.get('method')!r}")
+			if spec.get("method", "value") == "value" and "value" not in spec:
+				raise OpValidationError("fillna with method 'value' needs a 'value'.")
+		elif op == "drop_outliers":
+			require_column(spec.get("col"), columns)
+			if spec.get("method", "iqr") not in ("iqr", "zscore"):
+				raise OpValidationError(f"Unsupported outlier method: {spec.get('method')!r}")
+			if not isinstance(spec.get("threshold", 1.5), (int, float)) or spec.get("threshold", 1.5) <= 0:
+				raise OpValidationError("threshold must be a positive number.")
+		elif op == "dropna":
+			for col in spec.get("cols") or [spec.get("col")]:
+				require_column(col, columns, "cols")
+		elif op == "drop_columns":
+			cols = spec.get("cols")
+			if not isinstance(cols, list):
+				raise OpValidationError("drop_columns needs a 'cols' list.")
+			for col in cols:
+				require_column(col, columns, "cols")
+			columns = [c for c in columns if c not in cols]
+		elif op == "drop_duplicates":
+			for col in spec.get("cols") or []:
+				require_column(col, columns, "cols")
+		else:
+			raise OpValidationError(f"Unsupported op: {op!r}")
+	return ops
+
+def validate_chart_spec(spec, columns, dtypes=None) -> dict:
+	"""
+	Check a chart spec for prepare_chart_data. Returns the spec; raises OpValidationError.
+	With dtypes ({column: dtype}), y must also be numeric when it is aggregated.
+	"""
+	if not isinstance(spec, dict):
+		raise OpValidationError("chart spec must be an object.")
+	if spec.get("type", "bar") not in CHART_TYPES:
+		raise OpValidationError(f"Unsupported chart type: {spec.get('type')!r}")
+	if spec.get("agg", "sum") not in CHART_AGGS:
+		raise OpValidationError(f"Unsupported aggregation: {spec.get('agg')!r}")
+	if not spec.get("x") and not spec.get("y"):
+		raise OpValidationError("chart spec needs 'x' or 'y'.")
+	for field in ("x", "y"):
+		if spec.get(field):
+			require_column(spec[field], columns, field)
+	agg = spec.get("agg", "sum")
+	grouped = spec.get("type", "bar") in GROUPED_CHARTS and spec.get("x") and spec.get("y")
+	if dtypes is not None and grouped and agg not in ("count", "none") and not pd.api.types.is_numeric_dtype(dtypes[spec["y"]]):
+		raise OpValidationError(f"Cannot plot the {agg} of non-numeric column {spec['y']!r}.")
+	top_n = spec.get("top_n")
+	if top_n is not None and (not isinstance(top_n, int) or not 0 < top_n <= MAX_TOP_N):
+		raise OpValidationError(f"top_n must be an integer from 1 to {MAX_TOP_N}.")
+	return spec
+
+def validate_compute(spec, columns, dtypes=None) -> dict:
+	"""
+	Check a compute spec {agg, col, filters, group_by, top_n}. Returns it; raises OpValidationError.
+	With dtypes ({column: dtype}), col must also support agg.
+	"""
+	if not isinstance(spec, dict):
+		raise OpValidationError("compute spec must be an object.")
+	if spec.get("agg") not in COMPUTE_AGGS:
+		raise OpValidationError(f"Unsupported aggregation: {spec.get('agg')!r}")
+	if spec.get("col") is not None or spec["agg"] != "count":
+		require_column(spec.get("col"), columns)
+	if dtypes is not None and spec.get("col") is not None:
+		dtype = dtypes[spec["col"]]
+		numeric = pd.api.types.is_numeric_dtype(dtype)
+		if spec["agg"] in NUMERIC_AGGS and not numeric or spec["agg"] in ("min", "max") and not (numeric or pd.api.types.is_datetime64_any_dtype(dtype)):
+			raise OpValidationError(f"Cannot compute the {spec['agg']} of non-numeric column {spec['col']!r}.")
+	if spec.get("group_by") is not None:
+		require_column(spec["group_by"], columns, "group_by")
+	filters = spec.get("filters") or []
+	if not isinstance(filters, list):
+		raise OpValidationError("filters must be a list.")
+	for f in filters:
+		if not isinstance(f, dict):
+			raise OpValidationError("Each filter must be an object.")
+		_validate_filter(f, columns)
+	top_n = spec.get("top_n", 10)
+	if not isinstance(top_n, int) or not 0 < top_n <= MAX_TOP_N:
+		raise OpValidationError(f"top_n must be an integer from 1 to {MAX_TOP_N}.")
+	return spec
+
+def _filter_mask(df: pd.DataFrame, spec: dict) -> pd.Series:
+	s = df[spec["col"]]
+	part = spec.get("part")
+	if part:
+		dates = s if pd.api.types.is_datetime64_any_dtype(s) else pd.to_datetime(s, errors="coerce")
+		s = getattr(dates.dt, part)
+	value = spec["value"]
+	cmp = spec.get("cmp", "==")
+	if cmp == "in":
+		return s.isin(value)
+	if cmp == "contains":
+		return s.astype(str).str.contains(str(value), case=False, regex=False, na=False)
+	if pd.api.types.is_numeric_dtype(s) and isinstance(value, str):
+		value = pd.to_numeric(value, errors="coerce")
+	elif pd.api.types.is_datetime64_any_dtype(s) and isinstance(value, str):
+		value = pd.Timestamp(value)
+	try:
+		return COMPARISONS[cmp](s, value)
+	except TypeError:
+		# Mixed types: compare as strings rather than failing the whole plan
+		return COMPARISONS[cmp](s.astype(str), str(value))
+
+def row_mask(df: pd.DataFrame, spec: dict) -> pd.Series:
+	"""
+	Boolean keep-mask for a validated filter, dropna or drop_outliers op.
+	"""
+	op = spec["op"]
+	if op == "filter":
+		return _filter_mask(df, spec)
+	if op == "dropna":
+		return df[spec.get("cols") or [spec["col"]]].notna().all(axis=1)
+	# drop_outliers keeps missing values; only measured outliers are dropped
+	s = pd.to_numeric(df[spec["col"]], errors="coerce")
+	threshold = spec.get("threshold", 1.5 if spec.get("method", "iqr") == "iqr" else 3.0)
+	if spec.get("method", "iqr") == "iqr":
+		q1, q3 = s.quantile([0.25, 0.75])
+		spread = q3 - q1
+		keep = s.between(q1 - threshold * spread, q3 + threshold * spread)
+	else:
+		std = s.std()
+		keep = ((s - s.mean()).abs() <= threshold * std) if std and std == std else pd.Series(True, index=s.index)
+	return keep | s.isna()
+
+def fill_value(s: pd.Series, spec: dict):
+	"""
+	Fill value for a validated fillna op (None when there is nothing to fill with).
+	"""
+	method = spec.get("method", "value")
+	if method == "value":
+		return spec["value"]
+	if method == "zero":
+		return 0
+	if method == "mode":
+		mode = s.mode()
+		return mode.iloc[0] if not mode.empty else None
+	return getattr(pd.to_numeric(s, errors="coerce"), method)()
+
+def fill_frame(df: pd.DataFrame, values: dict) -> pd.DataFrame:
+	"""
+	df.fillna(values), first adding fill values that are not yet categories of their category columns.
+	"""
+	extended = {
+		col: df[col].cat.add_categories([value]) for col, value in values.items()
+		if isinstance(df[col].dtype, pd.CategoricalDtype) and value not in df[col].cat.categories
+	}
+	if extended:
+		df = df.assign(**extended)
+	return df.fillna(values)
+
+def _fuses(run: list, spec: dict) -> bool:
+	"""
+	Whether spec can join run, i.e. evaluating it against the frame from before
+	the run gives the same result as applying it after the run.
+	"""
+	op = spec["op"]
+	if op in MASK_OPS and run[0]["op"] in MASK_OPS:
+		# Outlier bounds are measured on the rows that are left
+		return op != "drop_outliers"
+	if op in FILL_OPS and run[0]["op"] in FILL_OPS:
+		# Fills of another column are independent; ffill/bfill follow the order of the ops
+		directional = ("ffill", "bfill")
+		return spec.get("method") not in directional and all(
+			s.get("method") not in directional and s["col"] != spec["col"] for s in run
+		)
+	return False
+
+def apply_ops(df: pd.DataFrame, ops: list) -> pd.DataFrame:
+	"""
+	Apply a validated ops list. Consecutive row filters become one mask and
+	consecutive value fills one fillna, as long as no op in a run depends on
+	the output of an earlier one (see _fuses).
+	"""
+	i = 0
+	while i < len(ops):
+		kind = ops[i]["op"]
+		run = [ops[i]]
+		while i + len(run) < len(ops) and _fuses(run, ops[i + len(run)]):
+			run.append(ops[i + len(run)])
+		i += len(run)
+		if kind in MASK_OPS:
+			keep = np.logical_and.reduce([row_mask(df, spec).to_numpy() for spec in run])
+			df = df[keep]
+		elif kind in FILL_OPS:
+			if run[0].get("method") in ("ffill", "bfill"):
+				col = run[0]["col"]
+				df = df.assign(**{col: getattr(df[col], run[0]["method"])()})
+				continue
+			values = {spec["col"]: fill_value(df[spec["col"]], spec) for spec in run}
+			df = fill_frame(df, {col: v for col, v in values.items() if v is not None})
+		elif kind == "drop_columns":
+			df = df.drop(columns=run[0]["cols"])
+		elif kind == "drop_duplicates":
+			df = df.drop_duplicates(subset=run[0].get("cols") or None)
+	return df
+
+def ops_key(ops: list) -> str:
+	"""
+	Canonical JSON of an ops list, for cache keys and derived versions.
+	"""
+	return json.dumps(ops, sort_keys=True, default=str)
+
+def transformed(df: pd.DataFrame, ops: list, version: str = None) -> pd.DataFrame:
+	"""
+	apply_ops with the result cached per (dataset version, ops). Callers must not modify the frame.
+	"""
+	if not ops:
+		return df
+	key = (version, ops_key(ops)) if version else None
+	result = frame_cache.get(key) if key else None
+	if result is None:
+		result = apply_ops(df, ops)
+		if key:
+			frame_cache.put(key, result)
+	return result
+
+def aggregate(df: pd.DataFrame, spec: dict):
+	"""
+	Raw result of a validated compute spec: a scalar, or the per-group values
+	(all groups) when group_by is set.
+	"""
+	filters = spec.get("filters") or []
+	if filters:
+		df = df[np.logical_and.reduce([_filter_mask(df, f).to_numpy() for f in filters])]
+	agg = spec["agg"]
+	col = spec.get("col")
+	if spec.get("group_by"):
+		grouped = df.groupby(spec["group_by"], observed=True)
+		return grouped.size() if col is None else grouped[col].agg(agg)
+	if col is None:
+		return len(df)
+	return df[col].agg(agg)
+
+def answer(values, spec: dict):
+	"""
+	JSON-ready answer from aggregate()'s result: a number, or {group: value}
+	for the top_n groups when group_by is set.
+	"""
+	if spec.get("group_by"):
+		try:
+			values = values.nlargest(spec.get("top_n", 10))
+		except TypeError:
+			values = values.head(spec.get("top_n", 10))
+		return {str(k): serialize.scalar(v) for k, v in values.items()}
+	return serialize.scalar(values)
+
+def compute(df: pd.DataFrame, spec: dict):
+	"""
+	Exact value for a validated compute spec: a number, or {group: value}
+	for the top_n groups when group_by is set.
+	"""
+	return answer(aggregate(df, spec), spec)
@@ -0,0 +1,389 @@
+# pipeline.py
+"""
+Declarative cleaning pipelines, planned before they run.
+A pipeline is a list of op dicts (type coercion, outlier removal,
+normalization, fills, dedupe, filters, column drops). Compiling it builds a
+dependency DAG from the columns each op reads and writes and whether it
+changes or depends on the set of rows; ops with no path between them share a
+stage and are executed fused: row predicates as one mask, column rewrites as
+one assign and all fill values as one fillna. Column drops that nothing
+upstream needs are pushed down to load time so those columns are never read.
+Every run reports per-op timings and rows affected.
+With a dataset version, each stage's output and the column statistics behind
+fills (null masks, medians, means, modes) are cached under the version and
+the ops that produced them, so re-cleaning with a tweaked strategy restarts
+from the last unchanged stage and recomputes only the statistics it lacks.
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import ops, tracing
+from .cache import LRUCache, estimate_size
+from .ops import OpValidationError
+
+# Memory budget for cached stage outputs and column statistics (256 MB), override with PIPELINE_CACHE_MAX_BYTES
+PIPELINE_CACHE_MAX_BYTES = int(os.getenv("PIPELINE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+COERCE_TYPES = ["numeric", "datetime", "string", "category"]
+NORMALIZE_METHODS = ["minmax", "zscore"]
+DEFAULT_STRATEGY = {"numeric": "median", "categorical": "mode", "drop_duplicates": True}
+
+# Reads/writes footprint meaning "every column"
+ALL = None
+
+def _frame_size(df: pd.DataFrame, sample: int = 1000) -> int:
+	# Deep memory_usage walks every string; estimate object columns from a sample instead
+	size = int(df.memory_usage(index=True, deep=False).sum())
+	for col in df.columns[df.dtypes == object]:
+		head = df[col].iloc[:sample]
+		if len(head):
+			size += int(head.memory_usage(index=False, deep=True) - head.memory_usage(index=False)) * len(df) // len(head)
+	return size
+
+def _artifact_size(value) -> int:
+	# Stage outputs are cached as (frame, stage report, op reports)
+	if isinstance(value, tuple):
+		return sum(_artifact_size(v) for v in value)
+	if isinstance(value, pd.DataFrame):
+		return _frame_size(value)
+	return estimate_size(value)
+
+artifact_cache = LRUCache(PIPELINE_CACHE_MAX_BYTES, sizeof=_artifact_size)
+_MISSING = object()
+
+def _artifact(key, compute):
+	"""
+	Cached compute() under key; key None disables caching.
+	"""
+	if key is None:
+		return compute()
+	value = artifact_cache.get(key, _MISSING)
+	if value is _MISSING:
+		value = compute()
+		artifact_cache.put(key, value)
+	return value
+
+class _Node:
+	"""
+	An op with its footprint: columns read and written, whether it removes rows
+	and whether its result depends on which rows are present.
+	"""
+	def __init__(self, spec: dict, reads, writes, changes_rows: bool = False, row_dependent: bool = False):
+		self.spec = spec
+		self.reads = reads
+		self.writes = writes
+		self.changes_rows = changes_rows
+		self.row_dependent = row_dependent
+
+def _overlap(a, b) -> bool:
+	if a is ALL:
+		return b is ALL or bool(b)
+	if b is ALL:
+		return bool(a)
+	return bool(a & b)
+
+def _conflicts(a: _Node, b: _Node) -> bool:
+	# a comes before b in the pipeline
+	# Column hazards (read-after-write, write-after-read, write-after-write)
+	if _overlap(a.writes, b.reads) or _overlap(a.reads, b.writes) or _overlap(a.writes, b.writes):
+		return True
+	# Removing rows changes the result of later ops that look at the whole column (medians, outliers, dedupe)
+	return a.changes_rows and b.row_dependent
+
+def _node(spec: dict) -> _Node:
+	op = spec["op"]
+	if op == "filter":
+		return _Node(spec, frozenset([spec["col"]]), frozenset(), changes_rows=True)
+	if op == "dropna":
+		return _Node(spec, frozenset(spec.get("cols") or [spec["col"]]), frozenset(), changes_rows=True)
+	if op == "drop_outliers":
+		return _Node(spec, frozenset([spec["col"]]), frozenset(), changes_rows=True, row_dependent=True)
+	if op == "drop_duplicates":
+		return _Node(spec, frozenset(spec["cols"]) if spec.get("cols") else ALL, frozenset(), changes_rows=True, row_dependent=True)
+	if op == "drop_columns":
+		return _Node(spec, frozenset(), frozenset(spec["cols"]))
+	if op == "fill_missing":
+		return _Node(spec, ALL, ALL, row_dependent=True)
+	col = frozenset([spec["col"]])
+	if op == "fillna":
+		return _Node(spec, col, col, row_dependent=spec.get("method", "value") not in ("value", "zero"))
+	if op == "normalize":
+		return _Node(spec, col, col, row_dependent=True)
+	return _Node(spec, col, col)
+
+def _require(value, allowed, field):
+	if value not in allowed:
+		raise OpValidationError(f"Unsupported {field}: {value!r}")
+
+def validate(pipeline, columns) -> list:
+	"""
+	Check a pipeline against the dataset columns, following column drops.
+	Returns the ops; raises OpValidationError.
+	"""
+	if not isinstance(pipeline, list) or len(pipeline) > ops.MAX_OPS:
+		raise OpValidationError(f"pipeline must be a list of at most {ops.MAX_OPS} operations.")
+	columns = list(columns)
+	for spec in pipeline:
+		if not isinstance(spec, dict):
+			raise OpValidationError("Each op must be an object.")
+		op = spec.get("op")
+		if op == "coerce":
+			ops.require_column(spec.get("col"), columns)
+			_require(spec.get("to"), COERCE_TYPES, "coerce type")
+		elif op == "normalize":
+			ops.require_column(spec.get("col"), columns)
+			_require(spec.get("method", "minmax"), NORMALIZE_METHODS, "normalize method")
+		elif op == "fill_missing":
+			_require(spec.get("numeric", "median"), ["mean", "median"], "numeric fill")
+			_require(spec.get("categorical", "mode"), ["mode", "value"], "categorical fill")
+		else:
+			ops.validate_ops([spec], columns)
+			if op == "drop_columns":
+				columns = [c for c in columns if c not in spec["cols"]]
+	return pipeline
+
+def from_strategy(strategy: dict, columns) -> list:
+	"""
+	Pipeline for an auto_clean strategy: drop columns, run the strategy's
+	explicit "pipeline" ops, drop duplicates, then fill missing values.
+	"""
+	if strategy is None:
+		strategy = DEFAULT_STRATEGY
+	steps = []
+	drop_cols = [c for c in strategy.get("drop_columns") or [] if c in columns]
+	if drop_cols:
+		steps.append({"op": "drop_columns", "cols": drop_cols})
+	steps.extend(strategy.get("pipeline") or [])
+	if strategy.get("drop_duplicates", True):
+		steps.append({"op": "drop_duplicates"})
+	steps.append({
+		"op": "fill_missing",
+		"numeric": strategy.get("numeric", "median"),
+		"categorical": strategy.get("categorical", "mode"),
+		"value": strategy.get("categorical_value", "<missing>"),
+	})
+	return steps
+
+class Plan:
+	"""
+	A compiled pipeline: the columns to load, the column drops pushed down to
+	load time, and the remaining ops grouped into stages of independent ops.
+	"""
+	def __init__(self, columns, pipeline: list):
+		columns = list(columns)
+		validate(pipeline, columns)
+		nodes = [_node(spec) for spec in pipeline]
+		self.pushed_down = []
+		kept = []
+		for i, node in enumerate(nodes):
+			if node.spec["op"] == "drop_columns":
+				# A drop can move to load time if no earlier op touches the column
+				upstream = nodes[:i]
+				pushable = [c for c in node.spec["cols"] if not any(
+					_overlap(u.reads, {c}) or _overlap(u.writes, {c}) for u in upstream if u.spec["op"] != "drop_columns"
+				)]
+				self.pushed_down.extend(pushable)
+				rest = [c for c in node.spec["cols"] if c not in pushable]
+				if not rest:
+					continue
+				node = _node({**node.spec, "cols": rest})
+			kept.append(node)
+		self.load_columns = [c for c in columns if c not in self.pushed_down] if self.pushed_down else None
+		# Each op runs one stage after the latest op it conflicts with
+		levels = []
+		for j, node in enumerate(kept):
+			levels.append(max((levels[i] + 1 for i in range(j) if _conflicts(kept[i], node)), default=0))
+		self.stages = [[kept[j] for j in range(len(kept)) if levels[j] == level] for level in range(max(levels, default=-1) + 1)]
+
+	def stage_keys(self, version: str) -> list:
+		"""
+		Cache key of each stage's output: the dataset version, the loaded
+		columns and every op up to and including that stage.
+		"""
+		prefix, keys = [version, self.load_columns], []
+		for stage in self.stages:
+			prefix.append([node.spec for node in stage])
+			keys.append(ops.ops_key(prefix))
+		return keys
+
+	def describe(self) -> dict:
+		return {
+			"load_columns": self.load_columns,
+			"pushed_down": self.pushed_down,
+			"stages": [[node.spec["op"] for node in stage] for stage in self.stages],
+		}
+
+def compile_strategy(strategy: dict, columns) -> Plan:
+	"""
+	Compile an auto_clean strategy against the dataset's columns.
+	"""
+	return Plan(columns, from_strategy(strategy, columns))
+
+def _coerce(s: pd.Series, to: str) -> pd.Series:
+	if to == "numeric":
+		return pd.to_numeric(s, errors="coerce")
+	if to == "datetime":
+		return pd.to_datetime(s, errors="coerce")
+	if to == "string":
+		return s.where(s.isna(), s.astype(str))
+	return s.astype("category")
+
+def _normalize(s: pd.Series, method: str) -> pd.Series:
+	# float64 first: differences of downcast integers could overflow
+	s = pd.to_numeric(s, errors="coerce").astype("float64")
+	if method == "minmax":
+		low, span = s.min(), s.max() - s.min()
+		return (s - low) / span if span else s - low
+	std = s.std()
+	return (s - s.mean()) / std if std and std == std else s - s.mean()
+
+def _missing_fills(df: pd.DataFrame, spec: dict, nulls: pd.Series, key=None) -> dict:
+	"""
+	Fill values for every column with missing values: one vectorized mean/median
+	over the numeric columns still lacking one, a mode (or constant) per other
+	column; date columns always take their mode. With key (the frame's cache key), per-column values are reused.
+	"""
+	targets = [c for c in df.columns if nulls[c]]
+	method = spec.get("numeric", "median")
+	numeric = [c for c in targets if df[c].dtype.kind in 'biufc']
+	fills = {}
+	if key is not None:
+		for col in numeric:
+			value = artifact_cache.get((key, method, col), _MISSING)
+			if value is not _MISSING:
+				fills[col] = value
+	todo = [c for c in numeric if c not in fills]
+	if todo:
+		computed = getattr(df[todo], method)().to_dict()
+		for col, value in computed.items():
+			if key is not None:
+				artifact_cache.put((key, method, col), value)
+		fills.update(computed)
+	for col in targets:
+		if col in fills:
+			continue
+		# Dates are always filled with a date (their mode), never a placeholder string
+		temporal = df[col].dtype.kind in "mM"
+		if temporal or spec.get("categorical", "mode") == "mode":
+			def mode(col=col, temporal=temporal):
+				values = df[col].mode()
+				if values.empty:
+					return None if temporal else "<missing>"
+				return values.iloc[0]
+			fills[col] = _artifact((key, "mode", col) if key is not None else None, mode)
+		else:
+			fills[col] = spec.get("value", "<missing>")
+	return fills
+
+def _run_stage(df: pd.DataFrame, stage: list, report: list, index: int, key=None) -> pd.DataFrame:
+	"""
+	Evaluate every op of a stage against the stage's input frame, then apply
+	the results together: fills, column rewrites, drops, then one row mask.
+	key is the input frame's cache key, for reusing column statistics.
+	"""
+	masks, fills, assigned, drops = [], {}, {}, []
+	for node in stage:
+		spec, op = node.spec, node.spec["op"]
+		started = time.perf_counter()
+		if op in ("filter", "dropna", "drop_outliers", "drop_duplicates"):
+			keep = (~df.duplicated(subset=spec.get("cols") or None) if op == "drop_duplicates" else ops.row_mask(df, spec)).to_numpy()
+			masks.append(keep)
+			affected = int(len(keep) - keep.sum())
+		elif op == "fill_missing":
+			null_mask = _artifact((key, "null_mask") if key is not None else None, df.isna)
+			values = _missing_fills(df, spec, null_mask.sum(), key)
+			fills.update(values)
+			affected = int(null_mask[list(values)].any(axis=1).sum()) if values else 0
+		elif op == "fillna":
+			col = spec["col"]
+			if spec.get("method") in ("ffill", "bfill"):
+				assigned[col] = getattr(df[col], spec["method"])()
+			else:
+				fills[col] = ops.fill_value(df[col], spec)
+			affected = int(df[col].isna().sum())
+		elif op == "coerce":
+			assigned[spec["col"]] = _coerce(df[spec["col"]], spec["to"])
+			affected = int(assigned[spec["col"]].isna().sum() - df[spec["col"]].isna().sum())
+		elif op == "normalize":
+			assigned[spec["col"]] = _normalize(df[spec["col"]], spec.get("method", "minmax"))
+			affected = int(assigned[spec["col"]].notna().sum())
+		else:
+			drops.extend(spec["cols"])
+			affected = 0
+		report.append({"op": op, "stage": index, "seconds": time.perf_counter() - started, "rows_affected": affected})
+	started = time.perf_counter()
+	fills = {col: v for col, v in fills.items() if v is not None}
+	if fills:
+		df = ops.fill_frame(df, fills)
+	if assigned:
+		df = df.assign(**assigned)
+	if drops:
+		df = df.drop(columns=drops)
+	if masks:
+		df = df[np.logical_and.reduce(masks)] if len(masks) > 1 else df[masks[0]]
+	# Time spent applying the fused results is shared by the stage's ops
+	shared = (time.perf_counter() - started) / len(stage)
+	for entry in report[-len(stage):]:
+		entry["seconds"] += shared
+	return df
+
+@tracing.traced("clean")
+def run(plan: Plan, df: pd.DataFrame, version: str = None):
+	"""
+	Execute a compiled plan on df (loaded with plan.load_columns, or the full
+	frame). The input frame is not modified. Returns (cleaned frame, report)
+	where report has per-op and per-stage timings and row counts.
+	With the dataset version, stage outputs and column statistics are cached
+	and the run resumes after the last stage already computed for it; callers
+	must not modify the returned frame.
+	"""
+	started = time.perf_counter()
+	rows_in = len(df)
+	op_report = [
+		{"op": "drop_columns", "stage": "load", "seconds": 0.0, "rows_affected": 0, "pushed_down": plan.pushed_down}
+	] if plan.pushed_down else []
+	if plan.load_columns is not None and len(df.columns) != len(plan.load_columns):
+		df = df[plan.load_columns]
+	keys = plan.stage_keys(version) if version else [None] * len(plan.stages)
+	stages = []
+	resume = 0
+	for index in reversed(range(len(plan.stages)) if version else []):
+		cached = artifact_cache.get(keys[index])
+		if cached is not None:
+			df, _, _ = cached
+			resume = index + 1
+			break
+	for index in range(resume):
+		# Reports of reused stages come from the run that computed them
+		_, stage_entry, op_entries = artifact_cache.get(keys[index], (None, None, None))
+		if stage_entry is not None:
+			stages.append({**stage_entry, "seconds": 0.0, "cached": True})
+			op_report.extend({**entry, "seconds": 0.0, "cached": True} for entry in op_entries)
+	for index in range(resume, len(plan.stages)):
+		stage = plan.stages[index]
+		stage_started = time.perf_counter()
+		stage_rows = len(df)
+		ops_before = len(op_report)
+		input_key = keys[index - 1] if index else (ops.ops_key([version, plan.load_columns]) if version else None)
+		df = _run_stage(df, stage, op_report, index, input_key)
+		stages.append({
+			"stage": index,
+			"ops": [node.spec["op"] for node in stage],
+			"seconds": time.perf_counter() - stage_started,
+			"rows_in": stage_rows,
+			"rows_out": len(df),
+			"cached": False,
+		})
+		if keys[index] is not None:
+			artifact_cache.put(keys[index], (df, stages[-1], op_report[ops_before:]))
+	return df, {
+		**plan.describe(),
+		"ops": op_report,
+		"stages": stages,
+		"rows_in": rows_in,
+		"rows_out": len(df),
+		"seconds": time.perf_counter() - started,
+	}
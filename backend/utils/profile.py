@@ -0,0 +1,142 @@
+# profile.py
+"""
+Compact dataset profiles for AI prompts, fitted to a token budget.
+A profile lists each column's type, null count, cardinality and either its
+quantiles (from the stats engine's sketches) or its top values, followed by a
+stratified sample of rows. When the budget is tight, detail is dropped in
+stages (top values, then quantiles, then trailing columns) and the sample
+gets whatever budget is left, rather than letting the prompt overflow.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from .cache import LRUCache
+
+# Default token budget for a profile, override with PROFILE_TOKEN_BUDGET
+PROFILE_TOKEN_BUDGET = int(os.getenv("PROFILE_TOKEN_BUDGET", 2000))
+PROFILE_SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", 20))
+# Longest cell value rendered in the sample
+MAX_CELL_CHARS = 40
+# A categorical column with at most this many values can stratify the sample
+MAX_STRATA = 50
+# Wide tables show only this many leading columns in the row sample
+MAX_SAMPLE_COLUMNS = 20
+
+profile_cache = LRUCache(16 * 1024 * 1024)
+
+def estimate_tokens(text: str) -> int:
+	"""
+	Rough token count (about 4 characters per token for English and CSV).
+	"""
+	return len(text) // 4 + 1
+
+def _fmt(v) -> str:
+	if isinstance(v, float):
+		return f"{v:.4g}"
+	text = str(v)
+	return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 3] + "..."
+
+def _column_line(col, dtype, stats: dict, detail: int) -> str:
+	"""
+	One profile line for col. detail 2 = quantiles and top values, 1 = quantiles only, 0 = type and counts.
+	"""
+	desc = stats["describe"].get(col, {})
+	parts = [f"{col} ({dtype})", f"nulls={stats['nulls'].get(col, 0)}"]
+	if desc.get("unique") not in (None, ""):
+		parts.append(f"unique={desc['unique']}")
+	if detail >= 1 and desc.get("50%") not in (None, ""):
+		parts.append("range=" + "/".join(_fmt(desc[k]) for k in ["min", "25%", "50%", "75%", "max"]))
+		if desc.get("mean") not in (None, ""):
+			parts.append(f"mean={_fmt(desc['mean'])}")
+	if detail >= 2:
+		top = stats.get("value_counts", {}).get(col)
+		if top:
+			# Missing values are already counted in nulls
+			values = [(k, v) for k, v in top.items() if not pd.isna(k) and k not in ("nan", "NaN")][:3]
+			parts.append("top=" + ", ".join(f"{_fmt(k)} ({v})" for k, v in values))
+		elif desc.get("top") not in (None, ""):
+			parts.append(f"top={_fmt(desc['top'])} ({desc['freq']})")
+	return "- " + ", ".join(parts)
+
+def _stratify_column(stats: dict, sample_rows: int, columns: list):
+	# The categorical column of df with the most values that still fit in the sample
+	best, best_unique = None, 1
+	for col, desc in stats["describe"].items():
+		unique = desc.get("unique")
+		if col in columns and isinstance(unique, (int, float)) and best_unique < unique <= min(MAX_STRATA, sample_rows):
+			best, best_unique = col, unique
+	return best
+
+def stratified_sample(df: pd.DataFrame, n: int, stratify: str = None, seed: int = 0) -> pd.DataFrame:
+	"""
+	n rows with every stratum of `stratify` represented as evenly as possible
+	(a plain random sample without it), in original row order.
+	Raises ValueError if `stratify` is not a column of df.
+	"""
+	if stratify is not None and stratify not in df.columns:
+		raise ValueError(f"Stratify column '{stratify}' not found in dataset.")
+	if len(df) <= n:
+		return df
+	shuffled = df.iloc[np.random.default_rng(seed).permutation(len(df))]
+	if stratify is None:
+		return shuffled.head(n).sort_index()
+	# Taking rows by their rank within their stratum is a round robin over strata
+	rank = shuffled.groupby(stratify, dropna=False, sort=False, observed=True).cumcount()
+	return shuffled.iloc[np.argsort(rank.to_numpy(), kind="stable")[:n]].sort_index()
+
+def build_profile(df: pd.DataFrame, stats: dict, total_rows: int = None, budget: int = PROFILE_TOKEN_BUDGET) -> str:
+	"""
+	Profile text for df within about `budget` tokens. stats is the
+	get_summary_stats dict for the full dataset; df may be a prefix of it,
+	used only for dtypes and the row sample.
+	"""
+	columns = list(df.columns)
+	header = f"Rows: {total_rows if total_rows is not None else len(df)}, Columns: {len(columns)}"
+	dtypes = {col: str(df[col].dtype) for col in columns}
+	for detail in (2, 1, 0):
+		lines = [_column_line(col, dtypes[col], stats, detail) for col in columns]
+		if estimate_tokens("\n".join([header] + lines)) <= budget * 0.6 or detail == 0:
+			break
+	# Wide tables: keep as many columns as fit and say how many were left out
+	used = estimate_tokens(header)
+	kept = []
+	for line in lines:
+		cost = estimate_tokens(line)
+		if used + cost > budget * 0.8 and kept:
+			break
+		kept.append(line)
+		used += cost
+	sample_cols = columns[:min(len(kept), MAX_SAMPLE_COLUMNS)]
+	stratify = _stratify_column(stats, PROFILE_SAMPLE_ROWS, columns)
+	# The sample shows its stratify column even when it is not among the leading columns
+	if stratify is not None and stratify not in sample_cols:
+		sample_cols.append(stratify)
+	if len(kept) < len(lines):
+		kept.append(f"- ... {len(lines) - len(kept)} more columns not shown")
+	text = "\n".join([header, "Columns:"] + kept)
+	sample = stratified_sample(df[sample_cols], PROFILE_SAMPLE_ROWS, stratify)
+	rendered = sample.apply(lambda s: s.map(_fmt)).to_csv(index=False).splitlines()
+	# Header plus as many sample rows as the remaining budget allows
+	remaining = budget - estimate_tokens(text) - 8
+	rows = []
+	for line in rendered:
+		cost = estimate_tokens(line)
+		if cost > remaining:
+			break
+		rows.append(line)
+		remaining -= cost
+	if len(rows) > 1:
+		text += "\nSample rows (CSV):\n" + "\n".join(rows)
+	return text
+
+def cached_profile(key, compute) -> str:
+	"""
+	Profile for key (dataset version, budget), built with compute() on a miss.
+	"""
+	text = profile_cache.get(key)
+	if text is None:
+		text = compute()
+		profile_cache.put(key, text)
+	return text
@@ -0,0 +1,97 @@
+# rows.py
+"""
+Paged row access for browsing a dataset: any window of rows, optionally
+filtered and sorted. Plain pages are read straight from the store (see
+file_utils.read_rows). Filtered or sorted views are resolved once into a
+permutation of row positions, computed from just the columns involved and
+cached per dataset version, so every later page is a slice of it.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from . import file_utils, ops
+from .cache import LRUCache
+
+# Memory budget for cached view permutations (64 MB), override with VIEW_CACHE_MAX_BYTES
+VIEW_CACHE_MAX_BYTES = int(os.getenv("VIEW_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+MAX_PAGE_ROWS = 1000
+
+view_cache = LRUCache(VIEW_CACHE_MAX_BYTES)
+
+def parse_sort(sort: str):
+	"""
+	"col" or "-col" (descending) -> (col, ascending), or None.
+	"""
+	if not sort:
+		return None
+	return (sort[1:], False) if sort.startswith("-") else (sort, True)
+
+def _view_columns(dataset_id: str, columns: list) -> pd.DataFrame:
+	if file_utils.is_large(dataset_id):
+		return pd.concat(file_utils.iter_chunks(dataset_id, columns=columns), ignore_index=True)
+	return file_utils.load_dataframe(dataset_id, columns=columns).reset_index(drop=True)
+
+def _positions(frame: pd.DataFrame, sort, filters: list) -> np.ndarray:
+	"""
+	Row positions of the view: rows passing every filter, stably sorted with missing values last.
+	"""
+	if filters:
+		frame = frame[np.logical_and.reduce([ops.row_mask(frame, f).to_numpy() for f in filters])]
+	if sort is None:
+		return frame.index.to_numpy(dtype=np.int64)
+	col, ascending = sort
+	try:
+		order = frame[col].sort_values(ascending=ascending, kind="stable", na_position="last")
+	except TypeError:
+		raise ops.OpValidationError(f"Column {col!r} has mixed types and cannot be sorted.")
+	return order.index.to_numpy(dtype=np.int64)
+
+def view(dataset_id: str, sort=None, filters: list = None) -> np.ndarray:
+	"""
+	Cached row positions for a sorted/filtered view of the dataset.
+	"""
+	filters = filters or []
+	key = (file_utils.dataset_version(dataset_id), sort, ops.ops_key(filters))
+	positions = view_cache.get(key)
+	if positions is None:
+		columns = list(dict.fromkeys(([sort[0]] if sort else []) + [f["col"] for f in filters]))
+		positions = _positions(_view_columns(dataset_id, columns), sort, filters)
+		view_cache.put(key, positions)
+	return positions
+
+def _take(dataset_id: str, positions: np.ndarray) -> pd.DataFrame:
+	# A page of a loaded dataset is a take from the cached frame; large
+	# datasets read only the runs of nearby rows the page touches
+	if len(positions) == 0:
+		return file_utils.read_rows(dataset_id, 0, 0)
+	if not file_utils.is_large(dataset_id):
+		return file_utils.load_dataframe(dataset_id).iloc[positions]
+	ordered = np.sort(positions)
+	runs = np.split(ordered, np.flatnonzero(np.diff(ordered) > file_utils.ROW_INDEX_STRIDE) + 1)
+	window = pd.concat([file_utils.read_rows(dataset_id, int(run[0]), int(run[-1]) + 1) for run in runs])
+	return window.loc[positions]
+
+def page(dataset_id: str, offset: int = 0, limit: int = 50, sort: str = None, filters: list = None) -> dict:
+	"""
+	{"rows", "columns", "offset", "limit", "total"} for rows [offset, offset + limit)
+	of the dataset, or of its filtered/sorted view; rows is a DataFrame indexed
+	by row position. filters are filter op specs without "op". Raises ops.OpValidationError.
+	"""
+	if offset < 0 or not 0 < limit <= MAX_PAGE_ROWS:
+		raise ops.OpValidationError(f"offset must be >= 0 and limit from 1 to {MAX_PAGE_ROWS}.")
+	filters = [{**f, "op": "filter"} for f in filters or []]
+	sort = parse_sort(sort)
+	columns = file_utils.dataset_columns(dataset_id)
+	if sort:
+		ops.require_column(sort[0], columns, "sort")
+	ops.validate_ops(filters, columns)
+	if sort or filters:
+		positions = view(dataset_id, sort, filters)
+		total = len(positions)
+		rows = _take(dataset_id, positions[offset:offset + limit])
+	else:
+		total = file_utils.row_count(dataset_id)
+		rows = file_utils.read_rows(dataset_id, offset, min(offset + limit, total))
+	return {"rows": rows, "columns": columns, "offset": offset, "limit": limit, "total": total}
@@ -0,0 +1,159 @@
+# serialize.py
+"""
+JSON output for API responses. Frames and arrays are converted to plain Python
+values column by column with NumPy: NaN/inf become None and dates ISO strings
+without a Python call per value. Responses are encoded straight to bytes with
+orjson when it is installed (the json module otherwise).
+"""
+import json
+import math
+
+import numpy as np
+import pandas as pd
+from starlette.responses import Response
+
+from . import tracing
+
+try:
+	import orjson
+	HAS_ORJSON = True
+except ImportError:
+	HAS_ORJSON = False
+
+# Non-string keys (e.g. numeric value_counts labels) are written as strings, like json.dumps
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if HAS_ORJSON else 0
+
+def scalar(v):
+	"""
+	One value as a JSON-safe Python value: NumPy scalars unwrapped, NaN/inf as None, timestamps as ISO strings.
+	"""
+	if isinstance(v, (np.integer, np.floating, np.bool_)):
+		v = v.item()
+	if isinstance(v, float) and (v != v or v in (math.inf, -math.inf)):
+		return None
+	if isinstance(v, pd.Timestamp):
+		return v.isoformat()
+	return v
+
+def array_values(values: np.ndarray) -> list:
+	"""
+	Numeric array (any shape) as nested lists of Python values, NaN/inf as None.
+	"""
+	values = np.asarray(values)
+	if values.dtype.kind != 'f':
+		return values.tolist()
+	finite = np.isfinite(values)
+	if finite.all():
+		return values.tolist()
+	# astype(object) holds Python floats, so tolist() needs no further conversion
+	out = values.astype(object)
+	out[~finite] = None
+	return out.tolist()
+
+def _dates(s: pd.Series) -> list:
+	if s.dt.tz is not None:
+		strings = s.dt.strftime("%Y-%m-%dT%H:%M:%S%z").astype(object)
+	else:
+		stamps = s.to_numpy()
+		present = stamps[~np.isnat(stamps)]
+		# Date only when no value has a time of day
+		unit = "D" if (present == present.astype("datetime64[D]")).all() else "s"
+		strings = np.datetime_as_string(stamps, unit=unit).astype(object)
+	strings[s.isna().to_numpy()] = None
+	return strings.tolist()
+
+def _objects(values: np.ndarray) -> list:
+	# Missing values (None, NaN, NaT, pd.NA) and infinities become None; the
+	# checks run in NumPy's loop rather than in Python per value. NumPy scalars
+	# and timestamps left in mixed columns are converted by the encoder.
+	missing = pd.isna(values)
+	present = values[~missing]
+	missing[~missing] = (present == math.inf) | (present == -math.inf)
+	if missing.any():
+		values = values.copy()
+		values[missing] = None
+	return values.tolist()
+
+def column_values(s: pd.Series) -> list:
+	"""
+	Series as a list of JSON-safe Python values.
+	"""
+	dtype = s.dtype
+	if isinstance(dtype, pd.CategoricalDtype):
+		# Convert each category once, then take by code (-1, missing, maps to the trailing None)
+		categories = column_values(pd.Series(dtype.categories)) + [None]
+		return np.array(categories, dtype=object)[s.cat.codes.to_numpy()].tolist()
+	if pd.api.types.is_datetime64_any_dtype(dtype):
+		return _dates(s)
+	if isinstance(dtype, np.dtype) and dtype.kind in "iubf":
+		return array_values(s.to_numpy())
+	if isinstance(dtype, np.dtype) and dtype.kind == "m":
+		return _objects(s.astype(str).to_numpy(dtype=object))
+	# Object and extension (nullable Int64, string, boolean) columns
+	return _objects(s.to_numpy(dtype=object))
+
+def frame_records(df: pd.DataFrame) -> list:
+	"""
+	DataFrame rows as JSON-safe records ({column: value} dicts).
+	"""
+	columns = [str(c) for c in df.columns]
+	values = [column_values(df.iloc[:, i]) for i in range(df.shape[1])]
+	return [dict(zip(columns, row)) for row in zip(*values)] if columns else [{} for _ in range(len(df))]
+
+def records(rows: list) -> list:
+	"""
+	JSON-safe copy of a list of record dicts (e.g. from to_dict(orient="records")).
+	"""
+	return frame_records(pd.DataFrame(rows)) if rows else []
+
+def json_safe(obj):
+	"""
+	Nested dicts/lists/arrays/frames with every value JSON-safe; used when orjson is not installed.
+	"""
+	if isinstance(obj, dict):
+		return {_key(k): json_safe(v) for k, v in obj.items()}
+	if isinstance(obj, (list, tuple)):
+		return [json_safe(v) for v in obj]
+	if isinstance(obj, np.ndarray):
+		return json_safe(array_values(obj)) if obj.dtype == object else array_values(obj)
+	if isinstance(obj, pd.DataFrame):
+		return frame_records(obj)
+	if isinstance(obj, pd.Series):
+		return column_values(obj)
+	return scalar(obj)
+
+def _key(k):
+	k = scalar(k)
+	return "null" if k is None else k
+
+def _default(obj):
+	# Types orjson does not handle natively
+	if isinstance(obj, pd.DataFrame):
+		return frame_records(obj)
+	if isinstance(obj, pd.Series):
+		return column_values(obj)
+	if isinstance(obj, pd.Timestamp):
+		return obj.isoformat()
+	if obj is pd.NA or obj is pd.NaT:
+		return None
+	if isinstance(obj, np.generic):
+		return scalar(obj)
+	return str(obj)
+
+def dumps(content) -> bytes:
+	"""
+	Encode content as compact JSON bytes, NaN/inf written as null.
+	"""
+	if HAS_ORJSON:
+		return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+	return json.dumps(json_safe(content), default=_default, allow_nan=False, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(Response):
+	"""
+	JSONResponse that encodes with dumps(): no jsonable_encoder pass, NaN-safe, bytes in one call.
+	"""
+	media_type = "application/json"
+
+	def render(self, content) -> bytes:
+		with tracing.span("serialize"):
+			return dumps(content)
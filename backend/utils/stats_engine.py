@@ -0,0 +1,437 @@
+# stats_engine.py
+"""
+Single-pass, mergeable summary statistics.
+StatsAccumulator folds DataFrame chunks (or whole frames) into sketches and moment sums
+that can be merged across chunks or workers; result() renders the get_summary_stats layout.
+"""
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from . import serialize
+
+# Quantiles are exact up to this many values per column, KLL-sketched beyond
+EXACT_QUANTILE_LIMIT = int(os.getenv("EXACT_QUANTILE_LIMIT", 20_000))
+# KLL accuracy parameter (top compactor size); rank error is roughly 1.7 / KLL_K
+KLL_K = 400
+# Heavy-hitter counters kept per column; value counts are exact below this cardinality
+TOPK_CAPACITY = 1000
+# Distinct values tracked exactly before switching to HyperLogLog
+EXACT_DISTINCT_LIMIT = 100_000
+HLL_PRECISION = 14
+
+class KLLSketch:
+	"""
+	KLL quantile sketch. Holds raw values (exact quantiles) until EXACT_QUANTILE_LIMIT
+	is exceeded, then compacts into levels whose items carry weight 2**level.
+	"""
+	def __init__(self, k: int = KLL_K, exact_limit: int = EXACT_QUANTILE_LIMIT, seed: int = 0):
+		self.k = k
+		self.exact_limit = exact_limit
+		self.levels = [np.empty(0)]
+		self.n = 0
+		self.compacted = False
+		self.rng = np.random.default_rng(seed)
+
+	def update(self, values: np.ndarray):
+		if len(values):
+			self.levels[0] = np.concatenate([self.levels[0], values])
+			self.n += len(values)
+			self._compress()
+		return self
+
+	def merge(self, other: "KLLSketch") -> "KLLSketch":
+		for h, items in enumerate(other.levels):
+			if h == len(self.levels):
+				self.levels.append(np.empty(0))
+			self.levels[h] = np.concatenate([self.levels[h], items])
+		self.n += other.n
+		self.compacted = self.compacted or other.compacted
+		self._compress()
+		return self
+
+	def _capacity(self, h: int) -> int:
+		depth = len(self.levels) - h - 1
+		return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+	def _compress(self):
+		if not self.compacted and self.n <= self.exact_limit:
+			return
+		self.compacted = True
+		while True:
+			for h in range(len(self.levels)):
+				if len(self.levels[h]) > self._capacity(h):
+					break
+			else:
+				return
+			items = np.sort(self.levels[h])
+			# Keep one item back when odd so every promoted pair carries exact weight
+			keep = items[-1:] if len(items) % 2 else items[:0]
+			even = items[:len(items) - len(keep)]
+			promoted = even[self.rng.integers(2)::2]
+			self.levels[h] = keep
+			if h + 1 == len(self.levels):
+				self.levels.append(np.empty(0))
+			self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+
+	def quantiles(self, qs) -> list:
+		if not self.n:
+			return [None] * len(qs)
+		if not self.compacted:
+			# Linear interpolation, matching DataFrame.describe
+			return list(np.quantile(self.levels[0], qs))
+		items = np.concatenate(self.levels)
+		weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+		order = np.argsort(items, kind='stable')
+		items, cum = items[order], np.cumsum(weights[order])
+		idx = np.searchsorted(cum, np.asarray(qs) * cum[-1], side='left')
+		return list(items[np.clip(idx, 0, len(items) - 1)])
+
+class HeavyHitters:
+	"""
+	Misra-Gries style top-k counter fed with per-chunk value counts.
+	Counts are exact while the column has at most `capacity` distinct values;
+	beyond that they are lower bounds off by at most `error`.
+	"""
+	def __init__(self, capacity: int = TOPK_CAPACITY):
+		self.capacity = capacity
+		self.counts = {}
+		self.error = 0
+
+	def update(self, counts: pd.Series):
+		if len(counts) > self.capacity:
+			self.error += int(counts.iloc[self.capacity])
+			counts = counts.iloc[:self.capacity]
+		for value, n in zip(counts.index.tolist(), counts.tolist()):
+			self.counts[value] = self.counts.get(value, 0) + n
+		self._prune()
+		return self
+
+	def merge(self, other: "HeavyHitters") -> "HeavyHitters":
+		for value, n in other.counts.items():
+			self.counts[value] = self.counts.get(value, 0) + n
+		self.error += other.error
+		self._prune()
+		return self
+
+	def _prune(self):
+		if len(self.counts) > self.capacity:
+			ranked = self.most_common()
+			self.error += ranked[self.capacity][1]
+			self.counts = dict(ranked[:self.capacity])
+
+	def most_common(self, n: int = None) -> list:
+		# Stable sort: ties keep first-seen order, like value_counts
+		ranked = sorted(self.counts.items(), key=lambda kv: -kv[1])
+		return ranked if n is None else ranked[:n]
+
+class DistinctCounter:
+	"""
+	Distinct-value count: exact set of 64-bit hashes up to EXACT_DISTINCT_LIMIT, then HyperLogLog.
+	A single batch is always kept exact, so whole-frame stats report exact cardinalities.
+	"""
+	def __init__(self, exact_limit: int = EXACT_DISTINCT_LIMIT, p: int = HLL_PRECISION):
+		self.exact_limit = exact_limit
+		self.p = p
+		self.hashes = np.empty(0, dtype=np.uint64)
+		self.registers = None
+
+	def update(self, values):
+		if len(values):
+			hashes = pd.util.hash_array(np.asarray(values, dtype=object))
+			self._add_hashes(hashes)
+		return self
+
+	def _add_hashes(self, hashes: np.ndarray):
+		if self.registers is None:
+			if not len(self.hashes):
+				# Callers pass hashes of already-distinct values, so a single batch stays exact
+				self.hashes = np.sort(hashes)
+				return
+			if len(self.hashes) + len(hashes) <= self.exact_limit:
+				self.hashes = np.union1d(self.hashes, hashes)
+				return
+			self._to_registers()
+		self._add_registers(hashes)
+
+	def _to_registers(self):
+		self.registers = np.zeros(1 << self.p, dtype=np.uint8)
+		self._add_registers(self.hashes)
+		self.hashes = np.empty(0, dtype=np.uint64)
+
+	def _add_registers(self, hashes: np.ndarray):
+		p = np.uint64(self.p)
+		idx = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+		w = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+		# Leading zeros from the float exponent: w in [2**(e-1), 2**e)
+		_, exponent = np.frexp(w.astype(np.float64))
+		rank = (64 - exponent + 1).astype(np.uint8)
+		np.maximum.at(self.registers, idx, rank)
+
+	def merge(self, other: "DistinctCounter") -> "DistinctCounter":
+		if other.registers is None:
+			self._add_hashes(other.hashes)
+		else:
+			if self.registers is None:
+				self._to_registers()
+			np.maximum(self.registers, other.registers, out=self.registers)
+		return self
+
+	def count(self) -> int:
+		if self.registers is None:
+			return len(self.hashes)
+		m = len(self.registers)
+		alpha = 0.7213 / (1 + 1.079 / m)
+		estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+		zeros = int(np.count_nonzero(self.registers == 0))
+		if estimate <= 2.5 * m and zeros:
+			estimate = m * math.log(m / zeros)
+		return int(round(estimate))
+
+def _is_numeric(s: pd.Series) -> bool:
+	return pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s)
+
+def _is_text(s: pd.Series) -> bool:
+	return s.dtype == object or s.dtype.name == 'category' or pd.api.types.is_string_dtype(s)
+
+class StatsAccumulator:
+	"""
+	Mergeable partial stats for a table. update() takes one vectorized pass over a chunk:
+	null counts for all columns, moment and pairwise cross-product sums over the numeric
+	block, a KLL sketch per numeric/datetime column, value counts feeding top-k and
+	distinct counters for everything else, and top-k counters for datetime columns (for their mode).
+	"""
+	def __init__(self, seed: int = 0):
+		self.seed = seed
+		self.columns = []
+		self.numeric = []
+		self.temporal = []
+		self.other = []
+		self.text = []
+		self.rows = 0
+		self.nulls = {}
+		self.shift = None
+		self.count = self.total = self.total_sq = None
+		self.min = self.max = None
+		self.pair_n = self.pair_sum = self.pair_sum_sq = self.pair_cross = None
+		self.sketches = {}
+		self.top = {}
+		self.distinct = {}
+
+	def _init_layout(self, columns, numeric, temporal, text):
+		k = len(numeric)
+		self.columns = list(columns)
+		self.numeric = list(numeric)
+		self.temporal = list(temporal)
+		self.other = [c for c in self.columns if c not in numeric and c not in temporal]
+		self.text = list(text)
+		self.nulls = {c: 0 for c in self.columns}
+		self.count, self.total, self.total_sq = np.zeros(k), np.zeros(k), np.zeros(k)
+		self.min, self.max = np.full(k, np.inf), np.full(k, -np.inf)
+		self.pair_n, self.pair_sum = np.zeros((k, k)), np.zeros((k, k))
+		self.pair_sum_sq, self.pair_cross = np.zeros((k, k)), np.zeros((k, k))
+		self.sketches = {c: KLLSketch(seed=self.seed) for c in self.numeric + self.temporal}
+		self.top = {c: HeavyHitters() for c in self.other + self.temporal}
+		self.distinct = {c: DistinctCounter() for c in self.other}
+
+	def update(self, chunk: pd.DataFrame) -> "StatsAccumulator":
+		if not self.columns:
+			self._init_layout(
+				chunk.columns,
+				[c for c in chunk.columns if _is_numeric(chunk[c])],
+				[c for c in chunk.columns if pd.api.types.is_datetime64_any_dtype(chunk[c])],
+				[c for c in chunk.columns if _is_text(chunk[c])],
+			)
+		self.rows += len(chunk)
+		for col, n in chunk[self.columns].isnull().sum().items():
+			self.nulls[col] += int(n)
+		for col in self.other:
+			counts = chunk[col].value_counts(dropna=True)
+			if isinstance(counts.index, pd.CategoricalIndex):
+				# Unused categories are listed with a zero count
+				counts = counts[counts > 0]
+			self.top[col].update(counts)
+			self.distinct[col].update(counts.index)
+		for col in self.temporal:
+			self.top[col].update(chunk[col].value_counts(dropna=True))
+			values = chunk[col].dropna().to_numpy(dtype='datetime64[ns]').astype(np.int64)
+			self.sketches[col].update(values.astype(np.float64))
+		if self.numeric:
+			self._update_numeric(chunk)
+		return self
+
+	def _update_numeric(self, chunk: pd.DataFrame):
+		# CSV chunks may infer a different dtype for the same column; coerce to numbers
+		block = chunk[self.numeric]
+		if not all(_is_numeric(block[c]) for c in self.numeric):
+			block = block.apply(pd.to_numeric, errors='coerce')
+		values = block.to_numpy(dtype=float, na_value=np.nan)
+		mask = ~np.isnan(values)
+		if self.shift is None:
+			with np.errstate(all='ignore'):
+				self.shift = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else np.zeros(len(self.numeric))
+		x = np.where(mask, values - self.shift, 0.0)
+		m = mask.astype(float)
+		self.count += m.sum(axis=0)
+		self.total += x.sum(axis=0)
+		self.total_sq += (x * x).sum(axis=0)
+		if len(values):
+			self.min = np.minimum(self.min, np.where(mask, values, np.inf).min(axis=0))
+			self.max = np.maximum(self.max, np.where(mask, values, -np.inf).max(axis=0))
+		self.pair_n += m.T @ m
+		self.pair_sum += x.T @ m
+		self.pair_sum_sq += (x * x).T @ m
+		self.pair_cross += x.T @ x
+		for i, col in enumerate(self.numeric):
+			self.sketches[col].update(values[mask[:, i], i])
+
+	def merge(self, other: "StatsAccumulator") -> "StatsAccumulator":
+		"""
+		Fold another accumulator built over the same columns into this one.
+		"""
+		if not other.columns:
+			return self
+		if not self.columns:
+			self._init_layout(other.columns, other.numeric, other.temporal, other.text)
+			self.shift = other.shift
+		self.rows += other.rows
+		for col in self.columns:
+			self.nulls[col] += other.nulls[col]
+		for col in self.other:
+			self.top[col].merge(other.top[col])
+			self.distinct[col].merge(other.distinct[col])
+		for col in self.temporal:
+			self.top[col].merge(other.top[col])
+		for col, sketch in other.sketches.items():
+			self.sketches[col].merge(sketch)
+		if self.numeric and other.shift is not None:
+			if self.shift is None:
+				self.shift = other.shift
+			# Re-base the other accumulator's shifted sums onto this shift
+			d = other.shift - self.shift
+			dn, n = d[:, None], other.count
+			self.total_sq += other.total_sq + 2 * d * other.total + n * d * d
+			self.total += other.total + n * d
+			self.count += n
+			self.min = np.minimum(self.min, other.min)
+			self.max = np.maximum(self.max, other.max)
+			self.pair_sum_sq += other.pair_sum_sq + 2 * dn * other.pair_sum + other.pair_n * dn * dn
+			self.pair_cross += other.pair_cross + dn * other.pair_sum.T + other.pair_sum * d[None, :] + other.pair_n * dn * d[None, :]
+			self.pair_sum += other.pair_sum + other.pair_n * dn
+			self.pair_n += other.pair_n
+		return self
+
+	def mean(self, col) -> float:
+		i = self.numeric.index(col)
+		return self.shift[i] + self.total[i] / self.count[i] if self.count[i] else None
+
+	def quantile(self, col, q: float):
+		return self.sketches[col].quantiles([q])[0]
+
+	def mode(self, col):
+		"""
+		Most frequent non-null value; ties go to the smallest value, like Series.mode().iloc[0].
+		"""
+		ranked = self.top[col].most_common()
+		if not ranked:
+			return None
+		tied = [v for v, n in ranked if n == ranked[0][1]]
+		try:
+			return min(tied)
+		except TypeError:
+			return tied[0]
+
+	def result(self) -> dict:
+		"""
+		Stats dict with the same layout as data_handler.get_summary_stats.
+		"""
+		has_numeric = bool(self.numeric or self.temporal)
+		has_other = bool(self.other)
+		describe = {}
+		for i, col in enumerate(self.numeric):
+			n = self.count[i]
+			var = (self.total_sq[i] - self.total[i] ** 2 / n) / (n - 1) if n > 1 else None
+			q = self.sketches[col].quantiles([0.25, 0.5, 0.75])
+			entry = {"count": float(n)}
+			if has_other:
+				entry.update({"unique": "", "top": "", "freq": ""})
+			entry.update({
+				"mean": self.mean(col),
+				"std": math.sqrt(max(var, 0.0)) if var is not None else None,
+				"min": self.min[i] if n else None,
+				"25%": q[0], "50%": q[1], "75%": q[2],
+				"max": self.max[i] if n else None,
+			})
+			describe[col] = entry
+		for col in self.temporal:
+			sketch = self.sketches[col]
+			stamps = sketch.quantiles([0.0, 0.25, 0.5, 0.75, 1.0])
+			mean = float(np.mean(np.concatenate(sketch.levels))) if not sketch.compacted and sketch.n else stamps[2]
+			entry = {"count": sketch.n}
+			if has_other:
+				entry.update({"unique": "", "top": "", "freq": ""})
+			labels = ["min", "25%", "50%", "75%", "max"]
+			entry["mean"] = _timestamp(mean)
+			entry.update({label: _timestamp(v) for label, v in zip(labels, stamps)})
+			entry["std"] = ""
+			describe[col] = entry
+		for col in self.other:
+			top = self.top[col].most_common(1)
+			entry = {
+				"count": self.rows - self.nulls[col],
+				"unique": self.distinct[col].count(),
+				"top": top[0][0] if top else "",
+				"freq": top[0][1] if top else "",
+			}
+			if has_numeric:
+				entry.update({"mean": "", "std": "", "min": "", "25%": "", "50%": "", "75%": "", "max": ""})
+			describe[col] = entry
+		value_counts = {}
+		for col in self.text:
+			top = self.top[col].most_common(10)
+			if self.nulls[col]:
+				# value_counts(dropna=False) ranks NaN among the values by its count
+				# Missing values are keyed None, written as "null"
+				top.append((None, self.nulls[col]))
+				top = sorted(top, key=lambda kv: -kv[1])[:10]
+			# Keys too: dates, NumPy scalars and mixed-type values are not valid orjson keys
+			value_counts[col] = {serialize.scalar(k): serialize.scalar(v) for k, v in top}
+		return {
+			"describe": {c: {k: _describe_value(v) for k, v in describe[c].items()} for c in self.columns},
+			"nulls": dict(self.nulls),
+			"value_counts": value_counts,
+			"correlation": self.correlation(),
+		}
+
+	def correlation(self) -> dict:
+		"""
+		Pearson correlation over pairwise-complete rows, like DataFrame.corr().
+		"""
+		if len(self.numeric) < 2:
+			return {}
+		n, sx, sxx, sxy = self.pair_n, self.pair_sum, self.pair_sum_sq, self.pair_cross
+		with np.errstate(all='ignore'):
+			cov = n * sxy - sx * sx.T
+			spread = n * sxx - sx * sx
+			corr = cov / np.sqrt(spread * spread.T)
+			corr[(n < 2) | ~(spread * spread.T > 0)] = np.nan
+			np.fill_diagonal(corr, np.where(np.isnan(np.diag(corr)), np.nan, 1.0))
+			corr = np.clip(corr, -1.0, 1.0)
+		# Converted as one array, then zipped per column: no Python call per cell
+		return {cj: dict(zip(self.numeric, values)) for cj, values in zip(self.numeric, serialize.array_values(corr.T))}
+
+def _timestamp(v):
+	return pd.Timestamp(int(v)).isoformat() if v is not None else None
+
+def _describe_value(v):
+	# describe().fillna("") renders undefined stats as empty strings
+	v = serialize.scalar(v)
+	return "" if v is None else v
+
+def summarize(df: pd.DataFrame) -> dict:
+	"""
+	get_summary_stats-compatible stats for an in-memory frame in one pass.
+	"""
+	return StatsAccumulator().update(df).result()
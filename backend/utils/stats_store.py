@@ -0,0 +1,117 @@
+# stats_store.py
+"""
+Persisted, versioned summary stats. Stats are stored as JSON next to the version
+(content hash) of the data they describe; CSV/XLSX exports are rendered lazily.
+Each dataset has one slot per kind: "raw" stats of the upload and "cleaned"
+stats of its last clean, so neither evicts the other.
+"""
+import os
+import json
+
+import pandas as pd
+
+from . import tracing
+from .file_utils import _atomic_write
+
+STATS_DIR = os.path.join(os.path.dirname(__file__), 'stats_exports')
+
+def _stem(dataset_id: str, kind: str) -> str:
+	return f'stats_{dataset_id}' if kind == 'raw' else f'stats_{dataset_id}.{kind}'
+
+def stats_path(dataset_id: str, ext: str, kind: str = 'raw') -> str:
+	return os.path.join(STATS_DIR, f'{_stem(dataset_id, kind)}.{ext}')
+
+def _version_path(dataset_id: str, kind: str = 'raw') -> str:
+	return os.path.join(STATS_DIR, f'{_stem(dataset_id, kind)}.version')
+
+def stored_version(dataset_id: str, kind: str = 'raw'):
+	"""
+	Version hash the persisted stats of this kind were computed for, or None.
+	"""
+	try:
+		with open(_version_path(dataset_id, kind), encoding='utf-8') as f:
+			return f.read().strip() or None
+	except OSError:
+		return None
+
+def load(dataset_id: str, version: str, kind: str = 'raw'):
+	"""
+	Return persisted stats if they were computed for `version`, else None.
+	"""
+	if stored_version(dataset_id, kind) != version:
+		return None
+	try:
+		with open(stats_path(dataset_id, 'json', kind), encoding='utf-8') as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
+
+def save(dataset_id: str, version: str, stats: dict, kind: str = 'raw'):
+	"""
+	Persist stats as JSON for `version` and drop exports rendered from older stats.
+	"""
+	if not os.path.exists(STATS_DIR):
+		os.makedirs(STATS_DIR)
+	def write_json(path):
+		with open(path, 'w', encoding='utf-8') as f:
+			json.dump(stats, f, indent=2, default=str)
+	def write_version(path):
+		with open(path, 'w', encoding='utf-8') as f:
+			f.write(version)
+	_atomic_write(stats_path(dataset_id, 'json', kind), write_json)
+	for ext in ['csv', 'xlsx']:
+		if os.path.exists(stats_path(dataset_id, ext, kind)):
+			os.remove(stats_path(dataset_id, ext, kind))
+	_atomic_write(_version_path(dataset_id, kind), write_version)
+
+def get_or_compute(dataset_id: str, version: str, compute, kind: str = 'raw') -> dict:
+	"""
+	Persisted stats for `version`, computing and saving them with compute() on a miss.
+	"""
+	stats = load(dataset_id, version, kind)
+	if stats is None:
+		stats = compute()
+		save(dataset_id, version, stats, kind)
+	return stats
+
+def flatten(d, parent_key="", sep="."):
+	"""
+	Flatten nested dicts/lists into {"a.b[0].c": value} for tabular export.
+	"""
+	items = {}
+	if isinstance(d, dict):
+		for k, v in d.items():
+			new_key = f"{parent_key}{sep}{k}" if parent_key else k
+			if isinstance(v, dict):
+				items.update(flatten(v, new_key, sep=sep))
+			elif isinstance(v, list):
+				for i, item in enumerate(v):
+					items.update(flatten(item, f"{new_key}[{i}]", sep=sep))
+			else:
+				items[new_key] = v
+	else:
+		items[parent_key] = d
+	return items
+
+@tracing.traced("export")
+def export_path(dataset_id: str, ext: str, kind: str = 'raw') -> str:
+	"""
+	Path of the stats export in csv/xlsx/json, rendering csv/xlsx from the
+	persisted JSON on first request. Raises FileNotFoundError if no stats are stored.
+	"""
+	json_path = stats_path(dataset_id, 'json', kind)
+	if not os.path.exists(json_path):
+		raise FileNotFoundError(f"No stats stored for dataset {dataset_id}.")
+	path = stats_path(dataset_id, ext, kind)
+	if ext == 'json' or os.path.exists(path):
+		return path
+	with open(json_path, encoding='utf-8') as f:
+		flat = flatten(json.load(f))
+	table = pd.DataFrame(list(flat.items()), columns=["stat", "value"])
+	if ext == 'csv':
+		_atomic_write(path, lambda tmp: table.to_csv(tmp, index=False))
+	elif ext == 'xlsx':
+		_atomic_write(path, lambda tmp: table.to_excel(tmp, index=False, engine='openpyxl'))
+	else:
+		raise ValueError("Unsupported format. Use csv, xlsx, or json.")
+	return path
@@ -0,0 +1,293 @@
+# tasks.py
+"""
+Heavy endpoint operations as module-level functions taking plain arguments, so they
+can run in the executor's worker threads or processes. Worker threads share one
+dataset cache, worker processes each keep their own; results are JSON-ready dicts/lists.
+"""
+import os
+
+import pandas as pd
+
+from . import file_utils, data_handler, viz_handler, chunked, stats_store, profile, ops, pipeline, rows, serialize, cube, tracing
+
+def load_head(dataset_id: str, n: int = 20) -> pd.DataFrame:
+	"""
+	First n rows of a dataset; large files are read from their first chunk only.
+	"""
+	if file_utils.is_large(dataset_id):
+		return next(file_utils.iter_chunks(dataset_id, chunksize=n), pd.DataFrame())
+	return file_utils.load_dataframe(dataset_id).head(n)
+
+def head_records(dataset_id: str, n: int = 20, sanitize: bool = True) -> dict:
+	"""
+	{"preview", "columns"} for the first n rows.
+	"""
+	head = load_head(dataset_id, n)
+	records = serialize.frame_records(head) if sanitize else head.to_dict(orient="records")
+	return {"preview": records, "columns": list(head.columns)}
+
+def rows_page(dataset_id: str, offset: int, limit: int, sort: str = None, filters: list = None) -> dict:
+	"""
+	One page of rows for /rows, as JSON-ready records with each row's position in "_row".
+	"""
+	result = rows.page(dataset_id, offset, limit, sort, filters)
+	frame = result["rows"]
+	records = serialize.frame_records(frame)
+	for position, record in zip(frame.index.tolist(), records):
+		record["_row"] = position
+	return {**result, "rows": records}
+
+def compute_stats(dataset_id: str) -> dict:
+	"""
+	Summary stats for a dataset, in row chunks when it is too large to load.
+	"""
+	if file_utils.is_large(dataset_id):
+		return chunked.get_summary_stats_chunked(file_utils.iter_chunks(dataset_id))
+	return data_handler.get_summary_stats(file_utils.load_dataframe(dataset_id))
+
+def dataset_stats(dataset_id: str) -> dict:
+	"""
+	Stats for the uploaded dataset, reused from disk while its content hash is unchanged.
+	"""
+	version = file_utils.dataset_version(dataset_id)
+	return stats_store.get_or_compute(dataset_id, version, lambda: compute_stats(dataset_id))
+
+def stats_export(dataset_id: str, ext: str) -> str:
+	"""
+	Path of the stats export: stats of the cleaned dataset once it has been
+	cleaned (as /download serves it), else of the upload, computed if none are stored.
+	"""
+	if file_utils.cleaned_source(dataset_id) is not None and stats_store.stored_version(dataset_id, "cleaned") is not None:
+		return stats_store.export_path(dataset_id, ext, "cleaned")
+	if stats_store.stored_version(dataset_id) is None:
+		# Nothing persisted yet (or from an older layout): compute for the upload
+		dataset_stats(dataset_id)
+	return stats_store.export_path(dataset_id, ext)
+
+def cleaned_version(dataset_id: str, strategy: dict) -> str:
+	return file_utils.derived_version(file_utils.dataset_version(dataset_id), {"clean": strategy})
+
+def _is_streaming(dataset_id: str, strategy: dict) -> bool:
+	return bool(strategy.get("streaming")) or file_utils.is_large(dataset_id)
+
+def _clean_streaming(dataset_id: str, strategy: dict) -> dict:
+	# Out-of-core path: clean in row chunks straight into the cleaned CSV
+	file_utils.reset_cleaned(dataset_id)
+	preview, stats, rows = chunked.auto_clean_chunked(
+		lambda: file_utils.iter_chunks(dataset_id), strategy, file_utils.cleaned_path(dataset_id, "csv")
+	)
+	file_utils.invalidate_cache(dataset_id)
+	stats_store.save(dataset_id, cleaned_version(dataset_id, strategy), stats, "cleaned")
+	return {"preview": serialize.records(preview), "stats": stats, "rows": rows}
+
+def _clean_frame(dataset_id: str, strategy: dict):
+	# Dropped columns are pushed down into the load, so they are never read
+	plan = pipeline.compile_strategy(strategy, file_utils.dataset_columns(dataset_id))
+	df = file_utils.load_dataframe(dataset_id, columns=plan.load_columns)
+	# Stages unchanged since an earlier clean of this version are reused
+	cleaned_df, report = pipeline.run(plan, df, version=file_utils.dataset_version(dataset_id))
+	# Download formats are rendered from this copy on demand
+	file_utils.save_cleaned(cleaned_df, dataset_id)
+	return cleaned_df, report
+
+def clean_stage(dataset_id: str, strategy: dict) -> dict:
+	"""
+	Job stage: clean the dataset and save its canonical cleaned copy.
+	Returns {"preview", "rows", "pipeline"}; the streaming path returns "stats" instead of "pipeline".
+	"""
+	if _is_streaming(dataset_id, strategy):
+		return _clean_streaming(dataset_id, strategy)
+	cleaned_df, report = _clean_frame(dataset_id, strategy)
+	return {"preview": data_handler.get_preview(cleaned_df, 20), "rows": len(cleaned_df), "pipeline": report}
+
+def export_stage(dataset_id: str, formats: list) -> dict:
+	"""
+	Job stage: render the cleaned dataset in the given formats ahead of download.
+	"""
+	exports = []
+	for fmt in formats:
+		try:
+			file_utils.cleaned_export(dataset_id, fmt)
+			exports.append(fmt)
+		except ValueError:
+			pass
+	return {"exports": exports}
+
+def cleaned_stats_stage(dataset_id: str, strategy: dict) -> dict:
+	"""
+	Job stage: summary stats of the cleaned dataset, reused if already stored.
+	"""
+	version = cleaned_version(dataset_id, strategy)
+	return {"stats": stats_store.get_or_compute(
+		dataset_id, version, lambda: data_handler.get_summary_stats(file_utils.load_cleaned(dataset_id)), "cleaned"
+	)}
+
+def clean_dataset(dataset_id: str, strategy: dict) -> dict:
+	"""
+	Clean dataset with strategy, save the cleaned copy and stats in one call.
+	Returns {"preview", "stats", "pipeline"}; "pipeline" (the per-op run
+	report) is None on the streaming path.
+	"""
+	if _is_streaming(dataset_id, strategy):
+		result = _clean_streaming(dataset_id, strategy)
+		return {"preview": result["preview"], "stats": result["stats"], "pipeline": None}
+	cleaned_df, report = _clean_frame(dataset_id, strategy)
+	preview = data_handler.get_preview(cleaned_df, 20)
+	stats = stats_store.get_or_compute(
+		dataset_id, cleaned_version(dataset_id, strategy), lambda: data_handler.get_summary_stats(cleaned_df), "cleaned"
+	)
+	return {"preview": preview, "stats": stats, "pipeline": report}
+
+def cleaned_download(dataset_id: str, format: str) -> str:
+	"""
+	Path to serve for /download: the cleaned dataset in `format`, or the
+	original upload when the dataset has not been cleaned.
+	"""
+	if file_utils.cleaned_source(dataset_id) is not None:
+		return file_utils.cleaned_export(dataset_id, format)
+	path = os.path.join(file_utils.UPLOAD_DIR, f"{dataset_id}.{format}")
+	if not os.path.exists(path):
+		raise FileNotFoundError("File not found.")
+	return path
+
+def _row_count(stats: dict) -> int:
+	col, desc = next(iter(stats["describe"].items()), (None, {}))
+	return int(desc.get("count") or 0) + int(stats["nulls"].get(col, 0)) if col is not None else 0
+
+def query_context(dataset_id: str, budget: int = profile.PROFILE_TOKEN_BUDGET) -> dict:
+	"""
+	Token-budgeted dataset profile used to build an AI query prompt, built
+	from the persisted stats and cached per dataset version and budget.
+	"""
+	def compute():
+		stats = dataset_stats(dataset_id)
+		# Large files are sampled from their first chunk
+		frame = load_head(dataset_id, file_utils.CHUNK_ROWS) if file_utils.is_large(dataset_id) else file_utils.load_dataframe(dataset_id)
+		return profile.build_profile(frame, stats, total_rows=_row_count(stats), budget=budget)
+	version = file_utils.dataset_version(dataset_id)
+	return {"profile": profile.cached_profile((version, budget), compute)}
+
+def build_cube(dataset_id: str) -> dict:
+	"""
+	Background step after upload: materialize the dataset's aggregate cube
+	unless this version already has one. Returns its rows, dimensions and measures.
+	"""
+	version = file_utils.dataset_version(dataset_id)
+	cube_data = cube.get(dataset_id, version)
+	if cube_data is None:
+		with tracing.span("cube"):
+			# Large files are aggregated chunk by chunk
+			frames = file_utils.iter_chunks(dataset_id) if file_utils.is_large(dataset_id) else [file_utils.load_dataframe(dataset_id)]
+			cube_data = cube.build(frames, version)
+		cube.save(dataset_id, cube_data)
+	return cube.describe(cube_data)
+
+def chart_data(dataset_id: str, chart_spec: dict) -> dict:
+	"""
+	Chart-ready JSON for chart_spec, from the aggregate cube when it holds the
+	answer, otherwise loading only the x/y columns. Raises ops.OpValidationError.
+	"""
+	version = file_utils.dataset_version(dataset_id)
+	cube_data = cube.get(dataset_id, version)
+	ops.validate_chart_spec(chart_spec, cube_data["columns"] if cube_data is not None else file_utils.dataset_columns(dataset_id))
+	# The cube only aggregates numeric measures, so only the rows need dtypes checked
+	if viz_handler.cube_answers(chart_spec, cube_data):
+		return viz_handler.prepare_chart_data(None, chart_spec, version=version, cube_data=cube_data)
+	columns = [c for c in (chart_spec.get("x"), chart_spec.get("y")) if c]
+	df = file_utils.load_dataframe(dataset_id, columns=columns or None)
+	ops.validate_chart_spec(chart_spec, df.columns, df.dtypes)
+	return viz_handler.prepare_chart_data(df, chart_spec, version=version, cube_data=cube_data)
+
+def run_ops(dataset_id: str, transform_ops: list = None, chart_spec: dict = None, compute_spec: dict = None) -> dict:
+	"""
+	Apply a validated ops list to the full dataset (cached per version), then
+	optionally chart it and/or compute an exact answer on the result.
+	Returns {"rows", "columns", "preview", "chart"?, "answer"?}; raises ops.OpValidationError.
+	"""
+	transform_ops = transform_ops or []
+	df = file_utils.load_dataframe(dataset_id)
+	ops.validate_ops(transform_ops, df.columns)
+	version = file_utils.dataset_version(dataset_id)
+	frame = ops.transformed(df, transform_ops, version)
+	# The cube describes the upload, not a transformed frame
+	cube_data = None if transform_ops else cube.get(dataset_id, version)
+	if transform_ops:
+		version = file_utils.derived_version(version, {"ops": ops.ops_key(transform_ops)})
+	result = {
+		"rows": len(frame),
+		"columns": list(frame.columns),
+		"preview": data_handler.get_preview(frame, 20),
+	}
+	if chart_spec:
+		ops.validate_chart_spec(chart_spec, frame.columns, frame.dtypes)
+		result["chart"] = viz_handler.prepare_chart_data(frame, chart_spec, version=version, cube_data=cube_data)
+	if compute_spec:
+		ops.validate_compute(compute_spec, frame.columns, frame.dtypes)
+		values = cube.answer(cube_data, compute_spec)
+		result["answer"] = ops.answer(ops.aggregate(frame, compute_spec) if values is None else values, compute_spec)
+	return result
+
+def answer_query(dataset_id: str, ai_response: dict) -> dict:
+	"""
+	Run the chart and compute specs of an AI answer locally on the full dataset,
+	or from its aggregate cube, which then saves loading the rows at all.
+	Returns {"chart_data"?, "answer"?} plus "*_error" entries for specs that fail validation.
+	"""
+	results = {}
+	version = file_utils.dataset_version(dataset_id)
+	cube_data = cube.get(dataset_id, version)
+	loaded = []
+
+	def frame():
+		if not loaded:
+			loaded.append(file_utils.load_dataframe(dataset_id))
+		return loaded[0]
+
+	columns = cube_data["columns"] if cube_data is not None else frame().columns
+	if isinstance(ai_response.get("chart"), dict):
+		try:
+			spec = ops.validate_chart_spec(ai_response["chart"], columns)
+			df = None
+			# The cube only aggregates numeric measures, so only the rows need dtypes checked
+			if not viz_handler.cube_answers(spec, cube_data):
+				df = frame()
+				ops.validate_chart_spec(spec, df.columns, df.dtypes)
+			results["chart_data"] = viz_handler.prepare_chart_data(df, spec, version=version, cube_data=cube_data)
+		except ValueError as e:
+			results["chart_error"] = str(e)
+	if isinstance(ai_response.get("compute"), dict):
+		try:
+			spec = ops.validate_compute(ai_response["compute"], columns)
+			values = cube.answer(cube_data, spec)
+			if values is None:
+				ops.validate_compute(spec, frame().columns, frame().dtypes)
+				values = ops.aggregate(frame(), spec)
+			results["answer"] = ops.answer(values, spec)
+		except ValueError as e:
+			results["compute_error"] = str(e)
+	return results
+
+def memory_report(dataset_id: str) -> dict:
+	"""
+	Memory footprint of the loaded dataset before and after dtype optimization,
+	with the current dtype of every column.
+	"""
+	df = file_utils.load_dataframe(dataset_id)
+	return {
+		**file_utils.memory_report(dataset_id),
+		"dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
+	}
+
+def cache_stats() -> dict:
+	"""
+	Dataset and aggregate cache counters of the process this runs in.
+	"""
+	return {
+		"pid": os.getpid(),
+		"dataset_cache": file_utils.cache_stats(),
+		"aggregate_cache": viz_handler.cache_stats(),
+		"ops_cache": ops.frame_cache.stats(),
+		"view_cache": rows.view_cache.stats(),
+		"pipeline_cache": pipeline.artifact_cache.stats(),
+		"cube_cache": cube.cube_cache.stats(),
+	}
@@ -0,0 +1,293 @@
+# tracing.py
+"""
+Per-request timing spans, Prometheus metrics and an opt-in sampling profiler.
+
+span("load") times a block into the current request's trace; the request
+middleware turns the trace into a Server-Timing header and folds it into the
+latency histograms served at /metrics. Work sent to the executor runs under
+run_traced(), which records its spans (and profile samples) in the worker and
+hands them back with the result, so process-pool work shows up in the
+request that caused it. Spans outside any request (e.g. jobs) go straight to
+the histograms.
+"""
+import collections
+import contextlib
+import contextvars
+import functools
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+
+# Latency buckets (seconds) for request and span histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROW_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+BYTE_BUCKETS = (1e5, 1e6, 1e7, 1e8, 1e9, 1e10)
+# Requests may ask for a profile with ?profile=1 or "X-Profile: 1" only when this is set
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+# Seconds between profiler samples
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+# Finished profiles kept for GET /profiles/{id}
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", 20))
+
+class Histogram:
+	"""
+	Cumulative-bucket histogram per label set, in the Prometheus layout.
+	"""
+	def __init__(self, name: str, help: str, buckets: tuple, labels: tuple = ()):
+		self.name = name
+		self.help = help
+		self.buckets = tuple(buckets)
+		self.labels = labels
+		self._lock = threading.Lock()
+		self._series = {}
+
+	def observe(self, value: float, *label_values):
+		with self._lock:
+			series = self._series.get(label_values)
+			if series is None:
+				series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+			for i, bound in enumerate(self.buckets):
+				if value <= bound:
+					series[0][i] += 1
+			series[1] += value
+			series[2] += 1
+
+	def render(self) -> list:
+		lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+		with self._lock:
+			for label_values, (counts, total, count) in sorted(self._series.items()):
+				labels = _labels(self.labels, label_values)
+				for bound, n in zip(self.buckets, counts):
+					lines.append(f'{self.name}_bucket{_labels(self.labels + ("le",), label_values + (_number(bound),))} {n}')
+				lines.append(f'{self.name}_bucket{_labels(self.labels + ("le",), label_values + ("+Inf",))} {count}')
+				lines.append(f"{self.name}_sum{labels} {_number(total)}")
+				lines.append(f"{self.name}_count{labels} {count}")
+		return lines
+
+def _number(value) -> str:
+	if isinstance(value, float) and math.isinf(value):
+		return "+Inf" if value > 0 else "-Inf"
+	return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+def _labels(names: tuple, values: tuple) -> str:
+	if not names:
+		return ""
+	escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+	return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+request_seconds = Histogram("dataforge_request_seconds", "HTTP request latency.", LATENCY_BUCKETS, ("method", "route", "status"))
+span_seconds = Histogram("dataforge_span_seconds", "Time spent per stage (load, clean, stats, export, ai, serialize, cube).", LATENCY_BUCKETS, ("span",))
+dataset_rows = Histogram("dataforge_dataset_rows", "Rows of datasets parsed from an upload.", ROW_BUCKETS)
+dataset_bytes = Histogram("dataforge_dataset_bytes", "Size of uploaded files.", BYTE_BUCKETS)
+_sizes = {"rows": dataset_rows, "bytes": dataset_bytes}
+
+class Trace:
+	"""
+	Spans, size observations and profile samples of one request (or one executor call).
+	"""
+	def __init__(self, profile: bool = False):
+		self.started = time.perf_counter()
+		self.spans = []
+		self.sizes = []
+		self.samples = collections.Counter() if profile else None
+		self.finished = False
+
+	def record(self) -> dict:
+		# Plain data, so a worker process can return it with its result
+		return {"spans": self.spans, "sizes": self.sizes, "samples": dict(self.samples) if self.samples is not None else None}
+
+	def server_timing(self) -> str:
+		totals = collections.OrderedDict()
+		for name, seconds in self.spans:
+			totals[name] = totals.get(name, 0.0) + seconds
+		totals["total"] = time.perf_counter() - self.started
+		return ", ".join(f"{name};dur={1000 * seconds:.1f}" for name, seconds in totals.items())
+
+_current = contextvars.ContextVar("trace", default=None)
+
+def current():
+	trace = _current.get()
+	return trace if trace is not None and not trace.finished else None
+
+def _observe(spans: list, sizes: list):
+	for name, seconds in spans:
+		span_seconds.observe(seconds, name)
+	for kind, value in sizes:
+		_sizes[kind].observe(value)
+
+@contextlib.contextmanager
+def span(name: str):
+	"""
+	Time the block as stage `name` of the current request.
+	"""
+	started = time.perf_counter()
+	try:
+		yield
+	finally:
+		add_span(name, time.perf_counter() - started)
+
+def add_span(name: str, seconds: float):
+	"""
+	Record an already measured span.
+	"""
+	trace = current()
+	if trace is not None:
+		trace.spans.append((name, seconds))
+	else:
+		_observe([(name, seconds)], [])
+
+def traced(name: str):
+	"""
+	Decorator form of span(name).
+	"""
+	def decorate(fn):
+		@functools.wraps(fn)
+		def wrapper(*args, **kwargs):
+			with span(name):
+				return fn(*args, **kwargs)
+		return wrapper
+	return decorate
+
+def observe_size(kind: str, value: float):
+	"""
+	Record a dataset size ("rows" or "bytes") with the current request.
+	"""
+	trace = current()
+	if trace is not None:
+		trace.sizes.append((kind, value))
+	else:
+		_observe([], [(kind, value)])
+
+def merge(record: dict):
+	"""
+	Add a record returned by run_traced() to the current request, or to the metrics if there is none.
+	"""
+	trace = current()
+	if trace is None:
+		_observe(record["spans"], record["sizes"])
+		return
+	trace.spans.extend(record["spans"])
+	trace.sizes.extend(record["sizes"])
+	if trace.samples is not None and record["samples"]:
+		trace.samples.update(record["samples"])
+
+def profiling() -> bool:
+	trace = current()
+	return trace is not None and trace.samples is not None
+
+class _Sampler:
+	"""
+	Samples one thread's Python stack every `interval` seconds into collapsed-stack counts.
+	"""
+	def __init__(self, thread_id: int, counts: collections.Counter, interval: float = PROFILE_INTERVAL):
+		self.thread_id = thread_id
+		self.counts = counts
+		self.interval = interval
+		self._stop = threading.Event()
+		self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+	def _run(self):
+		while not self._stop.wait(self.interval):
+			frame = sys._current_frames().get(self.thread_id)
+			stack = []
+			while frame is not None:
+				code = frame.f_code
+				stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+				frame = frame.f_back
+			if stack:
+				self.counts[";".join(reversed(stack))] += 1
+
+	def __enter__(self):
+		self._thread.start()
+		return self
+
+	def __exit__(self, *exc):
+		self._stop.set()
+		self._thread.join()
+
+def run_traced(fn, args, kwargs, profile: bool = False):
+	"""
+	Call fn under a fresh trace (sampling its stack when profile is set) and
+	return (result, record) for merge() in the caller.
+	"""
+	trace = Trace(profile)
+	token = _current.set(trace)
+	try:
+		if profile:
+			with _Sampler(threading.get_ident(), trace.samples):
+				result = fn(*args, **kwargs)
+		else:
+			result = fn(*args, **kwargs)
+	finally:
+		_current.reset(token)
+	return result, trace.record()
+
+@contextlib.contextmanager
+def request_trace(profile: bool = False):
+	"""
+	Make a new trace current for the duration of a request.
+	"""
+	trace = Trace(profile and PROFILING_ENABLED)
+	token = _current.set(trace)
+	try:
+		yield trace
+	finally:
+		_current.reset(token)
+
+def finish(trace: Trace, method: str, route: str, status: int):
+	"""
+	Close a request trace: observe its latency, spans and sizes, and keep its profile if any.
+	Returns the profile id, or None.
+	"""
+	trace.finished = True
+	request_seconds.observe(time.perf_counter() - trace.started, method, route, str(status))
+	_observe(trace.spans, trace.sizes)
+	if trace.samples is None:
+		return None
+	profile_id = uuid.uuid4().hex[:12]
+	with _profiles_lock:
+		_profiles[profile_id] = {"route": route, "seconds": time.perf_counter() - trace.started, "samples": dict(trace.samples)}
+		while len(_profiles) > PROFILE_HISTORY:
+			_profiles.popitem(last=False)
+	return profile_id
+
+_profiles = collections.OrderedDict()
+_profiles_lock = threading.Lock()
+
+def get_profile(profile_id: str):
+	"""
+	Collapsed stacks ("frame;frame;frame count" per line, for flamegraph tools) of a recent profile, or None.
+	"""
+	with _profiles_lock:
+		profile = _profiles.get(profile_id)
+	if profile is None:
+		return None
+	return "\n".join(f"{stack} {count}" for stack, count in sorted(profile["samples"].items(), key=lambda kv: -kv[1])) + "\n"
+
+def _gauge(name: str, help: str, labels: tuple, series: list) -> list:
+	lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+	lines.extend(f"{name}{_labels(labels, values)} {_number(value)}" for values, value in series)
+	return lines
+
+def render_metrics(caches: dict = None, endpoints: dict = None) -> str:
+	"""
+	All metrics in the Prometheus text format. caches is {name: LRUCache.stats()}
+	and endpoints the executor's per-endpoint snapshots.
+	"""
+	lines = []
+	for histogram in (request_seconds, span_seconds, dataset_rows, dataset_bytes):
+		lines.extend(histogram.render())
+	caches = caches or {}
+	for field, help in [("hits", "Cache hits."), ("misses", "Cache misses."), ("hit_rate", "Cache hit rate since start."), ("bytes", "Bytes held by the cache.")]:
+		kind = "counter" if field in ("hits", "misses") else "gauge"
+		name = f"dataforge_cache_{field}" + ("_total" if kind == "counter" else "")
+		lines.append(f"# HELP {name} {help}")
+		lines.append(f"# TYPE {name} {kind}")
+		lines.extend(f'{name}{_labels(("cache",), (cache,))} {_number(stats.get(field, 0))}' for cache, stats in sorted(caches.items()))
+	endpoints = endpoints or {}
+	lines.extend(_gauge("dataforge_executor_waiting", "Calls queued per endpoint.", ("endpoint",), [((e,), s["waiting"]) for e, s in sorted(endpoints.items())]))
+	lines.extend(_gauge("dataforge_executor_running", "Calls running per endpoint.", ("endpoint",), [((e,), s["running"]) for e, s in sorted(endpoints.items())]))
+	return "\n".join(lines) + "\n"
@@ -1,31 +1,89 @@
-import numpy as np
-
-# Helper to make all values JSON serializable
-def make_json_safe(obj):
-	import numpy as np
-	if isinstance(obj, (np.integer, np.floating)):
-		v = obj.item()
-		if isinstance(v, float) and (np.isnan(v) or np.isinf(v)):
-			return None
-		return v
-	if isinstance(obj, float):
-		if obj != obj or obj == float('inf') or obj == float('-inf'):
-			return None
-		return obj
-	if isinstance(obj, np.ndarray):
-		return [make_json_safe(x) for x in obj.tolist()]
-	return obj
 # viz_handler.py
 """
 Prepares chart-ready JSON from DataFrame and chart_spec for frontend rendering.
+Aggregates are memoized per dataset version, so changing only the chart type or
+top_n slices a cached result instead of regrouping the data, and are read from
+the dataset's aggregate cube (see cube.py) when it holds them.
 """
+import os
+
+import numpy as np
 import pandas as pd
 
-def prepare_chart_data(df: pd.DataFrame, chart_spec: dict) -> dict:
+from . import cube, serialize
+from .cache import LRUCache
+
+# Memory budget for cached aggregates (64 MB), override with AGGREGATE_CACHE_MAX_BYTES
+AGGREGATE_CACHE_MAX_BYTES = int(os.getenv("AGGREGATE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+AGGREGATIONS = ["sum", "mean", "count", "min", "max"]
+
+aggregate_cache = LRUCache(AGGREGATE_CACHE_MAX_BYTES)
+
+def _cached(key, compute):
+	"""
+	Return (value, hit) for key, computing and caching it on a miss.
+	A key of None (unknown dataset version) disables caching.
+	"""
+	if key is None:
+		return compute(), False
+	value = aggregate_cache.get(key)
+	if value is not None:
+		return value, True
+	value = compute()
+	aggregate_cache.put(key, value)
+	return value, False
+
+def _top(data: pd.Series, n: int) -> pd.Series:
+	# Partial top-k selection instead of a full sort; object columns (e.g. min of strings) fall back to sorting
+	try:
+		return data.nlargest(n)
+	except TypeError:
+		return data.sort_values(ascending=False).head(n)
+
+def _value_counts(s: pd.Series) -> pd.Series:
+	counts = s.value_counts()
+	# Categorical columns also list categories that no longer occur, with a zero count
+	return counts[counts > 0] if isinstance(s.dtype, pd.CategoricalDtype) else counts
+
+def _label(value) -> str:
+	if isinstance(value, pd.Timestamp):
+		# Parsed date columns: show plain dates as they appeared in the file
+		return value.date().isoformat() if value == value.normalize() else value.isoformat()
+	return value if isinstance(value, str) else str(value)
+
+def cache_stats() -> dict:
+	"""
+	Hit/miss/eviction counters and memory usage of the aggregate cache.
+	"""
+	return aggregate_cache.stats()
+
+def _func(agg: str) -> str:
+	return agg if agg in AGGREGATIONS else "sum"
+
+def cube_answers(chart_spec: dict, cube_data) -> bool:
+	"""
+	Whether prepare_chart_data can build chart_spec from cube_data alone, without the rows.
+	"""
+	chart_type = chart_spec.get("type", "bar")
+	x = chart_spec.get("x")
+	y = chart_spec.get("y")
+	agg = chart_spec.get("agg", "sum")
+	if chart_type in ["bar", "line", "histogram"]:
+		if x and y and agg != "none":
+			return cube.group_values(cube_data, x, y, _func(agg)) is not None
+		if bool(x) != bool(y):
+			return cube.value_counts(cube_data, x or y) is not None
+	elif chart_type == "pie" and x:
+		return cube.value_counts(cube_data, x) is not None
+	return False
+
+def prepare_chart_data(df: pd.DataFrame, chart_spec: dict, version: str = None, cube_data: dict = None) -> dict:
 	"""
 	Given a DataFrame and chart_spec, return chart-ready JSON for frontend.
 	Supports: bar, line, pie, scatter, histogram.
 	chart_spec: {type, x, y, agg, top_n}
+	version identifies the data in df; when given, aggregates are cached under it.
+	cube_data is the cube of that data, if built; df may be None when cube_answers() holds.
 	"""
 	chart_type = chart_spec.get("type", "bar")
 	x = chart_spec.get("x")
@@ -34,44 +92,48 @@ def prepare_chart_data(df: pd.DataFrame, chart_spec: dict) -> dict:
 	top_n = chart_spec.get("top_n") or chart_spec.get("limit") or 10
 	result = {"type": chart_type, "labels": [], "datasets": [], "meta": {"x": x, "y": y, "agg": agg}}
 
+	def value_counts(column):
+		# Sorted by count already, so top_n is a slice
+		counts = cube.value_counts(cube_data, column)
+		if counts is not None:
+			result["meta"]["cube"] = True
+			return counts
+		key = (version, "value_counts", column) if version else None
+		data, hit = _cached(key, lambda: _value_counts(df[column]))
+		result["meta"]["cached"] = hit
+		return data
+
 	if chart_type in ["bar", "line", "histogram"]:
 		if x and y and agg != "none":
-			grouped = df.groupby(x)[y]
-			if agg == "sum":
-				data = grouped.sum()
-			elif agg == "mean":
-				data = grouped.mean()
-			elif agg == "count":
-				data = grouped.count()
-			elif agg == "min":
-				data = grouped.min()
-			elif agg == "max":
-				data = grouped.max()
+			func = _func(agg)
+			data = cube.group_values(cube_data, x, y, func)
+			if data is not None:
+				result["meta"]["cube"] = True
 			else:
-				data = grouped.sum()
-			data = data.sort_values(ascending=False)
+				key = (version, "groupby", x, y, func) if version else None
+				data, hit = _cached(key, lambda: df.groupby(x, observed=True)[y].agg(func))
+				result["meta"]["cached"] = hit
 			if top_n:
-				data = data.head(int(top_n))
+				data = _top(data, int(top_n))
 			# Backend validation: if aggregation result is empty, raise error
 			if data.empty:
 				raise ValueError(f"No data to plot. Check if X is categorical/discrete and Y is numeric. Current X: {x}, Y: {y}.")
-			# Convert numpy types to Python native types for JSON serialization
-			labels = [str(idx) if not isinstance(idx, str) else idx for idx in data.index]
-			values = [v.item() if hasattr(v, 'item') else v for v in data.values]
+			labels = [_label(idx) for idx in data.index]
+			values = serialize.column_values(data)
 			result["labels"] = labels
 			result["datasets"] = [{"label": y, "data": values}]
 		elif x and not y:
 			# Just value counts of x
-			data = df[x].value_counts().head(int(top_n))
-			labels = [str(idx) if not isinstance(idx, str) else idx for idx in data.index]
-			values = [v.item() if hasattr(v, 'item') else v for v in data.values]
+			data = value_counts(x).head(int(top_n))
+			labels = [_label(idx) for idx in data.index]
+			values = serialize.column_values(data)
 			result["labels"] = labels
 			result["datasets"] = [{"label": x, "data": values}]
 		elif y and not x:
 			# Just value counts of y
-			data = df[y].value_counts().head(int(top_n))
-			labels = [str(idx) if not isinstance(idx, str) else idx for idx in data.index]
-			values = [v.item() if hasattr(v, 'item') else v for v in data.values]
+			data = value_counts(y).head(int(top_n))
+			labels = [_label(idx) for idx in data.index]
+			values = serialize.column_values(data)
 			result["labels"] = labels
 			result["datasets"] = [{"label": y, "data": values}]
 		elif chart_type == "histogram" and x:
@@ -79,24 +141,23 @@ def prepare_chart_data(df: pd.DataFrame, chart_spec: dict) -> dict:
 			values = df[x].dropna().values
 			bins = chart_spec.get("bins", 10)
 			counts, bin_edges = np.histogram(values, bins=bins)
-			labels = [f"{round(make_json_safe(bin_edges[i]),2)}-{round(make_json_safe(bin_edges[i+1]),2)}" for i in range(len(bin_edges)-1)]
-			counts_py = [make_json_safe(c) for c in counts]
-			result["labels"] = labels
-			result["datasets"] = [{"label": x, "data": counts_py}]
+			edges = bin_edges.round(2).tolist()
+			result["labels"] = [f"{lo}-{hi}" for lo, hi in zip(edges[:-1], edges[1:])]
+			result["datasets"] = [{"label": x, "data": counts.tolist()}]
 	elif chart_type == "pie":
 		if x:
-			data = df[x].value_counts().head(int(top_n))
-			labels = [str(idx) if not isinstance(idx, str) else idx for idx in data.index]
-			values = [v.item() if hasattr(v, 'item') else v for v in data.values]
+			data = value_counts(x).head(int(top_n))
+			labels = [_label(idx) for idx in data.index]
+			values = serialize.column_values(data)
 			result["labels"] = labels
 			result["datasets"] = [{"label": x, "data": values}]
 	elif chart_type == "scatter":
 		if x and y:
-			points = df[[x, y]].dropna().values.tolist()
-			# Convert all points to Python native types
-			points_py = [[v.item() if hasattr(v, 'item') else v for v in pair] for pair in points]
+			points = df[[x, y]].dropna()
+			# Each column is converted as a whole, then zipped into [x, y] pairs
+			xs, ys = serialize.column_values(points.iloc[:, 0]), serialize.column_values(points.iloc[:, 1])
 			result["labels"] = []
-			result["datasets"] = [{"label": f"{x} vs {y}", "data": points_py}]
+			result["datasets"] = [{"label": f"{x} vs {y}", "data": [list(pair) for pair in zip(xs, ys)]}]
 	else:
 		raise ValueError(f"Unsupported chart type: {chart_type}")
 	return result
@@ -1,8 +1,79 @@
 import axios from 'axios';
 
+const BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+
 const API = axios.create({
-  baseURL: import.meta.env.VITE_API_URL || 'http://localhost:8000',
+  baseURL: BASE_URL,
   timeout: 30000,
 });
 
+// AI answers can take longer than ordinary requests
+export const AI_TIMEOUT_MS = 120000;
+
+/**
+ * POST /query/stream and read its server-sent events.
+ * onInsight(text) is called with each new piece of the answer text;
+ * resolves with the final answer, rejects on an "error" event or timeout.
+ */
+export async function streamQuery(datasetId, question, { onInsight, signal, timeout = AI_TIMEOUT_MS } = {}) {
+  const controller = new AbortController();
+  const timer = setTimeout(() => controller.abort(), timeout);
+  if (signal) signal.addEventListener('abort', () => controller.abort());
+  try {
+    const res = await fetch(`${BASE_URL}/query/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ dataset_id: datasetId, question }),
+      signal: controller.signal,
+    });
+    if (!res.ok || !res.body) {
+      const body = await res.json().catch(() => ({}));
+      throw new Error(body.detail || `AI query failed (${res.status}).`);
+    }
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let sep;
+      while ((sep = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        let event = 'message';
+        let data = '';
+        for (const line of block.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        if (!data) continue;
+        const payload = JSON.parse(data);
+        if (event === 'insight') onInsight && onInsight(payload.text);
+        else if (event === 'result') return payload;
+        else if (event === 'error') throw new Error(payload.detail || 'AI query failed.');
+      }
+    }
+    throw new Error('AI stream ended without a result.');
+  } catch (e) {
+    if (e.name === 'AbortError') throw new Error('AI query timeout: no answer within the time limit.');
+    throw e;
+  } finally {
+    clearTimeout(timer);
+  }
+}
+
+/**
+ * GET /rows/{datasetId}: one page of the dataset, optionally sorted ("col" or
+ * "-col" for descending) and filtered by [{ col, cmp, value }] conditions.
+ * Resolves with { rows, columns, offset, limit, total }.
+ */
+export async function fetchRows(datasetId, { offset = 0, limit = 50, sort, filter } = {}) {
+  const params = { offset, limit };
+  if (sort) params.sort = sort;
+  if (filter && filter.length) params.filter = JSON.stringify(filter);
+  const res = await API.get(`/rows/${datasetId}`, { params });
+  return res.data;
+}
+
 export default API;
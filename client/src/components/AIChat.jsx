@@ -1,5 +1,5 @@
 import React, { useState } from 'react';
-import API from '../api';
+import { streamQuery } from '../api';
 import { useData } from '../context.jsx';
 
 const AIChat = ({ onChartSuggestion }) => {
@@ -8,42 +8,46 @@ const AIChat = ({ onChartSuggestion }) => {
 	const [answer, setAnswer] = useState(null);
 	const [loading, setLoading] = useState(false);
 	const [error, setError] = useState(null);
+	// Insight text received so far while the answer streams in
+	const [partial, setPartial] = useState('');
 
 	const handleSend = async () => {
 			setError(null);
 			setLoading(true);
 			setAnswer(null);
+			setPartial('');
 			try {
-				const res = await API.post('/query', { dataset_id: datasetId, question });
+				const data = await streamQuery(datasetId, question, {
+					onInsight: text => setPartial(p => p + text),
+				});
 				// Show any insight message, even if it's an error or empty
-				if (res.data?.insight && typeof res.data.insight === 'string') {
+				if (data?.insight && typeof data.insight === 'string') {
 					if (
-						res.data.insight.startsWith('AI request failed:') ||
-						res.data.insight.toLowerCase().includes('api key') ||
-						res.data.insight.toLowerCase().includes('timeout') ||
-						res.data.insight.toLowerCase().includes('too large') ||
-						res.data.insight.toLowerCase().includes('empty') ||
-						res.data.insight.toLowerCase().includes('invalid')
+						data.insight.startsWith('AI request failed:') ||
+						data.insight.toLowerCase().includes('api key') ||
+						data.insight.toLowerCase().includes('timeout') ||
+						data.insight.toLowerCase().includes('too large') ||
+						data.insight.toLowerCase().includes('empty') ||
+						data.insight.toLowerCase().includes('invalid')
 					) {
-						setError(res.data.insight.trim());
-					} else if (res.data.insight.trim() === '') {
+						setError(data.insight.trim());
+					} else if (data.insight.trim() === '') {
 						setError('AI model returned an empty response. Please try again or use a different model.');
 					} else {
-						setAnswer(res.data || res);
+						setAnswer(data);
 					}
 				} else {
 					setError('AI query failed.');
 				}
 			} catch (e) {
-				if (e?.response?.data?.detail) {
-					setError(e.response.data.detail);
-				} else if (e?.message && e.message.includes('Network Error')) {
+				if (e?.message && e.message.includes('Failed to fetch')) {
 					setError('Network error: Unable to reach AI service.');
 				} else {
-					setError('AI query failed.');
+					setError(e?.message || 'AI query failed.');
 				}
 			} finally {
 				setLoading(false);
+				setPartial('');
 			}
 		};
 
@@ -65,6 +69,9 @@ const AIChat = ({ onChartSuggestion }) => {
 								{loading ? 'Asking...' : 'Send'}
 							</button>
 			{error && <div className="text-error mt-2">{error}</div>}
+			{loading && partial && (
+				<div className="mt-4 bg-background rounded p-4 border border-border text-text">{partial}</div>
+			)}
 			{answer && (
 				<div className="mt-4 bg-background rounded p-4 border border-border">
 					<div className="font-semibold mb-2 text-primary">AI Insight:</div>
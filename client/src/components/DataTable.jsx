@@ -1,4 +1,5 @@
-import React, { useMemo, useState } from 'react';
+import React, { useEffect, useMemo, useState } from 'react';
+import { fetchRows } from '../api';
 
 const getType = val => {
 	if (val === null || val === undefined) return 'null';
@@ -8,28 +9,61 @@ const getType = val => {
 	return 'string';
 };
 
-const DataTable = ({ rows = [], columns = [], pageSize = 10 }) => {
+// With a datasetId the table pages (and sorts, by header click) through the
+// whole dataset on the server; otherwise it pages the rows it is given
+const DataTable = ({ rows = [], columns: givenColumns = [], pageSize = 10, datasetId = null }) => {
 	const [page, setPage] = useState(0);
-	const totalPages = Math.ceil(rows.length / pageSize);
-	const pagedRows = useMemo(() => rows.slice(page * pageSize, (page + 1) * pageSize), [rows, page, pageSize]);
+	const [sort, setSort] = useState(null);
+	const [remote, setRemote] = useState(null);
 
-	// Compute null counts and types
+	useEffect(() => {
+		setPage(0);
+		setSort(null);
+		setRemote(null);
+	}, [datasetId]);
+
+	useEffect(() => {
+		if (!datasetId) return;
+		let cancelled = false;
+		fetchRows(datasetId, { offset: page * pageSize, limit: pageSize, sort })
+			.then(data => { if (!cancelled) setRemote(data); })
+			.catch(() => { if (!cancelled) setRemote(null); });
+		return () => { cancelled = true; };
+	}, [datasetId, page, pageSize, sort]);
+
+	const serverMode = Boolean(datasetId && remote);
+	const columns = serverMode ? remote.columns : givenColumns;
+	const totalRows = serverMode ? remote.total : rows.length;
+	const totalPages = Math.ceil(totalRows / pageSize);
+	const pagedRows = useMemo(
+		() => (serverMode ? remote.rows : rows.slice(page * pageSize, (page + 1) * pageSize)),
+		[serverMode, remote, rows, page, pageSize]
+	);
+	const toggleSort = col => {
+		// ascending -> descending -> unsorted
+		setSort(s => (s === col ? `-${col}` : s === `-${col}` ? null : col));
+		setPage(0);
+	};
+	const sortMark = col => (sort === col ? ' ▲' : sort === `-${col}` ? ' ▼' : '');
+
+	// Null counts and types: of the page on screen in server mode, else of all given rows
+	const statRows = serverMode ? pagedRows : rows;
 	const nullCounts = useMemo(() => {
 		const counts = {};
 		columns.forEach(col => {
-			counts[col] = rows.filter(r => r[col] === null || r[col] === undefined || r[col] === '').length;
+			counts[col] = statRows.filter(r => r[col] === null || r[col] === undefined || r[col] === '').length;
 		});
 		return counts;
-	}, [rows, columns]);
+	}, [statRows, columns]);
 
 	const types = useMemo(() => {
 		const t = {};
 		columns.forEach(col => {
-			const firstNonNull = rows.find(r => r[col] !== null && r[col] !== undefined && r[col] !== '');
+			const firstNonNull = statRows.find(r => r[col] !== null && r[col] !== undefined && r[col] !== '');
 			t[col] = getType(firstNonNull ? firstNonNull[col] : null);
 		});
 		return t;
-	}, [rows, columns]);
+	}, [statRows, columns]);
 
        return (
 	       <div className="relative rounded-lg border border-border bg-surface">
@@ -38,8 +72,12 @@ const DataTable = ({ rows = [], columns = [], pageSize = 10 }) => {
 				       <thead>
 					       <tr className="bg-background">
 						       {columns.map(col => (
-							       <th key={col} className="px-3 py-2 font-semibold text-left text-text border-b border-border whitespace-nowrap">
-								       {col}
+							       <th
+								       key={col}
+								       className={`px-3 py-2 font-semibold text-left text-text border-b border-border whitespace-nowrap${datasetId ? ' cursor-pointer select-none' : ''}`}
+								       onClick={datasetId ? () => toggleSort(col) : undefined}
+							       >
+								       {col}{sortMark(col)}
 								       <div className="text-xs text-muted font-normal">
 									       {types[col]} | nulls: {nullCounts[col]}
 								       </div>
@@ -52,7 +90,7 @@ const DataTable = ({ rows = [], columns = [], pageSize = 10 }) => {
 						       <tr><td colSpan={columns.length} className="text-center text-muted py-8">No data</td></tr>
 					       ) : (
 						       pagedRows.map((row, i) => (
-							       <tr key={i} className="hover:bg-background/60">
+							       <tr key={serverMode ? row._row : i} className="hover:bg-background/60">
 								       {columns.map(col => (
 									       <td key={col} className="px-3 py-2 border-b border-border text-text whitespace-nowrap">
 										       {row[col] === null || row[col] === undefined || row[col] === '' ? <span className="text-error">—</span> : String(row[col])}
@@ -17,7 +17,7 @@ const Preview = () => {
           <div className="text-sm text-muted mb-4">Dataset ID: <span className="text-text font-mono">{datasetId || '—'}</span></div>
         </div>
         <div className="w-full overflow-x-auto">
-          <DataTable rows={preview} columns={previewColumns} pageSize={10} />
+          <DataTable rows={preview} columns={previewColumns} pageSize={10} datasetId={datasetId} />
         </div>
         <div className="flex flex-col md:flex-row gap-4 items-center justify-between mt-2">
           <DownloadButton />